@@ -1,11 +1,15 @@
-import requests
 import time
 import os
+import sys
 import threading
 import psutil
 import redis
-from collections import Counter
-import json
+from consensus_voter import run_committee, similarity_vote
+# The shared Brain modules (Brawn client, cache format) live in dockerization/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "dockerization"))
+import brawn_client # Pooled keep-alive session to the laptop, streaming calls
+import metrics
+from cache_tiers import TieredCache
 
 # --- 1. CONFIGURATION ---
 
@@ -27,6 +31,9 @@ BRAWN_NODE_URL = f"http://{LAPTOP_IP}:11434"
 REAL_MODEL_ON_BRAWN = "tinyllama"
 MOCK_MODELS_ON_BRAIN = ["llama3:8b", "mistral:7b"]
 
+# Stage timings, in the same histogram as the v2.0 Brain's (see dockerization/metrics.py)
+STAGE_SECONDS = metrics.histogram("sentinel_stage_seconds", "Time spent in each stage of a request.", ["stage"])
+
 # --- Hardware Watchdog (For the VM) ---
 MAX_RAM_PERCENT = 85.0
 WATCHDOG_POLL_RATE = 5
@@ -56,10 +63,11 @@ def get_redis_connection():
     
     try:
         # We use from_url, which is the most reliable method
-        r = redis.from_url(CONNECTION_STRING, decode_responses=True)
+        # Binary-safe: answers are stored as answer_codec records, like the v2.0 Brain's
+        r = redis.from_url(CONNECTION_STRING, decode_responses=False)
         r.ping()
         print(f"[Cache] SUCCESS: Connected to Redis at {REDIS_HOST}")
-        return r
+        return TieredCache(r)
     except Exception as e:
         print(f"!!! FATAL CACHE ERROR: Could not connect to Redis: {e}")
         print("    1. Check your REDIS_HOST, REDIS_PORT, and REDIS_PASSWORD.")
@@ -67,7 +75,30 @@ def get_redis_connection():
         print("    3. Check your Redis 'Access keys' page to ensure 'Access key authentication' is ENABLED.")
         return None
 
-# --- 4. "SUPER AI" (The Consensus Engine) ---
+# --- 4. THE COMMITTEE (Parallel Votes) ---
+def call_brawn_model(model_name, prompt, cancel_event):
+    """
+    Asks the real model on the Brawn node. The answer is streamed so the call
+    can be dropped (and Ollama stops generating) once its vote isn't needed.
+    """
+    print(f"[Router] Querying BRAWN Node ({LAPTOP_IP}) for: {model_name}")
+    try:
+        result = brawn_client.generate_stream(BRAWN_NODE_URL, model_name, prompt, cancel_event=cancel_event)
+        return result["response"].strip()
+    except brawn_client.GenerationCancelled:
+        print(f"[Router] '{model_name}' cancelled: majority already agreed.")
+        return "Error: Cancelled."
+    except Exception as e:
+        print(f"!!! ERROR: BRAWN node offline. {e}")
+        return "Error: Brawn Node is offline."
+
+def mock_brain_model(model_name, prompt, cancel_event):
+    print(f"[Router] Simulating MOCK request on BRAIN for: {model_name}")
+    if "color of the sky" in prompt.lower():
+        return "The sky is blue." if model_name == "mistral:7b" else "The sky is green."
+    return f"Mock response: The answer to '{prompt}' is complex."
+
+# --- 5. "SUPER AI" (The Consensus Engine) ---
 def run_consensus_engine(prompt, cache_client):
     """
     The "Super AI" aggregator, now with L1 Caching.
@@ -83,51 +114,40 @@ def run_consensus_engine(prompt, cache_client):
             print("[Cache] HIT! Returning answer instantly.")
             print(f"\nFINAL VERIFIED ANSWER (FROM CACHE):\n{cached_answer}")
             print("="*50)
-            return # Stop execution
+            return cached_answer # Stop execution
     except Exception as e:
         print(f"[Cache] WARNING: Redis check failed. {e}. Bypassing cache.")
 
     print("[Cache] MISS! Running full consensus check...")
+    start_time = time.time()
     print("[Super AI] Querying model committee...")
     
-    responses = {}
     final_answer = ""
     had_an_error = False # <-- NEW: Flag to track errors
 
-    # --- MODEL CALLS (Step 2 - Only if cache missed) ---
-    print(f"[Router] Querying BRAWN Node ({LAPTOP_IP}) for: {REAL_MODEL_ON_BRAWN}")
-    try:
-        response = requests.post(
-            f"{BRAWN_NODE_URL}/api/generate",
-            json={"model": REAL_MODEL_ON_BRAWN, "prompt": prompt, "stream": False},
-            timeout=30
-        )
-        response.raise_for_status() 
-        responses[REAL_MODEL_ON_BRAWN] = response.json()['response'].strip()
-    except Exception as e:
-        print(f"!!! ERROR: BRAWN node offline. {e}")
-        responses[REAL_MODEL_ON_BRAWN] = "Error: Brawn Node is offline."
-        had_an_error = True # <-- NEW: Set the error flag
-
+    # --- MODEL CALLS (Step 2 - Only if cache missed, all in parallel) ---
+    committee = {REAL_MODEL_ON_BRAWN: call_brawn_model}
     for model in MOCK_MODELS_ON_BRAIN:
-        print(f"[Router] Simulating MOCK request on BRAIN for: {model}")
-        if "color of the sky" in prompt.lower():
-            responses[model] = "The sky is blue." if model == "mistral:7b" else "The sky is green."
-        else:
-            responses[model] = f"Mock response: The answer to '{prompt}' is complex."
+        committee[model] = mock_brain_model
+    with metrics.stage(STAGE_SECONDS, "committee"):
+        responses = run_committee(prompt, committee, real_models={REAL_MODEL_ON_BRAWN})
+
+    # A cancelled Brawn vote is fine; an offline Brawn node is not.
+    if "Error: Brawn" in responses.get(REAL_MODEL_ON_BRAWN, ""):
+        had_an_error = True # <-- NEW: Set the error flag
 
     print("\n[Super AI] --- VOTES RECEIVED ---")
     for model, resp in responses.items():
         print(f"  > {model}: {resp[:75]}...") 
 
     # --- CONSENSUS LOGIC (Step 3) ---
-    vote_counts = Counter(responses.values())
-    most_common_answer, count = vote_counts.most_common(1)[0]
+    with metrics.stage(STAGE_SECONDS, "consensus"):
+        most_common_answer, count = similarity_vote(responses, real_models={REAL_MODEL_ON_BRAWN})
     
     print("\n[Super AI] --- RESOLUTION ---")
     
-    if count > (len(responses) / 2):
-        print(f"[Super AI] Consensus Reached (Vote: {count}/{len(responses)})")
+    if count > (len(committee) / 2):
+        print(f"[Super AI] Consensus Reached (Vote: {count}/{len(committee)})")
         final_answer = most_common_answer
         print(f"\nFINAL VERIFIED ANSWER:\n{final_answer}")
     else:
@@ -139,7 +159,9 @@ def run_consensus_engine(prompt, cache_client):
     # NEW: We only save to cache if there was NO error
     if not had_an_error:
         try:
-            cache_client.set(cache_key, final_answer, ex=3600) # Save for 1 hour
+            # Only the real model can win the vote, so it gave the answer either way
+            cache_client.set(cache_key, final_answer, ex=3600, model=REAL_MODEL_ON_BRAWN, votes=max(count, 1),
+                             voters=len(committee), latency=time.time() - start_time) # Save for 1 hour
             print("[Cache] SUCCESS: Saved new answer to cache.")
         except Exception as e:
             print(f"[Cache] WARNING: Could not write to cache. {e}")
@@ -147,8 +169,9 @@ def run_consensus_engine(prompt, cache_client):
         print("[Cache] SKIPPING: An error occurred, will not save to cache.")
         
     print("="*50)
+    return final_answer
 
-# --- 5. MAIN EXECUTION ---
+# --- 6. MAIN EXECUTION ---
 if __name__ == "__main__":
     if "YOUR_TAILSCALE_IP_HERE" in LAPTOP_IP or "PASTE_YOUR_HOST_NAME_HERE" in REDIS_HOST:
         print("="*50)
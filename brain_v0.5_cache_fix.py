@@ -1,12 +1,18 @@
-import requests
 import time
 import os
 import threading
 import psutil
 import redis
-from collections import Counter
 import json
+import math
+import sys
 import nltk # Make sure you ran 'pip3 install nltk'
+from consensus_voter import run_committee, similarity_vote
+# The shared Brain modules (Brawn client, cache format, learned router) live in dockerization/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "dockerization"))
+import brawn_client # Pooled keep-alive session to the laptop, streaming calls
+import metrics
+from cache_tiers import TieredCache
 
 # --- 1. CONFIGURATION ---
 
@@ -32,6 +38,9 @@ REAL_MODEL_ON_BRAWN = "phi3:mini" # (We'll use this after your 20GB upgrade)
 # Brain models (Mocked)
 MOCK_MODELS_ON_BRAIN = ["llama3:8b", "mistral:7b"]
 
+# Stage timings, in the same histogram as the v2.0 Brain's (see dockerization/metrics.py)
+STAGE_SECONDS = metrics.histogram("sentinel_stage_seconds", "Time spent in each stage of a request.", ["stage"])
+
 # --- Hardware Watchdog (For the VM) ---
 MAX_RAM_PERCENT = 85.0
 WATCHDOG_POLL_RATE = 5
@@ -43,6 +52,26 @@ COMPLEX_KEYWORDS = [
     'report', 'review', 'optim', 'debug', 'code', 'write me a'
 ]
 
+# --- LEARNED ROUTER (Optional) ---
+# dockerization/complexity_router.py learns from the v2.0 cascade's logged
+# outcomes and saves router_model.json (ROUTER_MODEL_PATH). If that file
+# exists, the router uses it instead of the keyword scan.
+from complexity_router import HASH_BITS, ROUTER_MODEL_PATH, router_features
+ROUTER_THRESHOLD = 0.5
+
+def load_router_model(path=ROUTER_MODEL_PATH):
+    try:
+        with open(path) as f:
+            model = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if model.get("hash_bits") != HASH_BITS:
+        return None
+    model["weights"] = {int(k): w for k, w in model["weights"].items()}
+    return model
+
+ROUTER_MODEL = load_router_model()
+
 # --- 2. HARDWARE WATCHDOG (FIXED) ---
 def hardware_watchdog():
     """Monitors the VM's RAM."""
@@ -68,10 +97,11 @@ def get_redis_connection():
     
     try:
         # We use from_url, which is the most reliable method
-        r = redis.from_url(CONNECTION_STRING, decode_responses=True)
+        # Binary-safe: answers are stored as answer_codec records, like the v2.0 Brain's
+        r = redis.from_url(CONNECTION_STRING, decode_responses=False)
         r.ping()
         print(f"[Cache] SUCCESS: Connected to Redis at {REDIS_HOST}")
-        return r
+        return TieredCache(r)
     except Exception as e:
         print(f"!!! FATAL CACHE ERROR: {e}")
         print("    1. Check your REDIS_HOST, REDIS_PORT, and REDIS_PASSWORD.")
@@ -79,23 +109,30 @@ def get_redis_connection():
         return None
 
 # --- 4. MODEL CALLER ---
-def call_ai_model(model_name, prompt):
+def call_ai_model(model_name, prompt, cancel_event=None):
     """
     This function now ONLY calls the Brawn (laptop) node.
+    With a cancel_event it streams, so the call can be dropped mid-generation.
     """
     print(f"[Router] Querying BRAWN Node ({LAPTOP_IP}) for: {model_name}")
     try:
-        response = requests.post(
-            f"{BRAWN_NODE_URL}/api/generate",
-            json={"model": model_name, "prompt": prompt, "stream": False},
-            timeout=30 # 30 second timeout
-        )
-        response.raise_for_status() # Will raise an error for 500, 404, etc.
-        return response.json()['response'].strip()
+        if cancel_event is None:
+            result = brawn_client.generate(BRAWN_NODE_URL, model_name, prompt)
+        else:
+            # Dropping the stream makes Ollama stop generating
+            result = brawn_client.generate_stream(BRAWN_NODE_URL, model_name, prompt, cancel_event=cancel_event)
+        return result["response"].strip()
+    except brawn_client.GenerationCancelled:
+        print(f"[Router] '{model_name}' cancelled: vote no longer needed.")
+        return "Error: Cancelled."
     except Exception as e:
         print(f"!!! ERROR: BRAWN node offline. {e}")
         return "Error: Brawn Node is offline."
 
+def mock_ai_model(model_name, prompt, cancel_event=None):
+    print(f"[Router] Simulating MOCK request on BRAIN for: {model_name}")
+    return f"Mock response from {model_name} for a complex query."
+
 # --- 5. THE NEW "SMART ROUTER" ---
 def is_complex_query(prompt):
     """
@@ -103,6 +140,14 @@ def is_complex_query(prompt):
     It checks if the prompt is simple or complex.
     """
     print("[Router] Analyzing prompt complexity...")
+    if ROUTER_MODEL:
+        features = router_features(prompt)
+        z = ROUTER_MODEL["bias"] + sum(ROUTER_MODEL["weights"].get(f, 0.0) for f in features)
+        p_complex = 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+        print(f"[Router] {'COMPLEX' if p_complex >= ROUTER_THRESHOLD else 'SIMPLE'} query "
+              f"(learned router, p={p_complex:.2f})")
+        return p_complex >= ROUTER_THRESHOLD
+
     prompt_lower = prompt.lower()
     for keyword in COMPLEX_KEYWORDS:
         if keyword in prompt_lower:
@@ -129,50 +174,50 @@ def run_system(prompt, cache_client):
             print("[Cache] HIT! Returning answer instantly.")
             print(f"\nFINAL ANSWER (FROM CACHE):\n{cached_answer}")
             print("="*50)
-            return
+            return cached_answer
     except Exception as e:
         print(f"[Cache] WARNING: Redis check failed. {e}.")
 
     print("[Cache] MISS! Proceeding to Smart Router...")
     
+    start_time = time.time()
     final_answer = ""
     had_an_error = False
+    answered_by, votes, voters = CHEAP_MODEL, 1, 1
 
     # --- SMART ROUTER LOGIC (Step 2) ---
     if is_complex_query(prompt):
         # --- PATH A: "EXPENSIVE" 3-MODEL CONSENSUS ---
         print("[Super AI] Executing 3-Model Consensus...")
-        responses = {}
         
         # --- (THIS SECTION IS FOR AFTER YOUR 20GB RAM UPGRADE) ---
         # --- (For now, it calls 1 real + 2 mocks) ---
-        
-        # 1. Call the real "cheap" model
-        responses[CHEAP_MODEL] = call_ai_model(CHEAP_MODEL, prompt)
-        
-        # 2. Call the mock models
+        committee = {CHEAP_MODEL: call_ai_model}
         for model in MOCK_MODELS_ON_BRAIN:
-            print(f"[Router] Simulating MOCK request on BRAIN for: {model}")
-            responses[model] = f"Mock response from {model} for a complex query."
+            committee[model] = mock_ai_model
+        with metrics.stage(STAGE_SECONDS, "committee"):
+            responses = run_committee(prompt, committee, real_models={CHEAP_MODEL})
         
-        if "Error:" in responses[CHEAP_MODEL]: had_an_error = True
+        # A cancelled vote is not an error: the majority didn't need it.
+        if "Error: Brawn" in responses.get(CHEAP_MODEL, ""): had_an_error = True
 
         print("\n[Super AI] --- VOTES RECEIVED ---")
         for model, resp in responses.items(): print(f"  > {model}: {resp[:75]}...") 
 
         # --- Consensus Logic ---
-        vote_counts = Counter(responses.values())
-        most_common_answer, count = vote_counts.most_common(1)[0]
+        with metrics.stage(STAGE_SECONDS, "consensus"):
+            most_common_answer, count = similarity_vote(responses, real_models={CHEAP_MODEL})
         
         print("\n[Super AI] --- RESOLUTION ---")
-        if count > (len(responses) / 2):
-            print(f"[Super AI] Consensus Reached (Vote: {count}/{len(responses)})")
+        if count > (len(committee) / 2):
+            print(f"[Super AI] Consensus Reached (Vote: {count}/{len(committee)})")
             final_answer = most_common_answer
             print(f"\nFINAL VERIFIED ANSWER:\n{final_answer}")
         else:
             print(f"[Super AI] CONFLICT DETECTED: No clear majority.")
             final_answer = responses[CHEAP_MODEL] # Default to cheapest real model
             print(f"\nFINAL ANSWER (UNVERIFIED):\n{final_answer}")
+        votes, voters = max(count, 1), len(committee) # Only the real model can win the vote
         
     else:
         # --- PATH B: "CHEAP" SINGLE-MODEL QUERY ---
@@ -185,7 +230,8 @@ def run_system(prompt, cache_client):
     # --- SAVE TO CACHE (Step 3) ---
     if not had_an_error:
         try:
-            cache_client.set(cache_key, final_answer, ex=3600) # Save for 1 hour
+            cache_client.set(cache_key, final_answer, ex=3600, model=answered_by, votes=votes, voters=voters,
+                             latency=time.time() - start_time) # Save for 1 hour
             print("[Cache] SUCCESS: Saved new answer to cache.")
         except Exception as e:
             print(f"[Cache] WARNING: Could not write to cache. {e}")
@@ -193,6 +239,7 @@ def run_system(prompt, cache_client):
         print("[Cache] SKIPPING: An error occurred, will not save to cache.")
         
     print("="*50)
+    return final_answer
 
 # --- 7. MAIN EXECUTION ---
 if __name__ == "__main__":
@@ -1,3 +1,8 @@
+import argparse
+import json
+import re
+import struct
+import time
 import redis
 
 # --- 1. CONFIGURATION ---
@@ -7,20 +12,161 @@ REDIS_PORT = 6380
 REDIS_PASSWORD = "PASTE_YOUR_ACCESS_KEY_HERE"
 # --- END OF CONFIGURATION ---
 
-print(f"Connecting to cache at {REDIS_HOST}...")
-
-try:
-    CONNECTION_STRING = f"rediss://default:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}"
-    r = redis.from_url(CONNECTION_STRING, decode_responses=True)
-    r.ping()
-    print("[Cache] SUCCESS: Connected.")
-    
-    # --- THIS IS THE COMMAND THAT CLEARS EVERYTHING ---
-    r.flushdb()
-    
-    print("✅✅✅ SUCCESS: Your cache has been cleared. ✅✅✅")
-    print("The old 'Error: Brawn Node is offline' message is gone.")
-    print("You can now run the main 'brain_v0.3_cache.py' script.")
-
-except Exception as e:
-    print(f"!!! FATAL CACHE ERROR: {e}")
\ No newline at end of file
+# Invalidation goes key by key (SCAN + UNLINK in batches) instead of
+# flushdb, so Redis never blocks and only the answers you name are
+# regenerated. Examples:
+#   python clear_cache.py --dry-run                      # what would go
+#   python clear_cache.py --pattern "*python*"            # same as "prompt:*python*"
+#   python clear_cache.py --model tinyllama --older-than 2h
+#   python clear_cache.py --all --rewarm rewarm.jsonl     # then re-warm slowly
+KEY_PREFIX = "prompt:"        # Answers only; never lock:* single-flight leases (see answer_pattern)
+SCAN_BATCH = 500              # Keys per SCAN / UNLINK round trip
+INVALIDATION_CHANNEL = "sentinel:cache-invalidate"
+FLUSH_ALL = "*"
+
+# The header of an answer_codec record (see dockerization/answer_codec.py):
+# magic, version, flags, votes, voters, model length, latency, created_at
+ANSWER_MAGIC = b"\x00S"
+ANSWER_HEADER = struct.Struct(">2sBBBBBfd")
+HEADER_READ_BYTES = ANSWER_HEADER.size + 255 # Header plus the longest model name
+
+def parse_age(text):
+    """'90' / '90s' / '30m' / '2h' / '7d' -> seconds"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", text)
+    if not match:
+        raise argparse.ArgumentTypeError(f"bad age '{text}', use e.g. 90s, 30m, 2h or 7d")
+    number, unit = match.groups()
+    return float(number) * {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}[unit]
+
+def answer_meta(head):
+    """(model, created_at) from the start of a stored answer. Plain-text answers from older Brains: ("", 0)."""
+    if head is None or not head.startswith(ANSWER_MAGIC) or len(head) < ANSWER_HEADER.size:
+        return "", 0.0
+    fields = ANSWER_HEADER.unpack_from(head)
+    model_len, created_at = fields[5], fields[7]
+    model = head[ANSWER_HEADER.size:ANSWER_HEADER.size + model_len].decode("utf-8", errors="replace")
+    return model, created_at
+
+# --- 2. SELECTION ---
+def answer_pattern(pattern):
+    """Confines a --pattern to cached answers: "*" becomes "prompt:*"."""
+    return pattern if pattern.startswith(KEY_PREFIX) else KEY_PREFIX + pattern
+
+def matching_keys(r, pattern, model=None, older_than=None):
+    """
+    Yields batches of keys that match the pattern and, if given, the model
+    that answered and the minimum age. Model and age come from the first
+    few hundred bytes of each answer (pipelined GETRANGE), not the whole
+    value. Plain-text answers have no timestamp and count as old.
+    """
+    batch = []
+    for key in r.scan_iter(match=pattern, count=SCAN_BATCH):
+        batch.append(key)
+        if len(batch) >= SCAN_BATCH:
+            yield _filter(r, batch, model, older_than)
+            batch = []
+    if batch:
+        yield _filter(r, batch, model, older_than)
+
+def _filter(r, keys, model, older_than):
+    if model is None and older_than is None:
+        return keys
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.getrange(key, 0, HEADER_READ_BYTES - 1)
+    now = time.time()
+    selected = []
+    for key, head in zip(keys, pipe.execute()):
+        answered_by, created_at = answer_meta(head)
+        if model is not None and answered_by != model:
+            continue
+        if older_than is not None and created_at and now - created_at < older_than:
+            continue
+        selected.append(key)
+    return selected
+
+def sizes(r, keys):
+    """Bytes each key takes in Redis (MEMORY USAGE, or the value length where that command is disabled)."""
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key)
+    try:
+        return [size or 0 for size in pipe.execute()]
+    except redis.ResponseError:
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            pipe.strlen(key)
+        return pipe.execute()
+
+# --- 3. INVALIDATION ---
+def invalidate(r, pattern, model=None, older_than=None, dry_run=False, rewarm_file=None):
+    """UNLINKs the selected keys batch by batch. Returns (keys, bytes)."""
+    total_keys = total_bytes = 0
+    everything = model is None and older_than is None and pattern == KEY_PREFIX + "*"
+    rewarm = open(rewarm_file, "w", encoding="utf-8") if rewarm_file else None
+    try:
+        for keys in matching_keys(r, pattern, model, older_than):
+            if not keys:
+                continue
+            total_keys += len(keys)
+            total_bytes += sum(sizes(r, keys))
+            if rewarm is not None:
+                for key in keys:
+                    # The key holds the normalized prompt: good enough to ask again
+                    prompt = key.decode("utf-8", errors="replace")[len(KEY_PREFIX):]
+                    rewarm.write(json.dumps({"prompt": prompt}) + "\n")
+            if dry_run:
+                continue
+            pipe = r.pipeline(transaction=False)
+            pipe.unlink(*keys)
+            if not everything:
+                # Tell running Brains to drop their in-process (L1) and disk copies too
+                for key in keys:
+                    pipe.publish(INVALIDATION_CHANNEL, f"clear_cache|{key.decode('utf-8', errors='replace')}")
+            pipe.execute()
+            print(f"[Cache] Unlinked {total_keys} keys so far...")
+    finally:
+        if rewarm is not None:
+            rewarm.close()
+    if everything and not dry_run:
+        r.publish(INVALIDATION_CHANNEL, f"clear_cache|{FLUSH_ALL}")
+    return total_keys, total_bytes
+
+# --- 4. CLI ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove cached answers without flushing the whole database.")
+    parser.add_argument("--pattern", help=f"Redis glob over cached answers, {KEY_PREFIX} added if missing "
+                                          f"(default: {KEY_PREFIX}*)")
+    parser.add_argument("--all", action="store_true", help="Every cached answer")
+    parser.add_argument("--model", help="Only answers given by this model, e.g. tinyllama")
+    parser.add_argument("--older-than", type=parse_age, help="Only answers at least this old, e.g. 2h or 7d")
+    parser.add_argument("--dry-run", action="store_true", help="Count the keys and bytes, remove nothing")
+    parser.add_argument("--rewarm", metavar="FILE",
+                        help="Write the removed prompts to FILE (JSONL) for dockerization/warm_cache.py")
+    parser.add_argument("--rewarm-rate", type=float, default=30, help="Prompts per minute in the suggested re-warm")
+    args = parser.parse_args()
+
+    if not (args.pattern or args.all or args.model or args.older_than or args.dry_run):
+        parser.error("say what to remove: --all, --pattern, --model and/or --older-than (or --dry-run)")
+    pattern = answer_pattern(args.pattern or "*")
+
+    print(f"Connecting to cache at {REDIS_HOST}...")
+
+    try:
+        CONNECTION_STRING = f"rediss://default:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}"
+        # Binary-safe: answers are stored compressed (see answer_codec)
+        r = redis.from_url(CONNECTION_STRING, decode_responses=False)
+        r.ping()
+        print("[Cache] SUCCESS: Connected.")
+
+        count, size = invalidate(r, pattern, args.model, args.older_than, args.dry_run, args.rewarm)
+        if args.dry_run:
+            print(f"[Cache] DRY RUN: would remove {count} keys ({size / 1024:.1f} KB) matching '{pattern}'.")
+        else:
+            print(f"✅✅✅ SUCCESS: Removed {count} cached answers ({size / 1024:.1f} KB). ✅✅✅")
+        if args.rewarm and count:
+            print(f"[Cache] Re-warm them at {args.rewarm_rate:g} prompts/minute with:")
+            print(f"    python dockerization/warm_cache.py {args.rewarm} --rate {args.rewarm_rate:g}")
+
+    except Exception as e:
+        print(f"!!! FATAL CACHE ERROR: {e}")
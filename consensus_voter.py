@@ -0,0 +1,96 @@
+import concurrent.futures
+import itertools
+import string
+import threading
+
+# --- Consensus by Similarity ---
+# Shared by the committees in brain_v0.3_cache.py and brain_v0.5_cache_fix.py.
+# Two LLMs almost never write the exact same string, so votes are grouped by
+# how much the answers overlap (token-set Jaccard) instead of exact matches.
+# Two answers agree only when their similarity is above the threshold.
+CONSENSUS_SIMILARITY = 0.5
+STOPWORDS = frozenset(
+    "a an the is are was were be been being of to in on at for and or but it its "
+    "this that these those with as by from so than then there here i you we they".split()
+)
+_PUNCTUATION_TO_SPACES = str.maketrans(string.punctuation, " " * len(string.punctuation))
+
+def answer_tokens(answer):
+    """(words, numbers) of an answer. str.split is ~3x faster than a regex here."""
+    words = set(answer.casefold().translate(_PUNCTUATION_TO_SPACES).split())
+    words -= STOPWORDS
+    return words, set(filter(str.isdigit, words))
+
+def answer_similarity(tokens_a, tokens_b):
+    (words_a, numbers_a), (words_b, numbers_b) = tokens_a, tokens_b
+    if not words_a or not words_b:
+        return 1.0 if words_a == words_b else 0.0
+    # "2+2 is 4" and "2+2 is 5" overlap a lot but disagree
+    if numbers_a and numbers_b and not numbers_a & numbers_b:
+        return 0.0
+    shared = len(words_a & words_b)
+    return shared / (len(words_a) + len(words_b) - shared)
+
+def similarity_vote(responses, threshold=CONSENSUS_SIMILARITY, real_models=None):
+    """
+    Groups answers that say the same thing. Returns (answer, votes) for the
+    biggest group; the answer is the member closest to the rest of its
+    group. Errors don't vote. Returns (None, 0) if every vote failed.
+
+    With real_models, only answers from those models can win: mocked
+    committee members can back a real answer but never make a majority of
+    their own.
+    """
+    models = [m for m, r in responses.items() if not r.startswith("Error:")]
+    if not models:
+        return None, 0
+    tokens = {m: answer_tokens(responses[m]) for m in models}
+    similarity = {}
+    for a, b in itertools.combinations(models, 2):
+        similarity[a, b] = similarity[b, a] = answer_similarity(tokens[a], tokens[b])
+
+    candidates = models if real_models is None else [m for m in models if m in real_models]
+    best_score, best_model = None, None
+    for m in candidates: # Committee order breaks ties (the real model comes first)
+        group = [1.0] + [similarity[m, o] for o in models if o != m and similarity[m, o] > threshold]
+        score = (len(group), sum(group))
+        if best_score is None or score > best_score:
+            best_score, best_model = score, m
+    if best_model is None:
+        return None, 0
+    return responses[best_model], best_score[0]
+
+# --- Parallel Committee ---
+def run_committee(prompt, committee, real_models=None):
+    """
+    Asks every committee member at the same time.
+    committee = {model_name: caller(model_name, prompt, cancel_event)}
+
+    Stops as soon as a majority agrees and sets cancel_event for members
+    still generating. Returns {model: answer} for the votes that came in.
+    Only answers from real_models, if given, can make the quorum, so it is
+    never reached before a real model has answered. With a single real
+    model and instant mocks (the v0.x committees today) nothing is left to
+    cancel by then; early cancellation pays off once the committee has
+    several real models.
+    """
+    quorum = len(committee) // 2 + 1
+    cancel_event = threading.Event()
+    responses = {}
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=len(committee))
+    futures = {
+        pool.submit(caller, model, prompt, cancel_event): model
+        for model, caller in committee.items()
+    }
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            responses[futures[future]] = future.result()
+            # Errors never count towards a quorum
+            _answer, votes = similarity_vote(responses, real_models=real_models)
+            if votes >= quorum:
+                print(f"[Super AI] Quorum of {quorum} reached after {len(responses)}/{len(committee)} votes.")
+                break
+    finally:
+        cancel_event.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    return responses
@@ -0,0 +1,61 @@
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+# --- 1. FORMAT ---
+
+# Cached answers are stored as a small binary record instead of raw text:
+#
+#   magic "\0S" | version | flags | votes | voters | model length |
+#   latency (float32 seconds) | created_at (float64 unix time) | model | answer
+#
+# The answer is zlib-compressed when that actually saves space. Long Expert
+# answers shrink to roughly a third, which matters on a free-tier Redis.
+# Values without the magic prefix are old plain-text entries and still decode.
+MAGIC = b"\x00S"
+VERSION = 1
+FLAG_ZLIB = 0x01
+HEADER = struct.Struct(">2sBBBBBfd")
+
+COMPRESS_MIN_BYTES = 128 # Short Scout answers aren't worth compressing
+ZLIB_LEVEL = 6
+
+CachedAnswer = namedtuple("CachedAnswer", ["answer", "model", "votes", "voters", "latency", "created_at"])
+
+# --- 2. ENCODE / DECODE ---
+def encode_answer(answer, model="", votes=1, voters=1, latency=0.0, created_at=None):
+    payload = answer.encode("utf-8")
+    flags = 0
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, ZLIB_LEVEL)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, FLAG_ZLIB
+    # Cut to 255 bytes on a character boundary, never mid-character
+    model_bytes = model.encode("utf-8")[:255].decode("utf-8", errors="ignore").encode("utf-8")
+    header = HEADER.pack(
+        MAGIC, VERSION, flags, min(votes, 255), min(voters, 255), len(model_bytes),
+        latency, created_at if created_at is not None else time.time(),
+    )
+    return header + model_bytes + payload
+
+def decode_answer(raw):
+    """
+    Decodes a stored value into a CachedAnswer. raw may be bytes or a
+    memoryview (e.g. into disk_cache's mapped file); it is not copied.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    view = memoryview(raw)
+    if view[:len(MAGIC)] != MAGIC:
+        # Plain-text value written before this format existed
+        return CachedAnswer(bytes(view).decode("utf-8", errors="replace"), "", 0, 0, 0.0, 0.0)
+
+    _magic, version, flags, votes, voters, model_len, latency, created_at = HEADER.unpack_from(view)
+    if version != VERSION:
+        raise ValueError(f"unsupported cached answer version {version}")
+    body = view[HEADER.size:]
+    model = str(body[:model_len], "utf-8", "replace")
+    payload = body[model_len:]
+    answer = str(zlib.decompress(payload) if flags & FLAG_ZLIB else payload, "utf-8")
+    return CachedAnswer(answer, model, votes, voters, latency, created_at)
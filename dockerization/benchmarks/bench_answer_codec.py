@@ -0,0 +1,50 @@
+"""
+Answer codec benchmark: bytes stored per answer and encode/decode cost,
+raw text (the old format) vs the compact answer_codec record.
+
+    python benchmarks/bench_answer_codec.py
+
+Sample answers are slices of real English prose (the project README and
+LICENSE), from a short Scout reply up to a long Expert essay.
+"""
+import os
+import timeit
+
+import common
+from answer_codec import encode_answer, decode_answer
+
+REPO_ROOT = os.path.dirname(common.BRAIN_DIR)
+SIZES = [60, 150, 500, 1000, 2000, 4000, 8000]
+REPEAT = 2000
+
+def load_corpus():
+    text = ""
+    for name in ("README.md", "LICENSE"):
+        path = os.path.join(REPO_ROOT, name)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                text += f.read() + "\n"
+    return text
+
+if __name__ == "__main__":
+    corpus = load_corpus()
+    print(f"[Bench] Corpus: {len(corpus):,} chars, {REPEAT} runs per size\n")
+    print(f"{'answer':>8} {'raw B':>7} {'codec B':>8} {'saved':>7} {'encode us':>10} {'decode us':>10}")
+
+    total_raw = total_encoded = 0
+    for size in SIZES:
+        answer = corpus[:size]
+        raw_bytes = len(answer.encode("utf-8"))
+        record = encode_answer(answer, model="llama3:8b", votes=2, voters=3, latency=41.7)
+        assert decode_answer(record).answer == answer
+
+        encode_us = 1e6 * timeit.timeit(lambda: encode_answer(answer, "llama3:8b", 2, 3, 41.7), number=REPEAT) / REPEAT
+        decode_us = 1e6 * timeit.timeit(lambda: decode_answer(record), number=REPEAT) / REPEAT
+        total_raw += raw_bytes
+        total_encoded += len(record)
+        print(f"{size:>8} {raw_bytes:>7} {len(record):>8} {100.0 * (1 - len(record) / raw_bytes):>6.0f}% "
+              f"{encode_us:>10.1f} {decode_us:>10.1f}")
+
+    print(f"\nAll sizes together: {total_raw:,} B raw -> {total_encoded:,} B "
+          f"({100.0 * (1 - total_encoded / total_raw):.0f}% less Redis memory for values, "
+          f"metadata included)")
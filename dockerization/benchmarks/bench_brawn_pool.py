@@ -0,0 +1,81 @@
+"""
+Brawn pool against three local fake Ollama nodes. Node C has no llama3.
+Scout and Expert calls are routed concurrently, through a Brawn scheduler
+sized for the pool as in the Brain. Halfway through, node A goes down; it
+comes back later and should be readmitted by the health checks. No node
+should ever run more llama3 calls at once than its per-node cap (1).
+
+    python benchmarks/bench_brawn_pool.py [calls]
+"""
+import sys
+import threading
+import time
+import concurrent.futures
+from collections import Counter
+
+import common
+import brawn_client
+from brawn_pool import BrawnPool
+from brawn_scheduler import BrawnScheduler
+from fake_ollama import start_fake_ollama, stop_fake_ollama
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+FULL = {"tinyllama": (0.02, 12), "llama3:8b": (0.10, 30)}
+SCOUT_ONLY = {"tinyllama": (0.02, 12)}
+
+def run_phase(label, pool, scheduler, calls):
+    served = Counter()
+    errors = Counter()
+    samples = []
+    running, peak, lock = Counter(), Counter(), threading.Lock()
+
+    def generate(url, session, model, prompt):
+        with lock:
+            served[url[-5:], model] += 1
+            running[url, model] += 1
+            peak[url[-5:], model] = max(peak[url[-5:], model], running[url, model])
+        try:
+            return brawn_client.generate(url, model, prompt, session)
+        finally:
+            with lock:
+                running[url, model] -= 1
+
+    def one(i):
+        model = "llama3:8b" if i % 4 == 0 else "tinyllama"
+        start = time.perf_counter()
+        try:
+            with scheduler.slot(model):
+                pool.call(model, lambda url, session: generate(url, session, model, f"bench {i}"))
+        except Exception as e:
+            errors[type(e).__name__] += 1
+            return
+        samples.append(time.perf_counter() - start)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as workers:
+        list(workers.map(one, range(calls)))
+    print(f"\n{label}: {len(samples)} ok, errors {dict(errors) or 0}, "
+          f"p50 {1000 * common.percentile(samples, 50):.0f} ms, p99 {1000 * common.percentile(samples, 99):.0f} ms")
+    for (port, model), count in sorted(served.items()):
+        print(f"  node :{port} {model:<10} {count:4d} calls, at most {peak[port, model]} at once")
+
+if __name__ == "__main__":
+    servers = [start_fake_ollama(port=0, profiles=FULL), start_fake_ollama(port=0, profiles=FULL),
+               start_fake_ollama(port=0, profiles=SCOUT_ONLY)]
+    ports = [server.server_address[1] for server in servers]
+    pool = BrawnPool([f"http://127.0.0.1:{port}" for port in ports], health_interval=0.5)
+    scheduler = BrawnScheduler(nodes=len(pool))
+    pool.start_health_checks()
+    time.sleep(0.2)
+    print(f"[Bench] nodes A=:{ports[0]} B=:{ports[1]} C=:{ports[2]} (C has no llama3)")
+
+    run_phase("All nodes up", pool, scheduler, CALLS)
+
+    stop_fake_ollama(servers[0])
+    run_phase("Node A down", pool, scheduler, CALLS)
+    print(f"  node A healthy: {pool.nodes[0].healthy}")
+
+    servers[0] = start_fake_ollama(port=ports[0], profiles=FULL)
+    time.sleep(1.2) # A couple of probe rounds
+    print(f"\n[Bench] node A restarted, healthy: {pool.nodes[0].healthy}")
+    run_phase("Node A back", pool, scheduler, CALLS)
+    pool.stop.set()
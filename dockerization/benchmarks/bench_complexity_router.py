@@ -0,0 +1,37 @@
+"""
+Per-prompt cost of the learned complexity router (tokenize, hash, score),
+and, given a cascade outcome log, its held-out accuracy vs the keyword prior.
+
+    python benchmarks/bench_complexity_router.py [router_outcomes.jsonl]
+"""
+import sys
+import time
+import random
+
+import common
+from complexity_router import ComplexityRouter, read_outcomes, train, accuracy
+
+WORDS = ("explain compare the a what is how why code python tcp udp history of summarize "
+         "write me a poem about capital france debug this function 2+2 analyze trend").split()
+
+if __name__ == "__main__":
+    rng = random.Random(7)
+    prompts = [" ".join(rng.choices(WORDS, k=rng.randint(3, 40))) for _ in range(20000)]
+    router = ComplexityRouter()
+    for prompt in prompts[:1000]:
+        router.learn(prompt, rng.random() < 0.3) # Fill the weight table
+
+    samples = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        router.predict(prompt)
+        samples.append(time.perf_counter() - start)
+    print(f"[Bench] predict() over {len(prompts)} prompts of 3-40 words: "
+          f"p50 {1e6 * common.percentile(samples, 50):.1f} us, p99 {1e6 * common.percentile(samples, 99):.1f} us")
+
+    if len(sys.argv) > 1:
+        outcomes = list(read_outcomes(sys.argv[1]))
+        held_out = outcomes[::10]
+        trained = train([o for i, o in enumerate(outcomes) if i % 10])
+        print(f"[Bench] {len(outcomes)} logged outcomes: held-out accuracy {accuracy(trained, held_out):.1%}, "
+              f"keyword prior {accuracy(ComplexityRouter(), held_out):.1%}")
@@ -0,0 +1,46 @@
+"""
+Micro-benchmark: new connection per call (requests.post) vs the pooled
+keep-alive session in brawn_client, against a local zero-latency fake Ollama.
+
+    python benchmarks/bench_connection_pool.py [calls]
+"""
+import sys
+import time
+import requests
+
+import common
+import brawn_client
+from fake_ollama import start_fake_ollama
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+ZERO_LATENCY = {"tinyllama": (0.0, 12)}
+
+def run(label, post, server, base_url):
+    server.connections_opened = 0
+    samples = []
+    for i in range(CALLS):
+        start = time.perf_counter()
+        response = post(
+            f"{base_url}/api/generate",
+            json={"model": "tinyllama", "prompt": f"bench {i}", "stream": False},
+            timeout=brawn_client.model_timeout("tinyllama"),
+        )
+        response.raise_for_status()
+        response.json()
+        samples.append(time.perf_counter() - start)
+    mean_ms = 1000 * sum(samples) / len(samples)
+    print(f"{label:<22} mean {mean_ms:6.3f} ms  p99 {1000 * common.percentile(samples, 99):6.3f} ms  "
+          f"TCP connections: {server.connections_opened}")
+    return mean_ms
+
+if __name__ == "__main__":
+    server = start_fake_ollama(port=0, profiles=ZERO_LATENCY)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"[Bench] {CALLS} sequential /api/generate calls against {base_url}\n")
+
+    before = run("requests.post (before)", requests.post, server, base_url)
+    after = run("pooled session (after)", brawn_client.build_session().post, server, base_url)
+
+    print(f"\nConnection setup cost per call: ~{before - after:.3f} ms "
+          f"({100 * (before - after) / before:.0f}% of a zero-latency call)")
+    server.shutdown()
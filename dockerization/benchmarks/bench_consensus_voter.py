@@ -0,0 +1,49 @@
+"""
+Cost of the similarity voter used by the v0.3/v0.5 committees, for 3-7
+long answers (~300 words each), compared with exact-string Counter voting.
+Also shows how often each finds a majority when the models agree in
+substance but not word for word.
+
+    python benchmarks/bench_consensus_voter.py [rounds]
+"""
+import os
+import sys
+import time
+import random
+from collections import Counter
+
+import common
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+VOCAB = [f"{a}{b}{c}" for a in "bcdfghklmnprstvz" for b in ("ar", "el", "ion", "ust", "ow", "ine", "ent", "ick")
+         for c in "aeiouy"]
+
+def paraphrase(base, rng, edits=0.15):
+    """The same answer with ~15% of its words swapped, like a second model's wording."""
+    return " ".join(rng.choice(VOCAB) if rng.random() < edits else word for word in base)
+
+def make_committee(n, rng):
+    agree = n // 2 + 1 # A majority says the same thing, in its own words
+    base = [rng.choice(VOCAB) for _ in range(300)]
+    other = [rng.choice(VOCAB) for _ in range(300)]
+    answers = [paraphrase(base, rng) for _ in range(agree)] + [paraphrase(other, rng) for _ in range(n - agree)]
+    rng.shuffle(answers)
+    return {f"model{i}": answer for i, answer in enumerate(answers)}
+
+if __name__ == "__main__":
+    sys.path.append(os.path.dirname(common.BRAIN_DIR))
+    from consensus_voter import similarity_vote
+    rng = random.Random(3)
+    print(f"[Bench] {ROUNDS} votes per committee size, ~300-word answers\n")
+    for n in range(3, 8):
+        committees = [make_committee(n, rng) for _ in range(ROUNDS)]
+        samples, exact_groups, counter_majorities = [], 0, 0
+        for responses in committees:
+            start = time.perf_counter()
+            _answer, votes = similarity_vote(responses)
+            samples.append(time.perf_counter() - start)
+            exact_groups += votes == n // 2 + 1 # The paraphrases grouped, the dissenters not
+            counter_majorities += Counter(responses.values()).most_common(1)[0][1] > n / 2
+        print(f"{n} answers: p50 {1e3 * common.percentile(samples, 50):.3f} ms  "
+              f"p99 {1e3 * common.percentile(samples, 99):.3f} ms  "
+              f"majority found {100 * exact_groups / ROUNDS:.0f}% (exact-match Counter: {100 * counter_majorities / ROUNDS:.0f}%)")
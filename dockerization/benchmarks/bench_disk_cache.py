@@ -0,0 +1,94 @@
+"""
+Disk cache tier vs Redis on the same host: get latency (decode included),
+set throughput, and the disk-only costs (reopening the log on boot,
+compaction).
+
+    python benchmarks/bench_disk_cache.py [entries]
+
+Redis is measured when BENCH_REDIS_URL is set and answers a PING. Only the
+benchmark's own keys (common.BENCH_MARKER:*) are written and deleted.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import common
+from answer_codec import encode_answer, decode_answer
+from disk_cache import DiskCache
+
+ANSWER_SIZES = [60, 500, 2000, 8000]
+
+def make_values(count, rng):
+    words = "the scout answered what the expert would have explained about tcp udp and python".split()
+    values = {}
+    for i in range(count):
+        answer = " ".join(rng.choices(words, k=rng.choice(ANSWER_SIZES) // 6))
+        values[f"{common.BENCH_MARKER}:{i:08d}"] = encode_answer(answer, "llama3:8b", 2, 3, 41.7)
+    return values
+
+def time_gets(get, keys):
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        decode_answer(get(key))
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def report(name, samples):
+    print(f"  {name:<24} p50 {1e6 * common.percentile(samples, 50):7.1f} us   "
+          f"p99 {1e6 * common.percentile(samples, 99):7.1f} us")
+
+def bench_disk(values, directory, rng):
+    path = os.path.join(directory, "bench_cache.log")
+    disk = DiskCache(path)
+    start = time.perf_counter()
+    for key, raw in values.items():
+        disk.set(key, raw, 3600)
+    set_seconds = time.perf_counter() - start
+    print(f"[Bench] Disk: {len(values)} sets in {set_seconds:.2f}s ({len(values) / set_seconds:,.0f}/s), "
+          f"{disk.stats()['file_bytes'] / 1e6:.1f} MB log")
+
+    keys = rng.sample(list(values), min(len(values), 20000))
+    report("get + decode (mmap)", time_gets(lambda key: disk.get(key)[0], keys))
+
+    disk.close()
+    start = time.perf_counter()
+    disk = DiskCache(path)
+    print(f"  reopen (index rebuild)   {1000 * (time.perf_counter() - start):7.1f} ms for {len(disk.keys())} entries")
+
+    for key in list(values)[: len(values) * 2 // 3]:
+        disk.delete(key)
+    start = time.perf_counter()
+    disk.compact()
+    print(f"  compact (1/3 live)       {1000 * (time.perf_counter() - start):7.1f} ms, "
+          f"log now {disk.stats()['file_bytes'] / 1e6:.1f} MB")
+    disk.close()
+
+def bench_redis(values, rng):
+    r, no_redis = common.bench_redis()
+    if r is None:
+        print(f"[Bench] Redis: skipped, {no_redis}")
+        return
+    common.delete_bench_keys(r)
+    start = time.perf_counter()
+    for key, raw in values.items():
+        r.set(key, raw, ex=3600)
+    set_seconds = time.perf_counter() - start
+    print(f"[Bench] Redis: {len(values)} sets in {set_seconds:.2f}s ({len(values) / set_seconds:,.0f}/s)")
+    keys = rng.sample(list(values), min(len(values), 20000))
+    report("get + decode (loopback)", time_gets(r.get, keys))
+    common.delete_bench_keys(r)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rng = random.Random(7)
+    values = make_values(count, rng)
+    directory = tempfile.mkdtemp(prefix="sentinel-disk-cache-")
+    try:
+        bench_disk(values, directory, rng)
+    finally:
+        shutil.rmtree(directory)
+    bench_redis(values, rng)
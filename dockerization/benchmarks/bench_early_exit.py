@@ -0,0 +1,94 @@
+"""
+Early exit: the old length rule vs the confidence score (fixed and
+self-tuning threshold) on labelled, simulated Scout answers.
+
+Each simulated answer comes with what the real Scout call would give the
+policy: text of some length, Ollama's token logprobs, the router's
+probability that the prompt is complex, and a second sample that agrees
+with the first to some degree. Its label says whether the Expert was
+actually needed. Halfway through, the share of answers that need the
+Expert grows, to show the self-tuning threshold holding the escalation rate
+near its target.
+
+    python benchmarks/bench_early_exit.py [answers] [seed]
+"""
+import random
+import sys
+
+import common # Puts the Brain code on the path
+from early_exit import EarlyExitPolicy, ConfidenceScorer, LengthRule
+
+ANSWERS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+SEED = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+WINDOW = ANSWERS // 10
+VOCAB = [f"w{i}" for i in range(2000)]
+
+# name: (share before the shift, share after, needs the Expert, tokens, mean logprob (mu, sigma),
+#        router p_complex range, agreement of a second sample)
+KINDS = {
+    "short and right":  (0.58, 0.45, False, (8, 35), (-0.40, 0.15), (0.05, 0.25), 0.85),
+    "long and right":   (0.22, 0.20, False, (45, 130), (-0.45, 0.15), (0.05, 0.30), 0.75),
+    "short and wrong":  (0.08, 0.12, True, (8, 30), (-1.30, 0.30), (0.10, 0.50), 0.30),
+    "complex, rambles": (0.10, 0.19, True, (60, 200), (-0.90, 0.25), (0.50, 0.95), 0.35),
+    "truncated":        (0.02, 0.04, True, (256, 256), (-0.60, 0.20), (0.20, 0.90), 0.50),
+}
+
+def simulate(rng, shifted):
+    """One Scout answer: (kind, needs Expert, answer, details, p_complex, second sample)."""
+    shares = [kind[1] if shifted else kind[0] for kind in KINDS.values()]
+    name = rng.choices(list(KINDS), shares)[0]
+    _before, _after, needs_expert, (low, high), (mu, sigma), (p_low, p_high), agreement = KINDS[name]
+    words = [rng.choice(VOCAB) for _ in range(rng.randint(low, high))]
+    second = [word if rng.random() < agreement else rng.choice(VOCAB) for word in words]
+    details = {
+        "eval_count": len(words),
+        "done_reason": "length" if name == "truncated" else "stop",
+        "logprobs": [{"token": word, "logprob": min(0.0, rng.gauss(mu, sigma))} for word in words],
+    }
+    return name, needs_expert, " ".join(words), details, rng.uniform(p_low, p_high), " ".join(second)
+
+def run(policy, answers):
+    """
+    ([(escalation rate, share of bad answers served, share of needless
+    escalations) per window], overall figures).
+    """
+    windows, stats = [], {"escalated": 0, "bad_served": 0, "needless": 0, "second_samples": 0}
+    window = [0, 0, 0]
+    for index, (_name, needs_expert, answer, details, p_complex, second) in enumerate(answers):
+        def second_opinion(second=second):
+            stats["second_samples"] += 1
+            return second
+        decision = policy.decide(answer, details, p_complex, second_opinion)
+        window[0] += decision.escalate
+        window[1] += needs_expert and not decision.escalate
+        window[2] += decision.escalate and not needs_expert
+        if (index + 1) % WINDOW == 0:
+            windows.append(tuple(count / WINDOW for count in window))
+            window = [0, 0, 0]
+    stats["escalated"], stats["bad_served"], stats["needless"] = (
+        sum(w[i] for w in windows) / len(windows) for i in range(3))
+    return windows, stats
+
+if __name__ == "__main__":
+    rng = random.Random(SEED)
+    answers = [simulate(rng, shifted=index >= ANSWERS // 2) for index in range(ANSWERS)]
+    policies = {
+        "length rule (< 150 chars)": EarlyExitPolicy(LengthRule(), threshold=0.5),
+        "confidence, fixed 0.5": EarlyExitPolicy(ConfidenceScorer(), threshold=0.5, target=0),
+        "confidence, self-tuning": EarlyExitPolicy(ConfidenceScorer()),
+    }
+    target = policies["confidence, self-tuning"].target
+    print(f"[Bench] {ANSWERS} simulated Scout answers, harder halfway through "
+          f"(Expert needed for {100 * sum(k[0] for k in KINDS.values() if k[2]):.0f}% -> "
+          f"{100 * sum(k[1] for k in KINDS.values() if k[2]):.0f}%). Target escalation {100 * target:.0f}%.")
+    results = {name: run(policy, answers) for name, policy in policies.items()}
+
+    print(f"  {'':27} {'escalated':>9} {'bad answers served':>19} {'needless escalations':>21} {'2nd samples':>12}")
+    for name, (_windows, stats) in results.items():
+        print(f"  {name:27} {100 * stats['escalated']:8.1f}% {100 * stats['bad_served']:18.1f}% "
+              f"{100 * stats['needless']:20.1f}% {stats['second_samples']:12d}")
+
+    print("  Escalation rate per window of " + str(WINDOW) + " answers:")
+    for name, (windows, _stats) in results.items():
+        print(f"  {name:27} " + " ".join(f"{100 * w[0]:3.0f}%" for w in windows))
+    print(f"  Self-tuning threshold ended at {policies['confidence, self-tuning'].threshold:.2f}.")
@@ -0,0 +1,217 @@
+"""
+Load test: the v0.3, v0.5 and v2.0 engines head to head, against the same
+deterministic fake Brawn node and the same open-loop workload.
+
+Requests arrive at a fixed average rate (seeded Poisson arrivals) whether
+or not earlier ones have finished, like real users. --hit-ratio of them
+repeat a prompt answered during warm-up; the rest are new, --complex of
+those being "explain ..." prompts that the v0.5 router sends to the
+committee and whose Scout answer the v2.0 cascade escalates. Latency is
+measured from each request's scheduled arrival, so an engine that backs up
+can't hide its queueing. Brawn utilization is the share of the fake node's
+generation slots (--parallel, like OLLAMA_NUM_PARALLEL) that were busy.
+
+    python benchmarks/bench_load.py [--qps 10] [--duration 20] [--hit-ratio 0.5]
+        [--complex 0.2] [--engines v0.3,v0.5,v2.0] [--save run.json] [--baseline run.json]
+
+With --baseline, exits with status 1 if any engine's throughput dropped or
+its p99 rose by more than --tolerance compared with a saved run.
+
+Answers are cached in Redis at BENCH_REDIS_URL when it is set and answers
+a PING; every prompt starts with common.BENCH_MARKER, and only those keys
+are deleted before each engine. Otherwise every engine gets the Brain's own
+in-process + disk cache tiers in a temp directory. Answers that come back
+as an "Error: ..." string count as errors, like exceptions.
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import common
+from cache_tiers import TieredCache
+from disk_cache import DiskCache
+from fake_ollama import start_fake_ollama, brawn_usage, reset_usage
+
+REPO_ROOT = os.path.dirname(common.BRAIN_DIR)
+
+# The fake node: (seconds per request, words per answer). 24 words puts the
+# Scout's answer to a simple prompt just under the old 150-character
+# early-exit limit (EARLY_EXIT_SCORER=length) and its answer to a complex one
+# just over it; the confidence score tells them apart by the prompt.
+PROFILES = {
+    "tinyllama": (0.05, 24),
+    "phi3:mini": (0.20, 40),
+    "mistral:7b": (0.30, 40),
+    "llama3:8b": (0.50, 60),
+}
+# Engine -> (script, entry point taking (prompt, cache_client))
+ENGINES = {
+    "v0.3": ("brain_v0.3_cache.py", "run_consensus_engine"),
+    "v0.5": ("brain_v0.5_cache_fix.py", "run_system"),
+    "v2.0": (os.path.join("dockerization", "brain_v2.0_cascade.py"), "run_system"),
+}
+HOT_PROMPTS = 50      # Distinct prompts behind the cache hits
+WARM_WORKERS = 4
+P99_NOISE_FLOOR = 0.02 # Seconds; smaller p99 changes are scheduling noise, not regressions
+VOCAB = [f"{a}{b}{c}" for a in "bcdfghklmnprstvz" for b in ("ar", "el", "ion", "ust", "ow", "ine", "ent", "ick")
+         for c in "aeiouy"]
+
+# --- Workload ---
+def new_prompt(rng, complex_share):
+    words = [rng.choice(VOCAB) for _ in range(4)]
+    if rng.random() < complex_share:
+        return (f"{common.BENCH_MARKER} explain the tradeoffs between {words[0]} {words[1]} "
+                f"and {words[2]} {words[3]} in production systems")
+    return f"{common.BENCH_MARKER} what is {words[0]} {words[1]}?"
+
+def build_workload(qps, duration, hit_ratio, complex_share, seed):
+    """(hot prompts, [(arrival offset in seconds, prompt), ...]): the same for every engine."""
+    rng = random.Random(seed)
+    hot = [new_prompt(rng, complex_share) for _ in range(HOT_PROMPTS)]
+    schedule, t = [], rng.expovariate(qps)
+    while t < duration:
+        prompt = rng.choice(hot) if rng.random() < hit_ratio else new_prompt(rng, complex_share)
+        schedule.append((t, prompt))
+        t += rng.expovariate(qps)
+    return hot, schedule
+
+# --- Engines and caches ---
+def load_engine(name, brawn_url):
+    """The engine's entry point, pointed at the fake node."""
+    path, entry = ENGINES[name]
+    os.environ["BRAWN_NODE_URL"] = brawn_url # v2.0 reads it at import
+    module = common.load_brain(os.path.join(REPO_ROOT, path), "brain_" + name.replace(".", ""))
+    module.BRAWN_NODE_URL = brawn_url        # v0.x have it hard-coded
+    return getattr(module, entry)
+
+# The engines' answers (prompt:<prompt>) and v2.0's single-flight leases
+BENCH_KEY_PREFIXES = ("prompt:", "lock:prompt:")
+
+def make_cache(r, directory, name):
+    if r is not None:
+        common.delete_bench_keys(r, BENCH_KEY_PREFIXES)
+        return TieredCache(r) # Every engine stores answer_codec records
+    return TieredCache(None, disk=DiskCache(os.path.join(directory, f"{name}.log"))) # No Redis: L1 + disk only
+
+# --- Runs ---
+def run_open_loop(ask, cache, schedule, concurrency):
+    """Replays the schedule. Returns ([(latency, ok), ...], seconds from the first arrival to the last answer)."""
+    start = time.perf_counter() + 0.05
+
+    def one(arrival, prompt):
+        try:
+            answer = ask(prompt, cache)
+            if isinstance(answer, bytes): # A v0.x cache hit, straight from Redis
+                answer = answer.decode("utf-8", errors="replace")
+            ok = isinstance(answer, str) and not answer.startswith("Error")
+        except Exception: # e.g. BrawnOverloaded: a 503 in server mode
+            ok = False
+        return time.perf_counter() - (start + arrival), ok
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for arrival, prompt in schedule:
+            delay = start + arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(one, arrival, prompt))
+        results = [future.result() for future in futures]
+    return results, time.perf_counter() - start
+
+def bench_engine(name, server, r, directory, hot, schedule, args):
+    brawn_url = f"http://127.0.0.1:{server.server_address[1]}"
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        ask = load_engine(name, brawn_url)
+        cache = make_cache(r, directory, name)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=WARM_WORKERS) as pool:
+            list(pool.map(lambda prompt: ask(prompt, cache), hot))
+        reset_usage(server)
+        results, wall = run_open_loop(ask, cache, schedule, args.concurrency)
+        usage = brawn_usage(server)
+
+    latencies = [latency for latency, ok in results if ok]
+    busy = sum(seconds for _calls, seconds in usage.values())
+    return {
+        "throughput": len(latencies) / wall,
+        "p50": common.percentile(latencies, 50),
+        "p95": common.percentile(latencies, 95),
+        "p99": common.percentile(latencies, 99),
+        "errors": len(results) - len(latencies),
+        "brawn_utilization": busy / (args.parallel * wall),
+        "brawn_calls": {model: calls for model, (calls, _seconds) in sorted(usage.items())},
+    }
+
+def report(name, result):
+    calls = ", ".join(f"{model} {count}" for model, count in result["brawn_calls"].items()) or "none"
+    print(f"  {name:<5} {result['throughput']:6.1f} req/s  p50 {1000 * result['p50']:7.0f} ms  "
+          f"p95 {1000 * result['p95']:7.0f} ms  p99 {1000 * result['p99']:7.0f} ms  "
+          f"errors {result['errors']:3d}  Brawn {100 * result['brawn_utilization']:3.0f}% busy ({calls})")
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result["throughput"] < old["throughput"] * (1 - tolerance):
+            found.append(f"{name}: throughput {old['throughput']:.1f} -> {result['throughput']:.1f} req/s")
+        if result["p99"] > old["p99"] * (1 + tolerance) and result["p99"] - old["p99"] > P99_NOISE_FLOOR:
+            found.append(f"{name}: p99 {1000 * old['p99']:.0f} -> {1000 * result['p99']:.0f} ms")
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop load test of the Brain engines against a fake Brawn node.")
+    parser.add_argument("--qps", type=float, default=10, help="Average arrivals per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of arrivals")
+    parser.add_argument("--hit-ratio", type=float, default=0.5, help="Share of requests for an already cached prompt")
+    parser.add_argument("--complex", type=float, default=0.2, help="Share of new prompts that are complex")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Comma-separated, from " + ", ".join(ENGINES))
+    parser.add_argument("--parallel", type=int, default=4, help="Generations the fake node runs at once")
+    parser.add_argument("--concurrency", type=int, default=256, help="Requests the load generator keeps in flight")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", metavar="FILE", help="Write the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="Fail on a regression against these saved results")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    # Deterministic runs: no learned-router outcome log, no urllib3 pool warnings
+    os.environ.setdefault("COMPLEXITY_ROUTER", "0")
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    hot, schedule = build_workload(args.qps, args.duration, args.hit_ratio, args.complex, args.seed)
+    server = start_fake_ollama(port=0, profiles=PROFILES, parallel=args.parallel)
+    r, no_redis = common.bench_redis()
+    print(f"[Bench] {len(schedule)} requests over {args.duration:g}s ({args.qps:g}/s open loop), "
+          f"{100 * args.hit_ratio:.0f}% cache hits, {100 * args.complex:.0f}% of new prompts complex. "
+          f"Fake node: {args.parallel} slots, " + ", ".join(f"{m} {s:g}s" for m, (s, _w) in PROFILES.items()))
+    cache_name = f"Redis at {common.BENCH_REDIS_URL}" if r is not None else f"in-process + disk tiers ({no_redis})"
+    print(f"[Bench] Cache: {cache_name}")
+
+    directory = tempfile.mkdtemp(prefix="sentinel_load_")
+    results = {}
+    try:
+        for name in args.engines.split(","):
+            results[name] = bench_engine(name, server, r, directory, hot, schedule, args)
+            report(name, results[name])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        if r is not None:
+            common.delete_bench_keys(r, BENCH_KEY_PREFIXES)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"[Bench] REGRESSION {line}")
+        sys.exit(1 if found else 0)
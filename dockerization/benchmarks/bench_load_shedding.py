@@ -0,0 +1,210 @@
+"""
+Load-shedding harness: simulated memory pressure, no real RAM needed.
+
+1. A RAM/CPU trace (steady, a slow leak that hovers around MAX_RAM_PERCENT,
+   a spike past SHED_RAM_CRITICAL, recovery) is fed to the watchdog's
+   LoadShedder with simulated time. Level changes are compared with a
+   plain threshold check, which flaps on every wobble.
+2. Hand-made traces without noise check the watermarks: a level is
+   entered on the sample that crosses its threshold, left only after
+   usage stayed under the exit threshold for SHED_COOLDOWN, and never
+   flaps on a wobble around either one.
+3. The Brain is driven against a local fake Ollama node while the
+   shedder is pinned to each level, showing what it does: full cascade,
+   Scout only, or 503 + Retry-After for cache misses.
+
+Every check that fails is printed and the run exits with status 1.
+
+    python benchmarks/bench_load_shedding.py [seed]
+"""
+import contextlib
+import io
+import math
+import os
+import random
+import sys
+
+import common
+import load_shedder
+from load_shedder import LoadShedder, BrainOverloaded, LEVEL_NAMES, NORMAL, ELEVATED, CRITICAL
+from fake_ollama import start_fake_ollama
+
+POLL = load_shedder.WATCHDOG_POLL_RATE
+# (seconds, RAM % at the start, RAM % at the end, CPU %)
+PHASES = [
+    (60, 55, 60, 30),    # Steady
+    (120, 60, 86, 50),   # Leak up to the threshold...
+    (180, 86, 86, 60),   # ...and hover around it
+    (20, 86, 97, 95),    # Spike
+    (60, 97, 88, 80),    # Partial recovery: still high
+    (120, 88, 62, 40),   # Back to normal
+]
+NOISE = 2.5 # +- percentage points per sample
+# The noisy trace climbs through every level once and comes back down
+EXPECTED_CHANGES = [(NORMAL, ELEVATED), (ELEVATED, CRITICAL), (CRITICAL, ELEVATED), (ELEVATED, NORMAL)]
+
+def trace(rng):
+    t = 0.0
+    for seconds, ram_start, ram_end, cpu in PHASES:
+        steps = int(seconds / POLL)
+        for step in range(steps):
+            ram = ram_start + (ram_end - ram_start) * step / steps
+            yield t, ram + rng.uniform(-NOISE, NOISE), cpu + rng.uniform(-3 * NOISE, 3 * NOISE)
+            t += POLL
+
+def simulate(rng):
+    """Runs the noisy trace. Returns what went wrong."""
+    shedder = LoadShedder()
+    plain = LoadShedder() # Same thresholds, no hysteresis: level = whatever this sample calls for
+    plain_level, plain_flips, seconds_at = NORMAL, 0, {level: 0.0 for level in LEVEL_NAMES}
+    timeline = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t, ram, cpu in trace(rng):
+            before = shedder.state.level
+            state = shedder.update(ram, cpu, now=t)
+            seconds_at[state.level] += POLL
+            if state.level != before:
+                timeline.append((t, ram, cpu, before, state.level))
+            level = plain._target(ram, cpu)
+            plain_flips += level != plain_level
+            plain_level = level
+    print(f"[Bench] {sum(seconds_at.values()):.0f}s of simulated load, one sample every {POLL:g}s, "
+          f"RAM noise +-{NOISE}%:")
+    for t, ram, cpu, before, after in timeline:
+        print(f"  t={t:5.0f}s  RAM {ram:5.1f}%  CPU {cpu:5.1f}%  {LEVEL_NAMES[before]:>8} -> {LEVEL_NAMES[after]}")
+    print(f"  With hysteresis: {shedder.transitions} level changes. "
+          f"Plain thresholds: {plain_flips} level changes.")
+    print("  Time per level: " + ", ".join(f"{LEVEL_NAMES[l]} {s:.0f}s" for l, s in seconds_at.items()) + "\n")
+
+    wrong = []
+    changes = [(before, after) for _t, _ram, _cpu, before, after in timeline]
+    if changes != EXPECTED_CHANGES:
+        wrong.append("noisy trace: level changes " + describe(changes) + ", expected " + describe(EXPECTED_CHANGES))
+    return wrong
+
+def describe(changes):
+    return ", ".join(f"{LEVEL_NAMES[before]}->{LEVEL_NAMES[after]}" for before, after in changes) or "none"
+
+class Trace:
+    """Feeds hand-made (RAM, CPU) samples to one LoadShedder, POLL seconds apart."""
+
+    def __init__(self):
+        self.shedder = LoadShedder()
+        self.now = 0.0
+
+    def feed(self, samples):
+        """Returns the level after each sample."""
+        levels = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for ram, cpu in samples:
+                levels.append(self.shedder.update(ram, cpu, now=self.now).level)
+                self.now += POLL
+        return levels
+
+    def rejects(self):
+        try:
+            self.shedder.check_admission()
+        except BrainOverloaded:
+            return True
+        return False
+
+def check_hysteresis():
+    """Returns what the shedder gets wrong on hand-made traces."""
+    wrong = []
+    def expect(ok, message):
+        if not ok:
+            wrong.append(message)
+
+    cooldown_samples = math.ceil(load_shedder.SHED_COOLDOWN / POLL)
+    long = 3 * cooldown_samples + 5
+    high, low = load_shedder.MAX_RAM_PERCENT, load_shedder.SHED_RAM_EXIT
+    critical, critical_low = load_shedder.SHED_RAM_CRITICAL, load_shedder.SHED_RAM_CRITICAL_EXIT
+    cpu = 10.0
+
+    trace = Trace()
+    levels = trace.feed([(high - 1, cpu)] * long)
+    expect(set(levels) == {NORMAL} and not trace.rejects(), f"RAM {high - 1:g}% (under {high:g}%) should stay normal")
+
+    # Up: each level on the first sample past its threshold
+    levels = trace.feed([(high, cpu)])
+    expect(levels == [ELEVATED] and not trace.rejects(), f"RAM {high:g}% should go elevated at once, still admitting")
+    levels = trace.feed([(critical, cpu)])
+    expect(levels == [CRITICAL] and trace.rejects(), f"RAM {critical:g}% should go critical at once and 503")
+
+    # Hovering between the exit and enter thresholds keeps the level (and the 503s)
+    between = (critical + critical_low) / 2
+    levels = trace.feed([(between, cpu)] * long)
+    expect(set(levels) == {CRITICAL} and trace.rejects(),
+           f"RAM {between:g}% (between {critical_low:g}% and {critical:g}%) should stay critical")
+
+    # A dip under the exit threshold shorter than the cooldown is not recovery
+    wobble = [(critical_low - 1, cpu), (between, cpu)] * long
+    levels = trace.feed(wobble)
+    expect(set(levels) == {CRITICAL}, f"RAM wobbling around {critical_low:g}% should stay critical (no flapping)")
+
+    # Down: only after a full cooldown under the exit threshold, one level at a time
+    levels = trace.feed([(critical_low - 1, cpu)] * long)
+    left = levels.index(ELEVATED) if ELEVATED in levels else None
+    expect(left == cooldown_samples and set(levels[left:]) == {ELEVATED} and not trace.rejects(),
+           f"RAM {critical_low - 1:g}% should go elevated after {load_shedder.SHED_COOLDOWN:g}s "
+           f"({cooldown_samples} samples), went after {left}")
+
+    levels = trace.feed([(high, cpu), (low, cpu)] * long)
+    expect(set(levels) == {ELEVATED}, f"RAM wobbling between {low:g}% and {high:g}% should stay elevated")
+    levels = trace.feed([(low - 1, cpu), (low, cpu)] * long)
+    expect(set(levels) == {ELEVATED}, f"RAM wobbling around {low:g}% should stay elevated (no flapping)")
+    levels = trace.feed([(low - 1, cpu)] * long)
+    left = levels.index(NORMAL) if NORMAL in levels else None
+    expect(left == cooldown_samples and set(levels[left:]) == {NORMAL},
+           f"RAM {low - 1:g}% should go normal after {cooldown_samples} samples, went after {left}")
+
+    # A wobble across the enter threshold: up once, then stays
+    trace = Trace()
+    trace.feed([(high - 1, cpu), (high, cpu)] * long)
+    expect(trace.shedder.transitions == 1,
+           f"RAM wobbling around {high:g}% should change level once, changed {trace.shedder.transitions} times")
+    return wrong
+
+def pin(shedder, level):
+    """Forces the shedder to a level, as a matching watchdog sample would."""
+    ram = {NORMAL: 50.0, ELEVATED: load_shedder.MAX_RAM_PERCENT + 1, CRITICAL: load_shedder.SHED_RAM_CRITICAL + 1}[level]
+    shedder.cooldown = 0.0
+    while shedder.state.level != level:
+        shedder.update(ram, 10.0)
+    shedder.cooldown = load_shedder.SHED_COOLDOWN
+
+def drive_brain():
+    server = start_fake_ollama(port=0, profiles={"tinyllama": (0.01, 40), "llama3:8b": (0.05, 80)})
+    os.environ["BRAWN_NODE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("COMPLEXITY_ROUTER", "0")
+    with contextlib.redirect_stdout(io.StringIO()):
+        brain = common.load_brain()
+    shedder = brain.load_shedder
+    expected = {NORMAL: "answered by " + brain.MODEL_EXPERT, ELEVATED: "answered by " + brain.MODEL_SCOUT,
+                CRITICAL: "rejected"}
+    wrong = []
+    print("[Bench] The Brain at each level (prompts whose Scout answer would be escalated):")
+    for level in (NORMAL, ELEVATED, CRITICAL):
+        with contextlib.redirect_stdout(io.StringIO()):
+            pin(shedder, level)
+            try:
+                answer = brain.run_system(f"explain load shedding, take {level}", None)
+                outcome = "answered by " + answer.split()[0]
+            except BrainOverloaded as e:
+                outcome = f"rejected: 503, Retry-After {e.retry_after}s"
+        print(f"  {LEVEL_NAMES[level]:>8}: admits {shedder.inflight_limit(256):3d}/256 in flight, {outcome}")
+        if not outcome.startswith(expected[level]):
+            wrong.append(f"Brain at {LEVEL_NAMES[level]}: {outcome}, expected {expected[level]}")
+    print(f"  Shed counters: {shedder.stats()['shed']}")
+    return wrong
+
+if __name__ == "__main__":
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    wrong = simulate(random.Random(seed))
+    wrong += check_hysteresis()
+    wrong += drive_brain()
+    for message in wrong:
+        print(f"[Bench] WRONG: {message}")
+    if wrong:
+        sys.exit(1)
+    print("\n[Bench] Shedding and hysteresis checks OK.")
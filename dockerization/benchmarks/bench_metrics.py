@@ -0,0 +1,50 @@
+"""
+Metrics overhead: what recording costs on the request path, and how long
+a /metrics scrape takes once every stage has data.
+
+    python benchmarks/bench_metrics.py
+"""
+import contextlib
+import io
+import timeit
+
+import common # Puts the Brain code on the path
+import metrics
+
+REPEAT = 200000
+STAGES = ["cache_lookup", "scout", "expert", "cache_write", "request"]
+
+def per_call_us(fn, repeat=REPEAT):
+    return min(timeit.repeat(fn, number=repeat, repeat=3)) / repeat * 1e6
+
+if __name__ == "__main__":
+    registry = metrics.Registry()
+    stage_seconds = registry.register(metrics.Histogram("bench_stage_seconds", "bench", ["stage"]))
+    calls = registry.register(metrics.Counter("bench_calls_total", "bench", ["model", "outcome"]))
+
+    def staged():
+        with metrics.stage(stage_seconds, "scout"):
+            pass
+
+    print(f"[Bench] {REPEAT} calls each, best of 3:")
+    print(f"  Counter.inc          {per_call_us(lambda: calls.inc('tinyllama', 'ok')):6.2f} us")
+    print(f"  Histogram.observe    {per_call_us(lambda: stage_seconds.observe(0.42, 'scout')):6.2f} us")
+    print(f"  metrics.stage()      {per_call_us(staged):6.2f} us  (no trace)")
+    metrics.BRAIN_TRACE = True
+    with contextlib.redirect_stdout(io.StringIO()): # The trace line itself
+        with metrics.trace_request("bench"):
+            traced_us = per_call_us(staged, 20000)
+    print(f"  metrics.stage()      {traced_us:6.2f} us  (inside a BRAIN_TRACE request)")
+    metrics.BRAIN_TRACE = False
+    metrics.METRICS_ENABLED = False
+    print(f"  Histogram.observe    {per_call_us(lambda: stage_seconds.observe(0.42, 'scout')):6.2f} us  (METRICS=0)")
+    metrics.METRICS_ENABLED = True
+
+    for stage in STAGES:
+        stage_seconds.observe(1.0, stage)
+    for model in ("tinyllama", "llama3:8b", "mistral:7b"):
+        for outcome in ("ok", "overloaded", "cancelled", "error"):
+            calls.inc(model, outcome)
+    text = registry.render()
+    scrape_ms = per_call_us(registry.render, 2000) / 1000
+    print(f"  Scrape ({len(text.splitlines())} lines, {len(text) / 1024:.1f} KB): {scrape_ms:.2f} ms")
@@ -0,0 +1,74 @@
+"""
+Scout micro-batching against a local fake Ollama node that runs at most
+4 generations at once (like OLLAMA_NUM_PARALLEL=4). Closed-loop clients
+send Scout prompts. Throughput and latency are reported for unbatched calls
+and for each batch window / max size, in both batch modes:
+  ollama  - the batch goes out as concurrent /api/generate calls
+  openai  - one /v1/completions call with a list of prompts
+The ollama mode gains nothing over unbatched calls, so the Brain only
+batches in openai mode.
+
+    python benchmarks/bench_scout_batching.py [seconds per setting] [clients]
+"""
+import sys
+import time
+import threading
+
+import common
+import brawn_client
+from fake_ollama import start_fake_ollama
+from scout_batcher import MicroBatcher
+
+SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+SCOUT = {"tinyllama": (0.02, 12)}
+WINDOWS_MS = (2, 5, 10)
+MAX_SIZES = (4, 16)
+
+def closed_loop(call):
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + SECONDS
+
+    def client(n):
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            call(f"client {n} prompt {i}")
+            with lock:
+                samples.append(time.perf_counter() - start)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(CLIENTS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(samples) / (time.perf_counter() - started), samples
+
+def report(label, throughput, samples, extra=""):
+    print(f"{label:<24} {throughput:8.0f} req/s  p50 {1000 * common.percentile(samples, 50):6.1f} ms  "
+          f"p99 {1000 * common.percentile(samples, 99):6.1f} ms  {extra}")
+
+if __name__ == "__main__":
+    server = start_fake_ollama(port=0, profiles=SCOUT, parallel=4)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    session = brawn_client.get_session()
+    print(f"[Bench] {CLIENTS} clients, {SECONDS:g}s per setting, Scout latency "
+          f"{1000 * SCOUT['tinyllama'][0]:.0f} ms, 4 parallel slots\n")
+
+    throughput, samples = closed_loop(lambda prompt: brawn_client.generate(base_url, "tinyllama", prompt, session))
+    report("unbatched", throughput, samples)
+
+    for mode, send in (("ollama", brawn_client.generate_concurrent), ("openai", brawn_client.generate_batch)):
+        print()
+        for window in WINDOWS_MS:
+            for max_size in MAX_SIZES:
+                batcher = MicroBatcher(lambda prompts: send(base_url, "tinyllama", prompts, session),
+                                       window_ms=window, max_size=max_size, max_inflight_batches=4)
+                throughput, samples = closed_loop(batcher.submit)
+                stats = batcher.stats()
+                report(f"{mode} {window:>2} ms x {max_size:<2}", throughput, samples,
+                       f"avg batch {stats['avg_batch_size']:.1f}")
+    server.shutdown()
@@ -0,0 +1,123 @@
+"""
+Semantic cache benchmark: hit rate and lookup latency with a large index.
+
+    python benchmarks/bench_semantic_cache.py [entries] [queries]
+
+Synthetic prompts use a Zipf-like vocabulary. Four query kinds are timed:
+  variant    - a cached prompt with different case/spacing/punctuation (should hit)
+  filler     - a cached prompt of 10+ words with "please" or "the" added (should hit)
+  one-word   - a cached prompt of 10+ words with one word swapped (should miss:
+               it asks something else)
+  novel      - a prompt that was never cached (should miss)
+
+Before that, a few hand-picked pairs are checked: near-duplicates that must
+share an answer, and look-alike questions that must not. The run exits with
+status 1 if any of them is wrong.
+"""
+import itertools
+import random
+import sys
+import time
+import psutil
+
+import common
+from semantic_cache import SemanticCache
+
+ENTRIES = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+QUERIES = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+
+rng = random.Random(7)
+def word(rank):
+    # Letters only: digits would trip the cache's "numbers must match" rule
+    letters = ""
+    rank += 1
+    while rank:
+        rank, digit = divmod(rank, 26)
+        letters += "abcdefghijklmnopqrstuvwxyz"[digit]
+    return letters + "x"
+
+VOCAB = [word(rank) for rank in range(50_000)]
+CUM_WEIGHTS = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(VOCAB))))
+
+def random_prompt():
+    return " ".join(rng.choices(VOCAB, cum_weights=CUM_WEIGHTS, k=rng.randint(5, 15)))
+
+# (cached prompt, query, should hit)
+KNOWN_PAIRS = [
+    ("What is 2+2?", "what is 2 + 2", True),
+    ("Tell me the capital of France", "what's the capital of france please", False), # "what" is not filler
+    ("What is the capital of France?", "what is the capital of france please", True),
+    ("convert celsius to fahrenheit", "convert fahrenheit to celsius", False),
+    ("is 10 bigger than 3", "is 3 bigger than 10", False),
+    ("what is 2+2+2", "what is 2+2", False),
+    ("what is 2+2", "what is 2+2+2", False),
+    ("does the dog bite the man", "does the man bite the dog", False),
+    ("is python safe", "is python not safe", False),
+]
+
+def check_known_pairs():
+    """Returns the KNOWN_PAIRS the cache gets wrong."""
+    wrong = []
+    for cached, query, should_hit in KNOWN_PAIRS:
+        cache = SemanticCache()
+        cache.add(cached)
+        if (cache.lookup(query) is not None) != should_hit:
+            wrong.append((cached, query, should_hit))
+    return wrong
+
+def variant(prompt):
+    words = prompt.split()
+    return "  ".join(w.upper() if rng.random() < 0.3 else w for w in words) + " ?!"
+
+def with_filler(prompt):
+    words = prompt.split()
+    words.insert(rng.randrange(len(words) + 1), rng.choice(("please", "the")))
+    return " ".join(words)
+
+def one_word_swapped(prompt):
+    words = prompt.split()
+    words[rng.randrange(len(words))] = rng.choice(VOCAB)
+    return " ".join(words)
+
+if __name__ == "__main__":
+    wrong = check_known_pairs()
+    for cached, query, should_hit in wrong:
+        print(f"[Bench] WRONG: '{query}' {'missed' if should_hit else 'hit'} cached '{cached}'")
+    if wrong:
+        sys.exit(1)
+    print(f"[Bench] {len(KNOWN_PAIRS)} known pairs OK.")
+
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    cache = SemanticCache(max_entries=ENTRIES)
+    stored = []
+
+    print(f"[Bench] Indexing {ENTRIES:,} prompts...")
+    start = time.perf_counter()
+    for i in range(ENTRIES):
+        prompt = random_prompt()
+        cache.add(prompt)
+        if i % max(1, ENTRIES // QUERIES) == 0:
+            stored.append(prompt)
+    build_seconds = time.perf_counter() - start
+    rss_mb = (process.memory_info().rss - rss_before) / 1e6
+    print(f"  built in {build_seconds:.1f}s ({ENTRIES / build_seconds:,.0f} inserts/s), "
+          f"index size {len(cache):,}, ~{rss_mb:,.0f} MB RSS\n")
+
+    long_prompts = [p for p in stored if len(p.split()) >= 10]
+    workloads = {
+        "variant": [variant(p) for p in stored[:QUERIES]],
+        "filler": [with_filler(p) for p in long_prompts[:QUERIES]],
+        "one-word": [one_word_swapped(p) for p in long_prompts[:QUERIES]],
+        "novel": [random_prompt() for _ in range(QUERIES)],
+    }
+    for name, queries in workloads.items():
+        hits, samples = 0, []
+        for query in queries:
+            t0 = time.perf_counter()
+            match = cache.lookup(query)
+            samples.append(time.perf_counter() - t0)
+            hits += match is not None
+        print(f"  {name:<11} hit rate {100.0 * hits / len(queries):5.1f}%   "
+              f"lookup p50 {1e6 * common.percentile(samples, 50):6.1f} us   "
+              f"p99 {1e6 * common.percentile(samples, 99):7.1f} us   ({len(queries)} queries)")
@@ -0,0 +1,68 @@
+"""
+Multi-turn conversations: per-turn latency as the conversation grows, when
+every turn resends the whole transcript vs when the session hands Ollama
+back the `context` it returned last turn (see sessions.py).
+
+The fake Brawn node charges PREFILL seconds per prompt token it has to
+read, i.e. not covered by a context it still holds in its KV cache; about
+what tinyllama manages on a laptop CPU.
+
+    python benchmarks/bench_sessions.py [turns]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+import common
+from fake_ollama import start_fake_ollama
+
+TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+PREFILL = 0.003 # Seconds per prompt token
+# Short Scout answers, so every turn exits early and the comparison is prefill only
+PROFILES = {"tinyllama": (0.05, 16), "llama3:8b": (0.50, 60)}
+REPORT_TURNS = [1, 2, 5, 10, 15, 20, 30, 40, 50]
+
+def question(turn):
+    return f"and what about {'gar bel ion kust pow'.split()[turn % 5]} number {turn}?"
+
+def resend_transcript(brain, turns):
+    """Without sessions: each prompt carries the conversation so far."""
+    transcript, samples = "", []
+    for turn in range(turns):
+        prompt = f"{transcript}User: {question(turn)}"
+        start = time.perf_counter()
+        answer = brain.run_system(prompt, None)
+        samples.append(time.perf_counter() - start)
+        transcript += f"User: {question(turn)}\nAssistant: {answer}\n\n"
+    return samples
+
+def with_session(brain, turns):
+    samples = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        brain.run_system(question(turn), None, session_id="bench")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+if __name__ == "__main__":
+    server = start_fake_ollama(port=0, profiles=PROFILES, prefill_per_token=PREFILL)
+    os.environ["BRAWN_NODE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("COMPLEXITY_ROUTER", "0")
+    with contextlib.redirect_stdout(io.StringIO()):
+        brain = common.load_brain()
+        resend = resend_transcript(brain, TURNS)
+        session = with_session(brain, TURNS)
+        stats = brain.session_store.stats()
+
+    print(f"[Bench] {TURNS}-turn conversation, fake node reads prompts at {1 / PREFILL:.0f} tokens/s:")
+    print(f"  {'turn':>4}  {'resend transcript':>18}  {'session context':>16}")
+    for turn in [t for t in REPORT_TURNS if t <= TURNS]:
+        print(f"  {turn:4d}  {1000 * resend[turn - 1]:15.0f} ms  {1000 * session[turn - 1]:13.0f} ms")
+    # Growth per turn over the second half, once the first turns' setup is behind
+    half = TURNS // 2
+    slope = lambda samples: (samples[-1] - samples[half]) / max(1, TURNS - 1 - half)
+    print(f"  Per-turn growth: {1000 * slope(resend):+.1f} ms/turn resending, {1000 * slope(session):+.1f} ms/turn with the session.")
+    print(f"  Whole conversation: {sum(resend):.1f}s vs {sum(session):.1f}s. "
+          f"Session holds {stats['context_tokens']} context tokens.")
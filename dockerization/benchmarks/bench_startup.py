@@ -0,0 +1,119 @@
+"""
+Cold start: how long a fresh Brain process takes before it can answer.
+
+1. `python -X importtime` on the Brain module: total import time and the
+   slowest imports (cumulative, i.e. including what they pull in).
+2. BRAIN_MODE=server started as a subprocess against a local fake Ollama
+   node, with Redis pointed at an address that never answers: time until
+   the first GET /health 200 and until the first POST /ask (a cache miss)
+   comes back. The Brain connects Redis in the background, so neither
+   should wait on it.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+import common
+from fake_ollama import start_fake_ollama
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+TARGET = 0.300           # Seconds from process start to the first /health 200
+TOP_IMPORTS = 8
+POLL = 0.005
+UNREACHABLE_REDIS = "10.255.255.1" # Non-routable: connecting hangs until the timeout
+BRAIN = os.path.join(common.BRAIN_DIR, "brain_v2.0_cascade.py")
+IMPORT_BRAIN = ("import sys; sys.path.insert(0, {dir!r}); import importlib.util as u; "
+                "s = u.spec_from_file_location('brain', {path!r}); s.loader.exec_module(u.module_from_spec(s))"
+                ).format(dir=common.BRAIN_DIR, path=BRAIN)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def brain_env(brawn_url, port):
+    env = dict(os.environ, BRAWN_NODE_URL=brawn_url, REDIS_HOST=UNREACHABLE_REDIS, REDIS_PASSWORD="bench",
+               BRAIN_MODE="server", SERVER_HOST="127.0.0.1", SERVER_PORT=str(port))
+    env.setdefault("COMPLEXITY_ROUTER", "0")
+    env.setdefault("DISK_CACHE", "0") # Startup without a cache file to replay
+    return env
+
+# --- 1. Imports ---
+def import_profile(env):
+    """(total import seconds, [(cumulative seconds, module), ...] slowest first)."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_BRAIN],
+                            env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative) / 1e6, name.rstrip()))
+    top_level = sum(seconds for seconds, name in rows if not name.startswith("  "))
+    return top_level, sorted(rows, reverse=True)[:TOP_IMPORTS]
+
+# --- 2. Server start ---
+def cold_start(env, port, prompt):
+    """(seconds to the first /health 200, seconds to the first /ask answer) for one fresh process."""
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-u", BRAIN], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # A bare connect until it listens: an HTTP client polling in a tight loop would take CPU from the Brain
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Brain exited with status {process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(POLL)
+        while requests.get(base + "/health", timeout=5).status_code != 200:
+            time.sleep(POLL)
+        healthy = time.perf_counter() - start
+        response = requests.post(base + "/ask", data=json.dumps({"prompt": prompt}), timeout=30)
+        response.raise_for_status()
+        answered = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+    return healthy, answered
+
+if __name__ == "__main__":
+    server = start_fake_ollama(port=0, profiles={"tinyllama": (0.01, 12), "llama3:8b": (0.05, 60)})
+    brawn_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    total, slowest = import_profile(brain_env(brawn_url, free_port()))
+    print(f"[Bench] Brain module imports: {1000 * total:.0f} ms. Slowest (cumulative):")
+    for seconds, name in slowest:
+        print(f"  {1000 * seconds:7.1f} ms  {name.strip()}")
+
+    interpreter = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        interpreter.append(time.perf_counter() - start)
+
+    healthy, answered = [], []
+    for run in range(RUNS):
+        port = free_port()
+        h, a = cold_start(brain_env(brawn_url, port), port, f"what is cold start number {run}?")
+        healthy.append(h)
+        answered.append(a)
+
+    p50 = lambda samples: common.percentile(samples, 50)
+    print(f"[Bench] Cold start over {RUNS} runs (median), Redis unreachable at {UNREACHABLE_REDIS}:")
+    print(f"  Bare interpreter:      {1000 * p50(interpreter):5.0f} ms")
+    print(f"  First /health 200:     {1000 * p50(healthy):5.0f} ms  (target {1000 * TARGET:.0f} ms: "
+          f"{'ok' if p50(healthy) <= TARGET else 'MISSED'})")
+    print(f"  First /ask answered:   {1000 * p50(answered):5.0f} ms  (cache miss, Scout answer from the fake node)")
+    sys.exit(0 if p50(healthy) <= TARGET else 1)
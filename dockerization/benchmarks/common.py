@@ -0,0 +1,60 @@
+import os
+import sys
+import importlib.util
+
+# Benchmarks live one level below the Brain code; make it importable.
+BRAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BRAIN_DIR not in sys.path:
+    sys.path.insert(0, BRAIN_DIR)
+
+# Benchmarks only use the Redis at BENCH_REDIS_URL, never the Brain's
+# REDIS_URL. Every benchmark prompt and key starts with BENCH_MARKER, and
+# only keys under it are ever deleted.
+BENCH_REDIS_URL = os.getenv("BENCH_REDIS_URL", "")
+BENCH_MARKER = "sentinelbench"
+
+def bench_redis():
+    """A client for BENCH_REDIS_URL if it is set and answers a PING, else (None, reason)."""
+    if not BENCH_REDIS_URL:
+        return None, "BENCH_REDIS_URL is not set"
+    try:
+        import redis
+        r = redis.from_url(BENCH_REDIS_URL, decode_responses=False, socket_connect_timeout=1)
+        r.ping()
+        return r, None
+    except Exception as e:
+        return None, f"nothing at {BENCH_REDIS_URL} ({e})"
+
+def delete_bench_keys(r, prefixes=("",)):
+    """Unlinks the keys under <prefix><BENCH_MARKER> for each prefix. Returns how many."""
+    deleted = 0
+    for prefix in prefixes:
+        batch = []
+        for key in r.scan_iter(match=prefix + BENCH_MARKER + "*", count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                deleted += r.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += r.unlink(*batch)
+    return deleted
+
+def load_brain(path=os.path.join(BRAIN_DIR, "brain_v2.0_cascade.py"), name="brain"):
+    """
+    Imports a brain script by path (the file names contain dots), with its
+    directory on the path as when it is run directly.
+    """
+    if os.path.dirname(path) not in sys.path:
+        sys.path.append(os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
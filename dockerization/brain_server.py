@@ -0,0 +1,300 @@
+import asyncio
+import concurrent.futures
+import functools
+import json
+import os
+import time
+import metrics
+from brawn_scheduler import BrawnOverloaded
+from load_shedder import BrainOverloaded
+
+# --- 1. CONFIGURATION ---
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+
+# Admission cap: requests beyond this many in flight get a 503 straight away
+# instead of queueing behind a 60-second llama3 escalation.
+SERVER_MAX_INFLIGHT = int(os.getenv("SERVER_MAX_INFLIGHT", "256"))
+
+# Per-request timeout. Slightly above the 300s Expert timeout in call_ai_model.
+SERVER_REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", "330"))
+
+MAX_BODY_BYTES = 64 * 1024
+SESSION_ID_MAX_LENGTH = 128
+
+HTTP_RESPONSES = metrics.counter("sentinel_http_responses_total", "HTTP responses by status code.", ["status"])
+
+# Backpressure from the Brawn scheduler or the Brain's own watchdog: both carry retry_after
+OVERLOADED = (BrawnOverloaded, BrainOverloaded)
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+# --- 2. HTTP HELPERS ---
+class BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+async def read_request(reader):
+    """
+    Reads one HTTP/1.1 request. Returns (method, path, headers, body),
+    or None if the client closed the connection.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, path, _version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise BadRequest(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = headers.get("content-length", "0") or "0"
+    if not (length.isascii() and length.isdigit()): # Also rejects a sign: "-1", "+5"
+        raise BadRequest(400, "invalid Content-Length")
+    length = int(length)
+    if length > MAX_BODY_BYTES:
+        raise BadRequest(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+def write_stream_headers(writer):
+    HTTP_RESPONSES.inc("200")
+    writer.write((
+        "HTTP/1.1 200 OK\r\n"
+        "Content-Type: application/x-ndjson\r\n"
+        "Transfer-Encoding: chunked\r\n"
+        "Connection: keep-alive\r\n\r\n"
+    ).encode("latin-1"))
+
+def write_stream_line(writer, payload):
+    line = (json.dumps(payload) + "\n").encode()
+    writer.write(f"{len(line):X}\r\n".encode("latin-1") + line + b"\r\n")
+
+def end_stream(writer):
+    writer.write(b"0\r\n\r\n")
+
+def write_response(writer, status, payload, extra_headers=None, keep_alive=True,
+                   content_type="application/json"):
+    HTTP_RESPONSES.inc(str(status))
+    body = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+    lines = [
+        f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    for name, value in (extra_headers or {}).items():
+        lines.append(f"{name}: {value}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+# --- 3. THE ASYNC FRONT DOOR ---
+class BrainServer:
+    """
+    Async HTTP/JSON front door for run_system.
+
+    run_system itself stays blocking (requests + redis), so each admitted
+    prompt runs on a worker thread while the event loop keeps accepting and
+    answering other connections. One slow Expert escalation no longer blocks
+    every other user.
+    """
+
+    def __init__(self, run_system, cache_client, max_inflight=SERVER_MAX_INFLIGHT,
+                 request_timeout=SERVER_REQUEST_TIMEOUT, health=None, inflight_limit=None):
+        self.run_system = run_system
+        self.cache_client = cache_client
+        self.health = health
+        self.max_inflight = max_inflight
+        # inflight_limit(max_inflight) -> the cap right now (lower under load)
+        self.inflight_limit = inflight_limit or (lambda limit: limit)
+        self.request_timeout = request_timeout
+        self.inflight = 0
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_inflight, thread_name_prefix="brain-worker"
+        )
+
+    async def handle_ask(self, body, writer, keep_alive):
+        """POST /ask {"prompt": "...", "stream": false, "session": "<conversation id, optional>"}"""
+        try:
+            request = json.loads(body or b"{}")
+            prompt = request.get("prompt", "")
+            session_id = request.get("session")
+        except (ValueError, AttributeError):
+            write_response(writer, 400, {"error": "body must be a JSON object"}, keep_alive=keep_alive)
+            return
+        if not isinstance(prompt, str) or not prompt.strip():
+            write_response(writer, 400, {"error": "'prompt' must be a non-empty string"}, keep_alive=keep_alive)
+            return
+        if session_id is not None and (not isinstance(session_id, str) or not 0 < len(session_id) <= SESSION_ID_MAX_LENGTH):
+            write_response(writer, 400, {"error": f"'session' must be a string of 1-{SESSION_ID_MAX_LENGTH} characters"},
+                           keep_alive=keep_alive)
+            return
+
+        if self.inflight >= self.inflight_limit(self.max_inflight):
+            write_response(writer, 503, {"error": "server busy, try again later"},
+                           {"Retry-After": "1"}, keep_alive)
+            return
+
+        self.inflight += 1
+        try:
+            ask = functools.partial(self.run_system, session_id=session_id) if session_id else self.run_system
+            if request.get("stream"):
+                await self.answer_stream(prompt, writer, ask)
+            else:
+                status, payload, headers = await self.answer(prompt, ask)
+                write_response(writer, status, payload, headers, keep_alive)
+        finally:
+            self.inflight -= 1
+
+    async def answer(self, prompt, ask):
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        try:
+            # NOTE: On timeout the worker thread keeps running; its answer is
+            # still written to the cache, so a retry will usually be a HIT.
+            answer = await asyncio.wait_for(
+                loop.run_in_executor(self.executor, ask, prompt, self.cache_client),
+                timeout=self.request_timeout,
+            )
+        except asyncio.TimeoutError:
+            return 504, {"error": f"no answer within {self.request_timeout:.0f}s"}, None
+        except OVERLOADED as e:
+            # Shed load, don't queue
+            return 503, {"error": str(e)}, {"Retry-After": str(e.retry_after)}
+        except Exception as e:
+            # A bug in the cascade still gets an answer, and the connection stays usable
+            print(f"[Server] ERROR answering '{prompt[:50]}': {e!r}")
+            return 500, {"error": f"internal error: {e}"}, None
+        return 200, {"prompt": prompt, "answer": answer, "latency": round(time.time() - start_time, 3)}, None
+
+    async def answer_stream(self, prompt, writer, ask):
+        """
+        Streams {"model", "token"} NDJSON lines while the cascade runs, then
+        one {"done": true, "answer", "ttft", "latency"} line with the final
+        (cached) answer. ttft is the time until the first token was sent.
+        """
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def on_token(model_name, token):
+            loop.call_soon_threadsafe(queue.put_nowait, ("token", model_name, token))
+
+        def run():
+            try:
+                answer = ask(prompt, self.cache_client, on_token)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, ("error", None, e))
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, ("done", None, answer))
+
+        self.executor.submit(run)
+        write_stream_headers(writer)
+        ttft = None
+        deadline = start_time + self.request_timeout
+        while True:
+            try:
+                kind, model_name, value = await asyncio.wait_for(queue.get(), deadline - time.time())
+            except asyncio.TimeoutError:
+                write_stream_line(writer, {"done": True, "error": f"no answer within {self.request_timeout:.0f}s"})
+                break
+            if kind == "token":
+                if ttft is None:
+                    ttft = round(time.time() - start_time, 3)
+                write_stream_line(writer, {"model": model_name, "token": value})
+                await writer.drain()
+                continue
+            if kind == "error":
+                error = {"done": True, "error": str(value)}
+                if isinstance(value, OVERLOADED):
+                    error["retry_after"] = value.retry_after
+                write_stream_line(writer, error)
+            else:
+                latency = round(time.time() - start_time, 3)
+                write_stream_line(writer, {"done": True, "answer": value,
+                                           "ttft": ttft if ttft is not None else latency,
+                                           "latency": latency})
+            break
+        end_stream(writer)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except BadRequest as e:
+                    write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if path == "/ask" and method == "POST":
+                    await self.handle_ask(body, writer, keep_alive)
+                elif path == "/metrics" and method == "GET":
+                    write_response(writer, 200, self.render_metrics(), keep_alive=keep_alive,
+                                   content_type=metrics.CONTENT_TYPE)
+                elif path == "/health" and method == "GET":
+                    health = {"status": "ok", "inflight": self.inflight, "max_inflight": self.max_inflight,
+                              "inflight_limit": self.inflight_limit(self.max_inflight)}
+                    cache_stats = getattr(self.cache_client, "stats", None)
+                    if cache_stats:
+                        health["cache"] = cache_stats()
+                    if self.health:
+                        health.update(self.health())
+                    write_response(writer, 200, health, keep_alive=keep_alive)
+                elif path in ("/ask", "/health", "/metrics"):
+                    write_response(writer, 405, {"error": f"{method} not allowed on {path}"}, keep_alive=keep_alive)
+                else:
+                    write_response(writer, 404, {"error": f"unknown path {path}"}, keep_alive=keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def render_metrics(self):
+        """Prometheus text for GET /metrics: everything in metrics.REGISTRY plus admission."""
+        return metrics.REGISTRY.render() + "\n".join([
+            "# HELP sentinel_server_inflight Requests being answered right now.",
+            "# TYPE sentinel_server_inflight gauge",
+            f"sentinel_server_inflight {self.inflight}",
+            "# HELP sentinel_server_inflight_limit Admission cap right now (lower under load).",
+            "# TYPE sentinel_server_inflight_limit gauge",
+            f"sentinel_server_inflight_limit {self.inflight_limit(self.max_inflight)}",
+        ]) + "\n"
+
+    async def serve(self, host=SERVER_HOST, port=SERVER_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"[Server] Listening on http://{host}:{port} "
+              f"(max in-flight: {self.max_inflight}, timeout: {self.request_timeout:.0f}s)")
+        async with server:
+            await server.serve_forever()
+
+def run_server(run_system, cache_client, host=SERVER_HOST, port=SERVER_PORT, health=None, inflight_limit=None):
+    """
+    Blocking entry point used by the Brain's __main__. health() may return
+    extra fields for GET /health; inflight_limit(max_inflight) may lower
+    the admission cap under load.
+    """
+    brain = BrainServer(run_system, cache_client, health=health, inflight_limit=inflight_limit)
+    try:
+        asyncio.run(brain.serve(host, port))
+    except KeyboardInterrupt:
+        print("\n[Server] Shutting down...")
+    finally:
+        brain.executor.shutdown(wait=False)
@@ -1,11 +1,21 @@
-import requests
 import time
 import os
 import threading
-import psutil
-import redis
-import nltk
 import concurrent.futures
+import brawn_client
+import metrics
+import sessions
+import early_exit
+import uuid
+from semantic_cache import SemanticCache, SEMANTIC_CACHE_ENABLED, make_cache_key
+from cache_tiers import TieredCache, LRUCache, L1_CACHE_ENABLED, REDIS_RETRY_SECONDS
+from disk_cache import DiskCache, DiskCacheLocked, DISK_CACHE_ENABLED
+from complexity_router import ComplexityRouter, OutcomeLog, COMPLEXITY_ROUTER_ENABLED
+from brawn_pool import BrawnPool, parse_node_urls
+from brawn_scheduler import BrawnScheduler, BrawnOverloaded
+from scout_batcher import MicroBatcher, SCOUT_BATCHING, SCOUT_BATCH_API
+from load_shedder import LoadShedder, SHED_ANSWER_TTL, NORMAL
+from single_flight import SingleFlight, RedisLease, wait_for_answer, SINGLE_FLIGHT_ENABLED, DISTRIBUTED_SINGLE_FLIGHT
 
 # --- 1. CONFIGURATION ---
 
@@ -14,127 +24,774 @@ LAPTOP_IP = os.getenv("LAPTOP_IP", "LAPTOP_IP_FROM_TAILSCALE")
 REDIS_HOST = os.getenv("REDIS_HOST", "")
 REDIS_PORT = os.getenv("REDIS_PORT", "6379")
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
+# The Brain serves from L1 while it connects; without Redis or a disk tier it keeps retrying, backing off up to this
+REDIS_RECONNECT_MAX_SECONDS = float(os.getenv("REDIS_RECONNECT_MAX_SECONDS", "60"))
 
 # Fallback check
 if not REDIS_HOST or not REDIS_PASSWORD:
     print("!!! WARNING: REDIS_HOST or REDIS_PASSWORD not set in environment variables.")
 
-BRAWN_NODE_URL = f"http://{LAPTOP_IP}:11434"
+BRAWN_NODE_URL = os.getenv("BRAWN_NODE_URL", f"http://{LAPTOP_IP}:11434")
+# Several Brawn nodes, e.g. BRAWN_NODES=100.64.0.1,100.64.0.2:11434
+# (defaults to the single LAPTOP_IP node)
+BRAWN_NODE_URLS = parse_node_urls(os.getenv("BRAWN_NODES", "")) or [BRAWN_NODE_URL]
+
+# "interactive" (the [You]: chat loop) or "server" (async HTTP/JSON endpoint)
+BRAIN_MODE = os.getenv("BRAIN_MODE", "interactive")
+
+# Stream tokens from Ollama as they are generated instead of waiting
+# 40-60s for a whole llama3 answer. Set BRAIN_STREAM=0 to turn it off.
+STREAM_RESPONSES = os.getenv("BRAIN_STREAM", "1") == "1"
+
+# Speculative cascade: start the Expert alongside the Scout and cancel it if
+# the Scout exits early. Escalated queries stop paying Scout + Expert latency.
+SPECULATIVE_CASCADE = os.getenv("BRAIN_SPECULATIVE", "0") == "1"
+# Max share of Expert compute-seconds we accept throwing away on cancelled
+# speculations. Above it, the Brain goes back to the sequential cascade.
+SPECULATION_WASTE_BUDGET = float(os.getenv("SPECULATION_WASTE_BUDGET", "0.3"))
+
+# Cached answers expire for good after CACHE_TTL seconds. Past this share of
+# their own TTL (30 min of a 1 h answer, 6 h of a 12 h warm-up answer) they
+# are still served straight away, but regenerated in the background, so a
+# recurring prompt doesn't pay 40-60s on the first ask after expiry.
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))
+CACHE_SOFT_TTL_FRACTION = float(os.getenv("CACHE_SOFT_TTL_FRACTION", "0.5"))
+CACHE_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", "2"))
 
 # --- Models sorted by Role ---
 MODEL_SCOUT = "tinyllama"      # Fast, dumb (3 seconds)
 MODEL_EXPERT = "llama3:8b"     # Smart, slow (40-60 seconds)
 MODEL_JUDGE = "mistral:7b"     # Tie-breaker (Only if needed)
 
-# --- Hardware Watchdog ---
-MAX_RAM_PERCENT = 85.0
-WATCHDOG_POLL_RATE = 5
+# --- Metrics (GET /metrics on the server; see metrics.py) ---
+STAGE_SECONDS = metrics.histogram("sentinel_stage_seconds", "Time spent in each stage of a request.", ["stage"])
+BRAWN_QUEUE_SECONDS = metrics.histogram("sentinel_brawn_queue_seconds", "Wait for a Brawn slot per model.", ["model"])
+TTFT_SECONDS = metrics.histogram("sentinel_ttft_seconds", "Time to first token of streamed model calls.", ["model"])
+MODEL_CALLS = metrics.counter("sentinel_model_calls_total", "Model calls by outcome.", ["model", "outcome"])
+CACHE_LOOKUPS = metrics.counter("sentinel_cache_lookups_total", "Cache lookups by result.", ["result"])
+ROUTE_DECISIONS = metrics.counter("sentinel_route_decisions_total", "Cascade routing decisions.", ["decision"])
+SCOUT_CONFIDENCE = metrics.histogram("sentinel_scout_confidence", "Early-exit confidence scores of Scout answers.",
+                                     buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9))
+# No Judge stage: this cascade never calls the Judge. The committee and its
+# vote are timed in the v0.x scripts (stages "committee" and "consensus").
+MODEL_STAGES = {MODEL_SCOUT: "scout", MODEL_EXPERT: "expert"}
 
 # --- 2. WATCHDOG ---
+# RAM/CPU thresholds, hysteresis and what gets shed at each level: see load_shedder.py
+load_shedder = LoadShedder()
+
 def hardware_watchdog():
     try:
-        while True:
-            time.sleep(WATCHDOG_POLL_RATE)
+        load_shedder.watch()
     except KeyboardInterrupt: pass
 
 # --- 3. REDIS CONNECTION ---
-def get_redis_connection():
+def open_disk_cache():
+    """The local disk tier, or None if it is off or another Brain has the file."""
+    if not DISK_CACHE_ENABLED:
+        return None
+    try:
+        disk = DiskCache()
+    except (DiskCacheLocked, OSError) as e:
+        print(f"[Cache] WARNING: Disk cache unavailable. {e}")
+        return None
+    print(f"[Cache] Disk cache: {disk.stats()['entries']} answers in {disk.path}.")
+    return disk
+
+def new_cache_client():
+    """The cache run_system uses. Starts as L1 only; connect_cache adds the disk tier and Redis."""
+    return TieredCache(None, LRUCache() if L1_CACHE_ENABLED else LRUCache(max_bytes=0))
+
+def connect_cache(cache):
+    """
+    Opens the disk tier and connects Redis. Returns False if neither is
+    available (only L1 then), True otherwise. With the disk tier but no
+    Redis, requests keep serving from disk and retry Redis themselves.
+    """
+    import redis # ~130 ms to import: not on the startup path when called in the background
+    if cache.disk is None:
+        cache.disk = open_disk_cache()
     print(f"Connecting to Redis at {REDIS_HOST}...")
     # Construct connection string
     # Handle cases where port is a string
     CONNECTION_STRING = f"redis://default:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}"
+    # Binary-safe: answers are stored compressed (see answer_codec)
+    r = redis.from_url(CONNECTION_STRING, decode_responses=False, socket_connect_timeout=3)
     try:
-        r = redis.from_url(CONNECTION_STRING, decode_responses=True)
         r.ping()
-        return r
     except Exception as e:
         print(f"!!! CACHE ERROR: {e}")
-        return None
+        if cache.disk is None:
+            return False
+        # Keep running offline on the disk cache; Redis is retried as requests come in
+        cache.attach_l2(r)
+        cache.mark_l2_down(e)
+        return True
+
+    cache.attach_l2(r)
+    print("[Cache] Connected to Redis.")
+    on_redis_reached(cache)
+    return True
+
+def on_redis_reached(cache):
+    """Once Redis answers: L1 invalidation from other replicas, and L1 warmed from disk."""
+    if L1_CACHE_ENABLED:
+        # In-process L1 in front of Redis; other replicas' writes invalidate it
+        try:
+            cache.start_invalidation_listener()
+        except Exception as e:
+            print(f"[Cache] WARNING: No L1 invalidation listener, using L1 without it. {e}")
+        if cache.disk is not None:
+            threading.Thread(target=cache.warm_from_disk, daemon=True).start()
+
+def get_redis_connection():
+    """Connects before returning, for scripts (warm_cache.py). None if there is neither Redis nor a disk tier."""
+    cache = new_cache_client()
+    return cache if connect_cache(cache) else None
+
+def connect_cache_in_background(cache):
+    """
+    The Brain answers prompts straight away (L1 only, cache misses go to
+    the Brawn node) while this thread opens the disk tier and connects
+    Redis, retrying with backoff until one of them works. With only the
+    disk tier up, it keeps retrying Redis until it answers, then starts
+    what needs Redis (see on_redis_reached).
+    """
+    def connect():
+        delay = REDIS_RETRY_SECONDS
+        while True:
+            try:
+                if connect_cache(cache):
+                    break
+            except Exception as e: # e.g. a malformed REDIS_* setting; keep serving from L1
+                print(f"!!! CACHE ERROR: {e}")
+            print(f"[Cache] Serving without Redis. Retrying in {delay:.0f}s.")
+            time.sleep(delay)
+            delay = min(delay * 2, REDIS_RECONNECT_MAX_SECONDS)
+        # Serving from disk: connect_cache attached Redis but found it down
+        while cache.l2_is_down():
+            time.sleep(delay)
+            delay = min(delay * 2, REDIS_RECONNECT_MAX_SECONDS)
+            try:
+                cache.l2.ping()
+            except Exception as e:
+                cache.mark_l2_down(e)
+                continue
+            cache.attach_l2(cache.l2)
+            print("[Cache] Connected to Redis.")
+            on_redis_reached(cache)
+        if semantic_cache is not None:
+            # Index what is already cached
+            try:
+                semantic_cache.rebuild_from_redis(cache)
+            except Exception as e:
+                print(f"[Cache] WARNING: Semantic index not rebuilt; it fills as answers are cached. {e}")
+    thread = threading.Thread(target=connect, name="cache-connect", daemon=True)
+    thread.start()
+    return thread
 
 # --- 4. MODEL CALLER ---
-def call_ai_model(model_name, prompt):
+brawn_pool = BrawnPool(BRAWN_NODE_URLS)
+brawn_scheduler = BrawnScheduler(nodes=len(brawn_pool))
+
+def send_scout_batch(prompts):
+    """Sends one micro-batch of Scout prompts as one /v1/completions call: one Brawn slot, one node."""
+    with brawn_scheduler.slot(MODEL_SCOUT):
+        return brawn_pool.call(MODEL_SCOUT, lambda node_url, session: brawn_client.generate_batch(
+            node_url, MODEL_SCOUT, prompts, session))
+
+# Only a backend that batches on the GPU gains from it. Against Ollama a batch
+# is just concurrent calls, which would get past the Scout's per-model slots.
+scout_batcher = MicroBatcher(send_scout_batch) if SCOUT_BATCHING and SCOUT_BATCH_API == "openai" else None
+if SCOUT_BATCHING and scout_batcher is None:
+    print("!!! WARNING: SCOUT_BATCHING needs SCOUT_BATCH_API=openai (Ollama has no batch endpoint). Batching is off.")
+
+def call_ai_model(model_name, prompt, on_token=None, cancel_event=None, details=None):
+    """
+    Calls a model on the Brawn node and returns the full answer.
+    If on_token is given (and streaming is on), each token is passed to
+    on_token(model_name, token) as soon as Ollama produces it.
+    Calls with a cancel_event always stream, so they can be stopped mid-way.
+
+    Each call first waits for a Brawn slot (see brawn_scheduler). If the
+    queue is too long, Expert/Judge calls return "Error" so the cascade
+    degrades to the Scout; an overloaded Scout raises BrawnOverloaded.
+    Non-streaming Scout calls go through the micro-batcher when it is on.
+
+    Inside a conversation (see sessions), the call continues from the
+    model's previous context, on the node that holds it.
+
+    If details (a dict) is given, it gets Ollama's eval_count, done_reason
+    and token logprobs for the call, for the early-exit policy.
+    """
     print(f"[Router] Calling '{model_name}' from Brawn...")
-    start_time = time.time()
+    queued_at = time.time()
+    streaming = (on_token and STREAM_RESPONSES) or cancel_event is not None
+    stage = MODEL_STAGES.get(model_name, model_name)
+    conversation = sessions.current()
+    context_args, prefer_node = {}, None
+    if conversation is not None:
+        prompt, context, prefer_node = conversation.prepare(model_name, prompt)
+        context_args = {"context": context, "keep_alive": sessions.SESSION_KEEP_ALIVE}
+    if details is not None and early_exit.EARLY_EXIT_LOGPROBS:
+        context_args["logprobs"] = True
+
+    def generate(node_url, session):
+        if streaming:
+            result = brawn_client.generate_stream(
+                node_url, model_name, prompt,
+                on_token=(lambda token: on_token(model_name, token)) if on_token else None,
+                session=session, cancel_event=cancel_event, **context_args,
+            )
+        else:
+            result = brawn_client.generate(node_url, model_name, prompt, session, **context_args)
+        if conversation is not None:
+            conversation.observe(model_name, result.get("context"), node_url)
+        if details is not None:
+            details.update((field, result[field]) for field in early_exit.DETAIL_FIELDS if field in result)
+        return result
+
     try:
-        response = requests.post(
-            f"{BRAWN_NODE_URL}/api/generate",
-            json={"model": model_name, "prompt": prompt, "stream": False},
-            timeout=300 # 5 min timeout for heavy models
-        )
-        response.raise_for_status() 
-        duration = time.time() - start_time
-        print(f"[Router] '{model_name}' finished in {duration:.2f}s.")
-        return response.json()['response'].strip()
+        if model_name == MODEL_SCOUT and scout_batcher is not None and not streaming and conversation is None:
+            result = scout_batcher.submit(prompt)
+            if details is not None:
+                details.update((field, result[field]) for field in early_exit.DETAIL_FIELDS if field in result)
+            duration = time.time() - queued_at
+            metrics.record(STAGE_SECONDS, duration, stage, batched=True)
+            MODEL_CALLS.inc(model_name, "ok")
+            print(f"[Router] '{model_name}' finished in {duration:.2f}s (batched).")
+            return result['response'].strip()
+
+        with brawn_scheduler.slot(model_name, cancel_event):
+            start_time = time.time()
+            metrics.record(BRAWN_QUEUE_SECONDS, start_time - queued_at, model_name, span=f"{stage}_queue")
+            if start_time - queued_at > 0.05:
+                print(f"[Scheduler] '{model_name}' waited {start_time - queued_at:.2f}s for a Brawn slot.")
+            # Pooled keep-alive session with per-model timeouts (see brawn_client),
+            # on the least busy healthy node (see brawn_pool)
+            result = brawn_pool.call(model_name, generate, prefer=prefer_node, cancel_event=cancel_event)
+            if streaming:
+                duration = time.time() - start_time
+                ttft = result['ttft'] if result['ttft'] is not None else duration
+                TTFT_SECONDS.observe(ttft, model_name)
+                print(f"\n[Router] '{model_name}' first token in {ttft:.2f}s, finished in {duration:.2f}s.")
+            else:
+                duration = time.time() - start_time
+                print(f"[Router] '{model_name}' finished in {duration:.2f}s.")
+            metrics.record(STAGE_SECONDS, duration, stage)
+        MODEL_CALLS.inc(model_name, "ok")
+        return result['response'].strip()
+    except BrawnOverloaded as e:
+        MODEL_CALLS.inc(model_name, "overloaded")
+        if model_name == MODEL_SCOUT:
+            raise # Nothing cheaper to fall back to: shed the request
+        print(f"[Scheduler] {e}. Degrading to the Scout.")
+        return "Error"
+    except brawn_client.GenerationCancelled as e:
+        MODEL_CALLS.inc(model_name, "cancelled")
+        print(f"[Router] {e}.")
+        return "Error"
     except Exception as e:
+        MODEL_CALLS.inc(model_name, "error")
         print(f"!!! ERROR: '{model_name}' failed. {e}")
         return "Error"
 
-# --- 5. CASCADE LOGIC (The New Brain) ---
-def run_system(prompt, cache_client):
+# --- 5. SPECULATIVE CASCADE ---
+# Is the Scout's answer good enough? A confidence score against a threshold
+# that tracks EARLY_EXIT_TARGET_ESCALATION (see early_exit.py)
+exit_policy = early_exit.EarlyExitPolicy()
+
+def judge_scout(prompt, ans_scout, details, p_complex=None):
+    """The early-exit decision for a Scout answer. Unsure calls get a second Scout sample to compare."""
+    def second_opinion():
+        try:
+            return call_ai_model(MODEL_SCOUT, prompt)
+        except BrawnOverloaded:
+            return "Error" # Scout queue full: decide without it
+
+    # In a conversation, a second call would replace the Scout's kept context
+    in_conversation = sessions.current() is not None
+    decision = exit_policy.decide(ans_scout, details, p_complex, None if in_conversation else second_opinion)
+    SCOUT_CONFIDENCE.observe(decision.score)
+    return decision
+
+class SpeculationTracker:
+    """
+    Records how often starting the Expert early pays off, and how much
+    Expert compute gets thrown away when the Scout exits early.
+
+    Sequential runs are recorded too (as "what speculation would have
+    cost"), so the Brain can switch speculation back on once the traffic
+    mix makes it worthwhile again.
+    """
+
+    def __init__(self, waste_budget=SPECULATION_WASTE_BUDGET, smoothing=0.1):
+        self.waste_budget = waste_budget
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.speculations = 0
+        self.paid_off = 0
+        self.wasted_seconds = 0.0   # Expert time spent on cancelled runs
+        self.saved_seconds = 0.0    # Scout latency hidden on escalations
+        self.avg_wasted = 0.0       # Moving averages of Expert-seconds
+        self.avg_used = 0.0
+
+    def waste_ratio(self):
+        total = self.avg_wasted + self.avg_used
+        return self.avg_wasted / total if total else 0.0
+
+    def should_speculate(self):
+        return self.waste_ratio() <= self.waste_budget
+
+    def record(self, escalated, scout_seconds, expert_seconds, speculated):
+        # A cancelled Expert ran for about as long as the Scout did.
+        wasted = 0.0 if escalated else scout_seconds
+        used = expert_seconds if escalated else 0.0
+        with self.lock:
+            self.avg_wasted += self.smoothing * (wasted - self.avg_wasted)
+            self.avg_used += self.smoothing * (used - self.avg_used)
+            if speculated:
+                self.speculations += 1
+                if escalated:
+                    self.paid_off += 1
+                    self.saved_seconds += scout_seconds
+                else:
+                    self.wasted_seconds += wasted
+
+    def summary(self):
+        rate = 100.0 * self.paid_off / self.speculations if self.speculations else 0.0
+        return (f"paid off {self.paid_off}/{self.speculations} ({rate:.0f}%), "
+                f"saved {self.saved_seconds:.1f}s, wasted {self.wasted_seconds:.1f} Expert-s, "
+                f"waste ratio {self.waste_ratio():.2f} (budget {self.waste_budget:.2f})")
+
+class TokenGate:
+    """Holds back the speculative Expert's tokens until it is actually needed."""
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.is_open = False
+
+    def __call__(self, model_name, token):
+        with self.lock:
+            if not self.is_open:
+                self.buffer.append((model_name, token))
+                return
+        self.on_token(model_name, token)
+
+    def open(self):
+        with self.lock:
+            buffered, self.buffer = self.buffer, []
+            self.is_open = True
+        for model_name, token in buffered:
+            self.on_token(model_name, token)
+
+speculation = SpeculationTracker()
+speculation_pool = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="speculative-expert")
+
+def run_speculative_cascade(prompt, on_token=None, p_complex=None):
+    """
+    Runs Scout and Expert at the same time. Returns (ans_scout, ans_expert,
+    early-exit decision); ans_expert is None when the Scout exited early and
+    the Expert was cancelled.
+    """
+    print("\n--- STAGE 1+2: SCOUT (tinyllama) + SPECULATIVE EXPERT (llama3) ---")
+    start_time = time.time()
+    cancel_event = threading.Event()
+    gate = TokenGate(on_token) if on_token else None
+    expert_future = speculation_pool.submit(metrics.in_context(call_ai_model), MODEL_EXPERT, prompt, gate, cancel_event)
+
+    details = {}
+    try:
+        ans_scout = call_ai_model(MODEL_SCOUT, prompt, on_token, details=details)
+        scout_seconds = time.time() - start_time
+        decision = judge_scout(prompt, ans_scout, details, p_complex)
+    except BrawnOverloaded:
+        cancel_event.set()
+        raise
+
+    if not decision.escalate:
+        cancel_event.set()
+        speculation.record(False, scout_seconds, 0.0, speculated=True)
+        ROUTE_DECISIONS.inc("speculation_cancelled")
+        print(f"[Speculation] Scout exited early. Expert cancelled. {speculation.summary()}")
+        return ans_scout, None, decision
+
+    if gate:
+        gate.open()
+    ans_expert = expert_future.result()
+    speculation.record(True, scout_seconds, time.time() - start_time, speculated=True)
+    ROUTE_DECISIONS.inc("speculation_paid_off")
+    print(f"[Speculation] Expert was needed; Scout latency hidden. {speculation.summary()}")
+    return ans_scout, ans_expert, decision
+
+# --- 6. CASCADE LOGIC (The New Brain) ---
+semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+
+def semantic_lookup(prompt, cache_client):
+    """Finds the answer to a near-identical cached prompt, if there is one."""
+    match = semantic_cache.lookup(prompt)
+    if not match:
+        return None
+    similar_key, similarity = match
+    cached = cache_client.get(similar_key)
+    if cached:
+        print(f"[Cache] SEMANTIC HIT (similarity {similarity:.2f}): '{similar_key}'")
+    else:
+        semantic_cache.discard(similar_key) # Expired in Redis
+    return cached
+
+def run_system(prompt, cache_client, on_token=None, session_id=None):
+    """
+    Answers one prompt. With a session_id, the prompt is a turn in that
+    conversation: the first turn is answered (and cached) like any prompt,
+    later ones depend on what came before and skip the cache.
+    """
+    with metrics.trace_request("ask", prompt=prompt[:80]), metrics.stage(STAGE_SECONDS, "request"):
+        conversation = session_store.get(session_id) if session_id and session_store is not None else None
+        if conversation is None:
+            return answer_request(prompt, cache_client, on_token)
+        with conversation.lock:
+            if not conversation.turn_count:
+                answer, answered_by = answer_request(prompt, cache_client, on_token), None
+            else:
+                answer, answered_by = answer_turn(prompt, conversation, on_token)
+            if "Error" not in answer:
+                conversation.add_turn(prompt, answer, answered_by)
+            return answer
+
+def answer_turn(prompt, conversation, on_token=None):
+    """A follow-up turn: the cascade, with each model continuing from its own context."""
+    print("="*50)
+    print(f"[Super AI] Turn {conversation.turn_count + 1} of session '{conversation.id}': '{prompt}'")
+    load_shedder.check_admission()
+    with sessions.active(conversation):
+        answer, answered_by, _degraded = answer_prompt(prompt, on_token, load_shedder.prefer_scout())
+    print(f"\nFINAL VERIFIED ANSWER:\n{answer}\n{'='*50}")
+    return answer, answered_by
+
+def answer_request(prompt, cache_client, on_token=None):
     print("="*50)
     print(f"[Super AI] Prompt: '{prompt}'")
     
-    # 1. Cache Check
-    cache_key = f"prompt:{prompt}"
+    # 1. Cache Check (case/spacing/trailing punctuation don't matter)
+    cache_key = make_cache_key(prompt)
     if cache_client:
+        lookup_start = time.perf_counter()
         try:
-            cached = cache_client.get(cache_key)
+            entry, ttl_seconds = cache_client.get_entry_with_ttl(cache_key)
+            cached = entry.answer if entry is not None else None
+            result = "hit"
+            if entry is not None and is_stale(entry, ttl_seconds):
+                result = "stale"
+                refresh_in_background(prompt, cache_key, cache_client, entry)
+            if not cached and semantic_cache is not None:
+                cached = semantic_lookup(prompt, cache_client)
+                result = "semantic_hit"
+            CACHE_LOOKUPS.inc(result if cached else "miss")
+            metrics.record(STAGE_SECONDS, time.perf_counter() - lookup_start, "cache_lookup")
             if cached:
                 print("[Cache] HIT! Returning instantly.")
                 print(f"\nFINAL ANSWER:\n{cached}\n{'='*50}")
-                return
+                return cached
         except Exception as e:
+            CACHE_LOOKUPS.inc("error")
             print(f"[Cache] Read Error: {e}")
 
+    load_shedder.check_admission() # Brain short of RAM: no new generations, cache hits still served
     print("[Cache] MISS. Starting Cascade...")
-    final_answer = ""
+    if SINGLE_FLIGHT_ENABLED:
+        final_answer, is_leader = inflight.do(
+            cache_key, lambda: generate_answer(prompt, cache_key, cache_client, on_token)
+        )
+        if not is_leader:
+            ROUTE_DECISIONS.inc("single_flight_shared")
+            print("[SingleFlight] Identical prompt was already in flight. Shared its answer.")
+            print(f"\nFINAL VERIFIED ANSWER:\n{final_answer}")
+    else:
+        final_answer = generate_answer(prompt, cache_key, cache_client, on_token)
 
-    # --- STAGE 1: THE SCOUT (Fastest) ---
-    print("\n--- STAGE 1: SCOUT (tinyllama) ---")
-    ans_scout = call_ai_model(MODEL_SCOUT, prompt)
-    
-    # Simple Heuristic: If it's a short/simple answer, we trust it.
-    if len(ans_scout) < 150 and "Error" not in ans_scout: 
-        print("[Router] Scout answer is simple and valid. Early Exit.")
-        final_answer = ans_scout
+    print("="*50)
+    return final_answer
+
+# --- 7. SINGLE-FLIGHT ---
+inflight = SingleFlight()
+
+def generate_answer(prompt, cache_key, cache_client, on_token=None):
+    """
+    Runs the cascade unless another Brain replica already is (Redis lease),
+    in which case it waits for that replica's cached answer.
+    """
+    lease = None
+    if cache_client and DISTRIBUTED_SINGLE_FLIGHT and not cache_client.l2_is_down():
+        try:
+            lease = RedisLease(cache_client, cache_key)
+            if not lease.acquire():
+                ROUTE_DECISIONS.inc("lease_wait")
+                print("[SingleFlight] Another Brain is generating this answer. Waiting for it...")
+                answer = wait_for_answer(cache_client, cache_key, lease)
+                if answer:
+                    print(f"\nFINAL VERIFIED ANSWER (FROM ANOTHER BRAIN):\n{answer}")
+                    return answer
+                print("[SingleFlight] No answer from the other Brain. Generating here.")
+                if not lease.acquire():
+                    lease = None # Someone else took it first; theirs to release, not ours
+        except Exception as e:
+            print(f"[SingleFlight] WARNING: Lease unavailable, generating without it. {e}")
+            lease = None
+    try:
+        return run_cascade(prompt, cache_key, cache_client, on_token)
+    finally:
+        if lease:
+            lease.release()
+
+# --- 8. THE CASCADE ---
+complexity_router = ComplexityRouter.load() if COMPLEXITY_ROUTER_ENABLED else None
+router_log = OutcomeLog(complexity_router) if complexity_router is not None else None
+# How complex the prompt looks, for the early-exit score: the learned router, or its keyword prior if that is off
+prompt_complexity = complexity_router if complexity_router is not None else ComplexityRouter()
 
+def run_expert_first(prompt, on_token=None):
+    """For prompts the router is sure about: Expert straight away, Scout only as a fallback."""
+    print("\n--- STAGE 2: EXPERT (llama3) ---")
+    ROUTE_DECISIONS.inc("expert_first")
+    ans_expert = call_ai_model(MODEL_EXPERT, prompt, on_token)
+    if "Error" in ans_expert:
+        ROUTE_DECISIONS.inc("expert_fallback")
+        print("[Router] Expert failed. Falling back to Scout.")
+        return call_ai_model(MODEL_SCOUT, prompt, on_token), MODEL_SCOUT, True
+    return ans_expert, MODEL_EXPERT, False
+
+def run_scout_first(prompt, on_token=None, p_complex=None):
+    """The normal cascade: Scout, then the Expert if the Scout's answer isn't enough."""
+    speculate = SPECULATIVE_CASCADE and speculation.should_speculate()
+    if speculate:
+        ans_scout, ans_expert, decision = run_speculative_cascade(prompt, on_token, p_complex)
     else:
+        # --- STAGE 1: THE SCOUT (Fastest) ---
+        print("\n--- STAGE 1: SCOUT (tinyllama) ---")
+        scout_start = time.time()
+        details = {}
+        ans_scout = call_ai_model(MODEL_SCOUT, prompt, on_token, details=details)
+        scout_seconds = time.time() - scout_start
+        decision = judge_scout(prompt, ans_scout, details, p_complex)
+
+    if "Error" not in ans_scout and router_log is not None:
+        # The label the router learns: did the Scout's answer need the Expert?
+        # Judged without the router's own p_complex (see early_exit.ExitDecision)
+        router_log.record(prompt, decision.needs_expert)
+
+    if not decision.escalate:
+        ROUTE_DECISIONS.inc("early_exit")
+        print(f"[Router] Scout answer is confident ({decision.score:.2f} >= {decision.threshold:.2f}). Early Exit.")
+        if not speculate:
+            speculation.record(False, scout_seconds, 0.0, speculated=False)
+        return ans_scout, MODEL_SCOUT, False
+
+    if not speculate:
         # --- STAGE 2: THE EXPERT (Heavy) ---
         print("\n--- STAGE 2: EXPERT (llama3) ---")
-        print("[Router] Query is complex. Escalating to Llama-3...")
-        ans_expert = call_ai_model(MODEL_EXPERT, prompt)
-        
-        if "Error" in ans_expert:
-            print("[Router] Expert failed. Falling back to Scout.")
-            final_answer = ans_scout
-        else:
-            print("[Router] Expert finished. Overriding Scout.")
-            final_answer = ans_expert
+        print(f"[Router] Scout answer is not enough ({decision.reason}, {decision.score:.2f} < {decision.threshold:.2f}). "
+              "Escalating to Llama-3...")
+        ROUTE_DECISIONS.inc("escalate")
+        expert_start = time.time()
+        ans_expert = call_ai_model(MODEL_EXPERT, prompt, on_token)
+        speculation.record(True, scout_seconds, time.time() - expert_start, speculated=False)
+
+    if "Error" in ans_expert:
+        ROUTE_DECISIONS.inc("expert_fallback")
+        print("[Router] Expert failed. Falling back to Scout.")
+        return ans_scout, MODEL_SCOUT, True
+    print("[Router] Expert finished. Overriding Scout.")
+    return ans_expert, MODEL_EXPERT, False
+
+def run_scout_only(prompt, on_token=None):
+    """Under load (see load_shedder): the Scout's answer, never escalated."""
+    print("\n--- STAGE 1: SCOUT (tinyllama) ---")
+    print("[Watchdog] Brain under load. Scout only, no escalation.")
+    ROUTE_DECISIONS.inc("scout_only")
+    return call_ai_model(MODEL_SCOUT, prompt, on_token), MODEL_SCOUT, True
+
+def answer_prompt(prompt, on_token=None, scout_only=False):
+    """
+    Scout -> (maybe) Expert, without touching the cache. Returns (answer,
+    model, degraded); degraded is True when the answer is the Scout's only
+    because the Expert was skipped or failed (load shedding, a full Expert
+    queue, an error), so it should not be kept for long.
+    """
+    if scout_only:
+        return run_scout_only(prompt, on_token)
+    if complexity_router is not None:
+        skip_scout, p_complex = complexity_router.should_skip_scout(prompt)
+    else:
+        skip_scout, p_complex = False, prompt_complexity.predict(prompt)
+    if skip_scout:
+        print(f"[Router] Learned router: complex (p={p_complex:.2f}). Skipping the Scout.")
+        return run_expert_first(prompt, on_token)
+    return run_scout_first(prompt, on_token, p_complex)
+
+def run_cascade(prompt, cache_key, cache_client, on_token=None, store_degraded=True):
+    """
+    Scout -> (maybe) Expert, then saves the answer to the cache. A degraded
+    answer (see answer_prompt) is kept only for SHED_ANSWER_TTL, or not at
+    all without store_degraded.
+    """
+    start_time = time.time()
+    final_answer, answered_by, degraded = answer_prompt(prompt, on_token, load_shedder.prefer_scout())
 
     print(f"\nFINAL VERIFIED ANSWER:\n{final_answer}")
 
     # Save to Cache
-    if cache_client and "Error" not in final_answer:
+    if cache_client and "Error" not in final_answer and (store_degraded or not degraded):
         try:
-            cache_client.set(cache_key, final_answer, ex=3600)
+            # A Scout answer given under load or without the Expert is replaced soon
+            with metrics.stage(STAGE_SECONDS, "cache_write"):
+                cache_client.set(cache_key, final_answer, ex=SHED_ANSWER_TTL if degraded else CACHE_TTL,
+                                 model=answered_by, latency=time.time() - start_time)
+            if semantic_cache is not None:
+                semantic_cache.add(prompt)
             print("[Cache] Saved.")
         except Exception as e:
             print(f"[Cache] Write Error: {e}")
     
-    print("="*50)
+    return final_answer
+
+# --- 9. STALE-WHILE-REVALIDATE ---
+refresh_pool = concurrent.futures.ThreadPoolExecutor(max_workers=CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+refreshing = set()
+refresh_lock = threading.Lock()
+refresh_counts = {"started": 0, "skipped": 0, "failed": 0}
+
+def is_stale(entry, ttl_seconds):
+    """Past CACHE_SOFT_TTL_FRACTION of its lifetime (age + what is left of its TTL)."""
+    if ttl_seconds is None:
+        return False # No expiry: nothing to get ahead of
+    age = max(0.0, time.time() - entry.created_at)
+    return age >= CACHE_SOFT_TTL_FRACTION * (age + ttl_seconds)
+
+def refresh_in_background(prompt, cache_key, cache_client, entry):
+    """
+    Regenerates a stale cached answer off the request path. At most one
+    refresh per key at a time: per process via `refreshing`, across
+    replicas via the single-flight lease. Skipped while the Brain is
+    shedding load; the stale answer keeps being served until it expires.
+    """
+    with refresh_lock:
+        if load_shedder.state.level != NORMAL:
+            refresh_counts["skipped"] += 1
+            return False
+        if cache_key in refreshing:
+            return False
+        refreshing.add(cache_key)
+        refresh_counts["started"] += 1
+    age_minutes = (time.time() - entry.created_at) / 60
+    print(f"[Cache] STALE HIT ({age_minutes:.0f} min old). Refreshing in the background.")
+    refresh_pool.submit(refresh_answer, prompt, cache_key, cache_client)
+    return True
+
+def refresh_answer(prompt, cache_key, cache_client):
+    lease = None
+    try:
+        if DISTRIBUTED_SINGLE_FLIGHT and not cache_client.l2_is_down():
+            lease = RedisLease(cache_client, cache_key)
+            if not lease.acquire():
+                lease = None
+                return # Another replica is already regenerating it
+        # A fallback answer would replace a good one that is merely old
+        run_cascade(prompt, cache_key, cache_client, store_degraded=False)
+    except Exception as e:
+        with refresh_lock:
+            refresh_counts["failed"] += 1
+        print(f"[Cache] WARNING: Background refresh failed; the stale answer stays. {e}")
+    finally:
+        if lease:
+            lease.release()
+        with refresh_lock:
+            refreshing.discard(cache_key)
+
+# --- 10. SESSIONS ---
+# Per-conversation Ollama contexts (see sessions.py), LRU-bounded and dropped when idle
+session_store = sessions.SessionStore() if sessions.SESSIONS_ENABLED else None
+
+def brain_health():
+    """Extra fields for the server's /health endpoint."""
+    health = {"brawn": brawn_scheduler.stats(), "nodes": brawn_pool.stats(), "speculation": speculation.summary(),
+              "early_exit": exit_policy.stats(),
+              "load": load_shedder.stats(), "cache_refresh": dict(refresh_counts, running=len(refreshing))}
+    if scout_batcher is not None:
+        health["scout_batching"] = scout_batcher.stats()
+    if complexity_router is not None:
+        health["router"] = complexity_router.stats()
+    if session_store is not None:
+        health["sessions"] = session_store.stats()
+    return health
+
+def register_metrics(cache_client):
+    """Gauges and counters read at scrape time: Brawn queues and nodes, load level, cache tiers."""
+    def per_model(field):
+        return lambda: {(model,): stats[field] for model, stats in brawn_scheduler.stats()["models"].items()}
+
+    def per_node(field):
+        return lambda: {(url,): int(stats[field]) for url, stats in brawn_pool.stats().items()}
+
+    metrics.callback("sentinel_brawn_queue_depth", "Calls waiting for a Brawn slot.", per_model("queued"), ["model"])
+    metrics.callback("sentinel_brawn_running", "Calls holding a Brawn slot.", per_model("running"), ["model"])
+    metrics.callback("sentinel_brawn_rejected_total", "Calls rejected by the Brawn queue SLO.",
+                     per_model("rejected"), ["model"], kind="counter")
+    metrics.callback("sentinel_brawn_node_up", "1 if the Brawn node is healthy.", per_node("healthy"), ["node"])
+    metrics.callback("sentinel_brawn_node_outstanding", "Calls in flight per Brawn node.", per_node("outstanding"), ["node"])
+    metrics.callback("sentinel_load_level", "Watchdog load level: 0 normal, 1 elevated, 2 critical.",
+                     lambda: load_shedder.state.level)
+    metrics.callback("sentinel_ram_percent", "Brain VM RAM use.", lambda: load_shedder.state.ram_percent)
+    metrics.callback("sentinel_cpu_percent", "Brain VM CPU use (smoothed).", lambda: load_shedder.state.cpu_percent)
+    metrics.callback("sentinel_load_shed_total", "Requests degraded or rejected by the watchdog.",
+                     lambda: {(action,): count for action, count in dict(load_shedder.shed).items()}, ["action"], kind="counter")
+    metrics.callback("sentinel_cache_refreshes_total", "Stale-while-revalidate refreshes.",
+                     lambda: {(result,): count for result, count in dict(refresh_counts).items()}, ["result"], kind="counter")
+    metrics.callback("sentinel_single_flight_inflight", "Distinct prompts generating in this process.", inflight.inflight)
+    metrics.callback("sentinel_early_exit_threshold", "Confidence a Scout answer needs to exit early.",
+                     lambda: exit_policy.threshold)
+    metrics.callback("sentinel_early_exit_decisions_total", "Early-exit decisions on Scout answers by reason.",
+                     lambda: {(reason,): count for reason, count in exit_policy.stats()["reasons"].items()},
+                     ["reason"], kind="counter")
+    if session_store is not None:
+        metrics.callback("sentinel_sessions", "Conversations with a kept context.", lambda: len(session_store.sessions))
+        metrics.callback("sentinel_sessions_evicted_total", "Conversations dropped for the LRU bound or idleness.",
+                         lambda: {(reason,): count for reason, count in dict(session_store.evicted).items()},
+                         ["reason"], kind="counter")
+    if cache_client:
+        metrics.callback("sentinel_cache_tier_events_total", "Per-tier cache hits, misses, errors and invalidations.",
+                         lambda: {(event,): value for event, value in cache_client.stats().items()
+                                  if event.endswith(("_hits", "_misses", "_errors")) or event == "invalidations"},
+                         ["event"], kind="counter")
+        metrics.callback("sentinel_l1_bytes", "Bytes held by the in-process L1 cache.", lambda: cache_client.l1.used_bytes)
+
+def print_token(model_name, token):
+    """Streams tokens to the terminal as they arrive."""
+    print(token, end="", flush=True)
 
 if __name__ == "__main__":
-    # NLTK setup
-    try: nltk.data.find('tokenizers/punkt')
-    except LookupError: nltk.download('punkt', quiet=True)
-    
     watchdog = threading.Thread(target=hardware_watchdog, daemon=True)
     watchdog.start()
-    cache_client = get_redis_connection()
+    brawn_pool.start_health_checks()
+    # Ready for prompts now; Redis and the disk tier join when they are up
+    cache_client = new_cache_client()
+    register_metrics(cache_client)
     
-    if cache_client:
+    if BRAIN_MODE == "server":
+        from brain_server import run_server
+        # After the import above: the cache thread imports redis, which would hold it up
+        connect_cache_in_background(cache_client)
+        run_server(run_system, cache_client, health=brain_health, inflight_limit=load_shedder.inflight_limit)
+
+    else:
+        connect_cache_in_background(cache_client)
         print("\n=== AI CONSENSUS ENGINE READY ===")
-        print("Type 'exit' to quit.\n")
+        print("Type 'exit' to quit, 'chat' to start a conversation, 'new' to end it.\n")
+        # Prompts are independent (and cached) until 'chat': in a conversation,
+        # follow-ups continue from the models' context and skip the cache.
+        session_id = None
         
         while True:
             try:
@@ -148,13 +805,22 @@ if __name__ == "__main__":
                 if not user_prompt.strip():
                     continue
 
+                if user_prompt.lower() in ['chat', 'new']:
+                    if session_id is not None and session_store is not None:
+                        session_store.end(session_id)
+                    if user_prompt.lower() == 'chat' and session_store is not None:
+                        session_id = uuid.uuid4().hex
+                        print("[System] New conversation: follow-ups continue from the last answer.")
+                    else:
+                        session_id = None
+                        print("[System] Conversation ended: prompts are independent again.")
+                    continue
+
                 # Run your system with the user's prompt
-                run_system(user_prompt, cache_client)
+                run_system(user_prompt, cache_client, on_token=print_token, session_id=session_id)
                 
             except KeyboardInterrupt:    
                 print("\n[System] Interrupted. Exiting...")
                 break
             except Exception as e:
                 print(f"[System] Error: {e}")
-    else:
-        print("[System] Shutting down due to cache connection failure.")
@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+import time
+import concurrent.futures
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- 1. CONFIGURATION ---
+
+# One pooled HTTP session is shared by every model call, so calls to the
+# Brawn node reuse warm keep-alive connections over the Tailscale tunnel
+# instead of paying a new TCP handshake each time.
+BRAWN_POOL_SIZE = int(os.getenv("BRAWN_POOL_SIZE", "64"))
+BRAWN_CONNECT_TIMEOUT = float(os.getenv("BRAWN_CONNECT_TIMEOUT", "3.05"))
+
+# --- Read timeouts per model (seconds) ---
+MODEL_READ_TIMEOUTS = {
+    "tinyllama": 30,     # Scout
+    "llama3:8b": 300,    # Expert (5 min for heavy models)
+    "mistral:7b": 300,   # Judge
+    "phi3:mini": 60,     # brain_v0.5_cache_fix.py's committee
+}
+DEFAULT_READ_TIMEOUT = 300
+
+# --- Retries ---
+# Only failures where Ollama never started generating are retried:
+# refused/reset connections and "busy" status codes. Read timeouts are NOT
+# retried, since that would start a second 60-second generation.
+BRAWN_MAX_RETRIES = int(os.getenv("BRAWN_MAX_RETRIES", "3"))
+BRAWN_RETRY_BACKOFF = float(os.getenv("BRAWN_RETRY_BACKOFF", "0.5"))
+RETRY_STATUS_CODES = (502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+_fanout_pool = None
+
+class GenerationCancelled(Exception):
+    """Raised by generate_stream when its cancel_event is set mid-generation."""
+
+class StreamInterrupted(requests.ConnectionError):
+    """
+    The connection broke after Ollama had started streaming. Tokens may
+    already have reached on_token, so the call must not be retried elsewhere.
+    """
+
+# --- 2. SESSION ---
+def build_session(pool_size=BRAWN_POOL_SIZE, max_retries=BRAWN_MAX_RETRIES, connect_retries=None):
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries if connect_retries is None else connect_retries,
+        read=0,
+        status=max_retries,
+        backoff_factor=BRAWN_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "POST"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+def get_session():
+    """Returns the process-wide Brawn session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+def get_fanout_pool():
+    """Threads for sending a batch of prompts at once (see generate_concurrent) and for cancellable requests."""
+    global _fanout_pool
+    if _fanout_pool is None:
+        with _session_lock:
+            if _fanout_pool is None:
+                _fanout_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=BRAWN_POOL_SIZE, thread_name_prefix="brawn-fanout")
+    return _fanout_pool
+
+def model_timeout(model_name):
+    """(connect, read) timeout tuple for a model."""
+    return (BRAWN_CONNECT_TIMEOUT, MODEL_READ_TIMEOUTS.get(model_name, DEFAULT_READ_TIMEOUT))
+
+# --- 3. GENERATE ---
+def generate_request(model_name, prompt, stream, context=None, keep_alive=None, logprobs=False):
+    """
+    The /api/generate body. context is the token array a previous call
+    returned: Ollama continues from it (reusing the KV cache it still
+    holds) instead of reading the conversation again. With logprobs,
+    Ollama also returns each token's log-probability.
+    """
+    request = {"model": model_name, "prompt": prompt, "stream": stream}
+    if context:
+        request["context"] = context
+    if keep_alive is not None:
+        request["keep_alive"] = keep_alive
+    if logprobs:
+        request["logprobs"] = True
+    return request
+
+def generate(base_url, model_name, prompt, session=None, timeout=None, context=None, keep_alive=None,
+             logprobs=False):
+    """
+    Calls Ollama's /api/generate (non-streaming) and returns the parsed JSON.
+    Raises on connection errors and HTTP error statuses; callers decide how
+    to fall back.
+    """
+    session = session or get_session()
+    response = session.post(
+        f"{base_url}/api/generate",
+        json=generate_request(model_name, prompt, False, context, keep_alive, logprobs),
+        timeout=timeout or model_timeout(model_name),
+    )
+    response.raise_for_status()
+    return response.json()
+
+def generate_stream(base_url, model_name, prompt, on_token=None, session=None, timeout=None,
+                    cancel_event=None, context=None, keep_alive=None, logprobs=False):
+    """
+    Calls /api/generate with stream=True and reads Ollama's NDJSON chunks as
+    they arrive, passing each token to on_token(token). Returns the final
+    'done' chunk with the assembled answer in 'response' (so it can still be
+    cached), plus 'ttft' (time to first token) and 'total_time' in seconds.
+    With logprobs, the chunks' token log-probabilities are collected into
+    'logprobs' too.
+
+    If cancel_event (a threading.Event) gets set, the connection is dropped
+    at the next chunk, which makes Ollama stop generating, and
+    GenerationCancelled is raised. Before the first chunk (connecting, or
+    while Ollama queues and prefills) it is checked every 0.1s, so a
+    cancelled call gives its Brawn slot back straight away.
+    """
+    session = session or get_session()
+    start_time = time.perf_counter()
+    first_token_time = None
+    parts = []
+    token_logprobs = []
+    final_chunk = {}
+
+    post = lambda: session.post(
+        f"{base_url}/api/generate",
+        json=generate_request(model_name, prompt, True, context, keep_alive, logprobs),
+        timeout=timeout or model_timeout(model_name),
+        stream=True,
+    )
+    with (post() if cancel_event is None else _post_cancellable(post, cancel_event, model_name, start_time)) as response:
+        response.raise_for_status()
+        streaming = False
+        try:
+            for line in response.iter_lines():
+                if cancel_event is not None and cancel_event.is_set():
+                    raise GenerationCancelled(f"'{model_name}' cancelled after {time.perf_counter() - start_time:.2f}s")
+                if not line:
+                    continue
+                streaming = True
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+                token = chunk.get("response", "")
+                token_logprobs.extend(chunk.get("logprobs") or ())
+                if token:
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter() - start_time
+                    parts.append(token)
+                    if on_token:
+                        on_token(token)
+                if chunk.get("done"):
+                    final_chunk = chunk
+                    break
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            if not streaming:
+                raise
+            raise StreamInterrupted(f"'{model_name}' stream broke after {len(parts)} tokens. {e}") from e
+
+    result = dict(final_chunk)
+    result["response"] = "".join(parts)
+    if token_logprobs:
+        result["logprobs"] = token_logprobs
+    result["ttft"] = first_token_time
+    result["total_time"] = time.perf_counter() - start_time
+    return result
+
+def _post_cancellable(post, cancel_event, model_name, start_time):
+    """
+    Runs post() on another thread and waits for its response headers, or
+    for cancel_event. If cancelled first, the response is closed as soon as
+    it arrives (dropping the connection stops Ollama) and
+    GenerationCancelled is raised now.
+    """
+    future = get_fanout_pool().submit(post)
+    while True:
+        try:
+            return future.result(timeout=0.1)
+        except concurrent.futures.TimeoutError:
+            if cancel_event.is_set():
+                future.add_done_callback(lambda f: f.exception() is None and f.result().close())
+                raise GenerationCancelled(f"'{model_name}' cancelled after {time.perf_counter() - start_time:.2f}s, "
+                                          "before its first token")
+
+# --- 4. BATCHES ---
+def generate_concurrent(base_url, model_name, prompts, session=None, timeout=None):
+    """
+    For backends without a batch endpoint (Ollama): one /api/generate per
+    prompt, all in flight at once on the pooled keep-alive connections.
+    Returns one result per prompt, in order; a failed prompt gets its
+    exception instead. Raises if every prompt failed.
+    """
+    session = session or get_session()
+    futures = [
+        get_fanout_pool().submit(generate, base_url, model_name, prompt, session, timeout)
+        for prompt in prompts
+    ]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    if all(isinstance(result, Exception) for result in results):
+        raise results[0]
+    return results
+
+def generate_batch(base_url, model_name, prompts, session=None, timeout=None):
+    """
+    Sends all prompts in one OpenAI-style /v1/completions request (vLLM and
+    llama.cpp server accept a list of prompts). Returns one
+    {"response": text} dict per prompt, in order.
+    """
+    session = session or get_session()
+    response = session.post(
+        f"{base_url}/v1/completions",
+        json={"model": model_name, "prompt": list(prompts), "stream": False},
+        timeout=timeout or model_timeout(model_name),
+    )
+    response.raise_for_status()
+    results = [None] * len(prompts)
+    for choice in response.json()["choices"]:
+        results[choice["index"]] = {"model": model_name, "response": choice["text"], "done": True}
+    return results
@@ -0,0 +1,237 @@
+import os
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager
+import requests
+from brawn_client import build_session, get_session, GenerationCancelled, StreamInterrupted
+from brawn_scheduler import MODEL_CONCURRENCY, DEFAULT_MODEL_CONCURRENCY
+
+# --- 1. CONFIGURATION ---
+
+# The Brain can spread model calls over several Brawn nodes (laptops/GPU
+# boxes on the Tailscale network) instead of one LAPTOP_IP:
+#   BRAWN_NODES=100.64.0.1,100.64.0.2:11434,http://gpu-box:11434
+# Each node is probed in the background. A call goes to the node with the
+# fewest calls in flight, preferring nodes that already have the model in
+# memory (loading llama3 from disk takes longer than a short queue).
+# The scheduler's per-model caps (BRAWN_CONCURRENCY) also hold per node: a
+# node already running its one llama3 call is skipped for the next one, and
+# if every node with the model is at its cap the call waits for a free one.
+BRAWN_HEALTH_INTERVAL = float(os.getenv("BRAWN_HEALTH_INTERVAL", "5"))
+BRAWN_PROBE_TIMEOUT = float(os.getenv("BRAWN_PROBE_TIMEOUT", "2"))
+# Consecutive failures (calls or probes) before a node is ejected. Ejected
+# nodes keep being probed and come back on the first successful probe.
+BRAWN_EJECT_AFTER = int(os.getenv("BRAWN_EJECT_AFTER", "2"))
+# Extra "in-flight calls" charged to a node that would have to load the model
+MODEL_LOAD_PENALTY = float(os.getenv("BRAWN_MODEL_LOAD_PENALTY", "2"))
+
+DEFAULT_OLLAMA_PORT = 11434
+
+class NoHealthyNode(Exception):
+    """No Brawn node is up (or has the model installed)."""
+
+def parse_node_urls(text):
+    """'100.64.0.1, gpu-box:8000' -> ['http://100.64.0.1:11434', 'http://gpu-box:8000']"""
+    urls = []
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        if "://" not in item:
+            item = "http://" + item
+        if item.count(":") < 2: # No port given
+            item = f"{item}:{DEFAULT_OLLAMA_PORT}"
+        urls.append(item.rstrip("/"))
+    return urls
+
+def _tagged(model_name):
+    """Ollama reports 'tinyllama' as 'tinyllama:latest'."""
+    return model_name if ":" in model_name else model_name + ":latest"
+
+# --- 2. ONE NODE ---
+class BrawnNode:
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True       # Optimistic until the first probe says otherwise
+        self.failures = 0         # Consecutive
+        self.outstanding = 0
+        self.running = Counter()  # Calls in flight per model
+        self.served = 0
+        self.installed = None     # Set of model names from /api/tags (None = not probed yet)
+        self.loaded = set()       # Models in memory, from /api/ps and our own calls
+        self.last_error = ""
+
+    def has_model(self, model_name):
+        return self.installed is None or _tagged(model_name) in self.installed
+
+    def cost(self, model_name):
+        penalty = 0.0 if _tagged(model_name) in self.loaded else MODEL_LOAD_PENALTY
+        return self.outstanding + penalty
+
+    def stats(self):
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "running": {model: count for model, count in self.running.items() if count},
+            "served": self.served,
+            "failures": self.failures,
+            "installed": sorted(self.installed) if self.installed is not None else None,
+            "loaded": sorted(self.loaded),
+            "last_error": self.last_error,
+        }
+
+# --- 3. THE POOL ---
+class BrawnPool:
+    """
+    Least-outstanding-requests, model-affine routing over Brawn nodes, with
+    passive (failed calls) and active (/api/tags probes) health checks.
+    """
+
+    def __init__(self, urls, health_interval=BRAWN_HEALTH_INTERVAL, concurrency=None):
+        if not urls:
+            raise ValueError("BrawnPool needs at least one node URL")
+        self.nodes = [BrawnNode(url) for url in urls]
+        self.health_interval = health_interval
+        self.concurrency = MODEL_CONCURRENCY if concurrency is None else concurrency
+        self.lock = threading.Lock()
+        self.slot_freed = threading.Condition(self.lock)
+        # With other nodes to fail over to, don't retry connecting to a dead one
+        self.session = get_session() if len(self.nodes) == 1 else build_session(connect_retries=0)
+        # Probes must fail fast: no retries, short timeouts
+        self.probe_session = build_session(pool_size=len(self.nodes), max_retries=0)
+        self.checker = None
+        self.stop = threading.Event()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # --- Routing ---
+    def pick(self, model_name, exclude=(), prefer=None, cancel_event=None):
+        limit = self.concurrency.get(model_name, DEFAULT_MODEL_CONCURRENCY)
+        with self.lock:
+            while True:
+                candidates = [
+                    node for node in self.nodes
+                    if node.healthy and node.url not in exclude and node.has_model(model_name)
+                ]
+                if not candidates:
+                    raise NoHealthyNode(f"no healthy Brawn node has '{model_name}'")
+                candidates = [node for node in candidates if node.running[model_name] < limit]
+                if candidates:
+                    break
+                # Every node with the model is at its cap. Re-checked now and
+                # then too: a node may get ejected while we wait.
+                if cancel_event is not None and cancel_event.is_set():
+                    raise GenerationCancelled(f"'{model_name}' cancelled while waiting for a node")
+                self.slot_freed.wait(timeout=0.1 if cancel_event is not None else 1.0)
+            # A session's node still holds its KV cache: worth a longer queue than a fresh prefill
+            node = next((n for n in candidates if n.url == prefer), None)
+            if node is None:
+                best = min(node.cost(model_name) for node in candidates)
+                # Random among equally good nodes, so idle nodes share the load
+                node = random.choice([n for n in candidates if n.cost(model_name) == best])
+            node.outstanding += 1
+            node.running[model_name] += 1
+            return node
+
+    @contextmanager
+    def node_for(self, model_name, exclude=(), prefer=None, cancel_event=None):
+        """
+        Yields the node to call for model_name and tracks the call as
+        outstanding. Connection failures and 5xx responses count against
+        the node; anything else (cancellations, bad prompts) does not.
+        """
+        node = self.pick(model_name, exclude, prefer, cancel_event)
+        ok = False
+        try:
+            yield node
+            ok = True
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self._record_failure(node, e)
+            raise
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code >= 500:
+                self._record_failure(node, e)
+            raise
+        finally:
+            with self.lock:
+                node.outstanding -= 1
+                node.running[model_name] -= 1
+                self.slot_freed.notify_all()
+                if ok:
+                    node.served += 1
+                    node.failures = 0
+                    node.loaded.add(_tagged(model_name))
+
+    def call(self, model_name, fn, prefer=None, cancel_event=None):
+        """
+        Runs fn(base_url, session) on the best node (or on prefer, the URL
+        of a healthy node that has the model). If the node can't be reached
+        at all (Ollama never started generating), tries the next best node;
+        a stream that breaks after its first chunk (StreamInterrupted) is
+        not retried, as its tokens may already have gone to the client.
+        A set cancel_event stops the wait for a node with a free slot.
+        """
+        tried = []
+        while True:
+            try:
+                with self.node_for(model_name, exclude=tried, prefer=prefer, cancel_event=cancel_event) as node:
+                    return fn(node.url, self.session)
+            except requests.ConnectionError as e:
+                if isinstance(e, StreamInterrupted) or len(tried) + 1 >= len(self.nodes):
+                    raise
+                tried.append(node.url)
+                print(f"[Pool] {node.url} unreachable for '{model_name}', trying another node.")
+
+    def _record_failure(self, node, error):
+        with self.lock:
+            node.failures += 1
+            node.last_error = str(error)[:200]
+            if node.healthy and node.failures >= BRAWN_EJECT_AFTER:
+                node.healthy = False
+                print(f"[Pool] Ejected {node.url} after {node.failures} failures. {node.last_error}")
+
+    # --- Active health checks ---
+    def _get_models(self, url, path):
+        response = self.probe_session.get(f"{url}{path}", timeout=BRAWN_PROBE_TIMEOUT)
+        response.raise_for_status()
+        return {model.get("name", "") for model in response.json().get("models", [])}
+
+    def probe(self, node):
+        try:
+            installed = self._get_models(node.url, "/api/tags")
+        except Exception as e:
+            self._record_failure(node, e)
+            return False
+        try:
+            loaded = self._get_models(node.url, "/api/ps")
+        except Exception:
+            loaded = None # Older Ollama without /api/ps: keep what our own calls taught us
+        with self.lock:
+            node.installed = installed
+            if loaded is not None:
+                node.loaded = loaded
+            node.failures = 0
+            if not node.healthy:
+                node.healthy = True
+                self.slot_freed.notify_all()
+                print(f"[Pool] Readmitted {node.url}.")
+        return True
+
+    def probe_all(self):
+        for node in self.nodes:
+            self.probe(node)
+
+    def _health_loop(self):
+        while True:
+            self.probe_all()
+            if self.stop.wait(self.health_interval):
+                return
+
+    def start_health_checks(self):
+        """Probes every node now and then every health_interval seconds, in the background."""
+        self.checker = threading.Thread(target=self._health_loop, name="brawn-health", daemon=True)
+        self.checker.start()
+        return self.checker
+
+    def stats(self):
+        with self.lock:
+            return {node.url: node.stats() for node in self.nodes}
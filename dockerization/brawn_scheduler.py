@@ -0,0 +1,183 @@
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from brawn_client import GenerationCancelled
+
+# --- 1. CONFIGURATION ---
+
+# Every model call waits here for a slot before it reaches the Brawn node.
+# Two llama3 generations at once make Ollama swap models (or run out of RAM)
+# on a laptop, so each model gets its own cap and the node gets a total cap.
+def _parse_model_map(text, cast):
+    """'tinyllama=4,llama3:8b=1' -> {'tinyllama': 4, 'llama3:8b': 1}"""
+    result = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, _, value = item.rpartition("=")
+        result[name] = cast(value)
+    return result
+
+MODEL_CONCURRENCY = {"tinyllama": 4, "llama3:8b": 1, "mistral:7b": 1}
+MODEL_CONCURRENCY.update(_parse_model_map(os.getenv("BRAWN_CONCURRENCY", ""), int))
+DEFAULT_MODEL_CONCURRENCY = 1
+BRAWN_TOTAL_CONCURRENCY = int(os.getenv("BRAWN_TOTAL_CONCURRENCY", "4"))
+
+# Lower number = served first when models compete for the node's slots.
+# Cheap Scout calls go ahead of Judge and Expert calls.
+MODEL_PRIORITY = {"tinyllama": 0, "mistral:7b": 1, "llama3:8b": 2}
+DEFAULT_PRIORITY = 1
+# A call that has waited this long (seconds) stops giving way to cheaper
+# models, and they give way to it, so steady Scout traffic can't starve an
+# Expert call that was admitted. Among such calls the oldest goes first.
+BRAWN_PRIORITY_MAX_WAIT = float(os.getenv("BRAWN_PRIORITY_MAX_WAIT", "2.0"))
+
+# Longest acceptable queue wait per model (seconds). If the expected wait is
+# longer, the call is rejected straight away instead of queueing: the Brain
+# then degrades to the Scout, or tells the client to retry later. A queued
+# call that still hasn't started by then is rejected the same way.
+MODEL_QUEUE_SLO = {"tinyllama": 5.0, "llama3:8b": 60.0, "mistral:7b": 60.0}
+MODEL_QUEUE_SLO.update(_parse_model_map(os.getenv("BRAWN_QUEUE_SLO", ""), float))
+DEFAULT_QUEUE_SLO = 30.0
+
+# Starting guesses for how long one call holds a slot; learned as calls finish.
+SERVICE_TIME_GUESS = {"tinyllama": 3.0, "llama3:8b": 50.0, "mistral:7b": 30.0}
+DEFAULT_SERVICE_TIME = 10.0
+
+class BrawnOverloaded(Exception):
+    """The queue for a model is too long to meet its latency SLO."""
+
+    def __init__(self, model_name, expected_wait):
+        super().__init__(f"'{model_name}' queue is full (expected wait {expected_wait:.1f}s)")
+        self.model_name = model_name
+        self.expected_wait = expected_wait
+        self.retry_after = max(1, math.ceil(expected_wait))
+
+# --- 2. THE SCHEDULER ---
+class _Ticket:
+    __slots__ = ("queued_at",)
+
+    def __init__(self):
+        self.queued_at = time.monotonic()
+
+class BrawnScheduler:
+    """
+    Per-model FIFO queues with per-model and total concurrency caps.
+    When a slot frees up, waiting calls for higher-priority (cheaper) models
+    get it first, unless a call has waited past priority_max_wait.
+    """
+
+    def __init__(self, concurrency=None, total_concurrency=BRAWN_TOTAL_CONCURRENCY, slos=None, nodes=1,
+                 priority_max_wait=BRAWN_PRIORITY_MAX_WAIT):
+        # Caps are per Brawn node; a pool of N nodes gets N times the slots
+        concurrency = MODEL_CONCURRENCY if concurrency is None else concurrency
+        self.concurrency = {model: limit * nodes for model, limit in concurrency.items()}
+        self.total_concurrency = total_concurrency * nodes
+        self.nodes = nodes
+        self.slos = dict(MODEL_QUEUE_SLO if slos is None else slos)
+        self.priority_max_wait = priority_max_wait
+        self.cond = threading.Condition()
+        self.queues = defaultdict(deque)
+        self.running = Counter()
+        self.total_running = 0
+        self.avg_service = dict(SERVICE_TIME_GUESS)
+        self.completed = Counter()
+        self.rejected = Counter()
+
+    def limit(self, model_name):
+        return self.concurrency.get(model_name, DEFAULT_MODEL_CONCURRENCY * self.nodes)
+
+    def expected_wait(self, model_name):
+        """Rough queue wait for a call that joins the back of the queue now."""
+        if self._can_start(model_name, None):
+            return 0.0
+        ahead = len(self.queues[model_name]) + 1
+        service = self.avg_service.get(model_name, DEFAULT_SERVICE_TIME)
+        return ahead * service / self.limit(model_name)
+
+    def _can_start(self, model_name, ticket):
+        if self.running[model_name] >= self.limit(model_name):
+            return False
+        if self.total_running >= self.total_concurrency:
+            return False
+        queue = self.queues[model_name]
+        if queue and queue[0] is not ticket:
+            return False # FIFO within a model
+        priority = MODEL_PRIORITY.get(model_name, DEFAULT_PRIORITY)
+        now = time.monotonic()
+        aged = ticket is not None and now - ticket.queued_at >= self.priority_max_wait
+        for other, other_queue in self.queues.items():
+            if not other_queue or other == model_name or self.running[other] >= self.limit(other):
+                continue
+            head = other_queue[0]
+            if now - head.queued_at >= self.priority_max_wait:
+                if not aged or head.queued_at < ticket.queued_at:
+                    return False # A call that has waited too long goes first
+            elif not aged and MODEL_PRIORITY.get(other, DEFAULT_PRIORITY) < priority:
+                return False # A cheaper model is waiting for this slot
+        return True
+
+    def acquire(self, model_name, cancel_event=None):
+        with self.cond:
+            wait = self.expected_wait(model_name)
+            slo = self.slos.get(model_name, DEFAULT_QUEUE_SLO)
+            if wait > slo:
+                self.rejected[model_name] += 1
+                raise BrawnOverloaded(model_name, wait)
+
+            ticket = _Ticket()
+            queue = self.queues[model_name]
+            queue.append(ticket)
+            try:
+                while not self._can_start(model_name, ticket):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise GenerationCancelled(f"'{model_name}' cancelled while queued")
+                    waited = time.monotonic() - ticket.queued_at
+                    if waited > slo:
+                        self.rejected[model_name] += 1
+                        raise BrawnOverloaded(model_name, waited)
+                    self.cond.wait(timeout=0.1)
+            finally:
+                queue.remove(ticket)
+                self.cond.notify_all() # The next ticket may be at the head now
+            self.running[model_name] += 1
+            self.total_running += 1
+
+    def release(self, model_name, held_seconds):
+        with self.cond:
+            self.running[model_name] -= 1
+            self.total_running -= 1
+            self.completed[model_name] += 1
+            average = self.avg_service.get(model_name, DEFAULT_SERVICE_TIME)
+            self.avg_service[model_name] = average + 0.2 * (held_seconds - average)
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, model_name, cancel_event=None):
+        """Holds one Brawn slot for model_name for the duration of the block."""
+        self.acquire(model_name, cancel_event)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(model_name, time.monotonic() - start_time)
+
+    def stats(self):
+        with self.cond:
+            models = set(self.running) | set(self.queues) | set(self.concurrency)
+            return {
+                "total_running": self.total_running,
+                "total_concurrency": self.total_concurrency,
+                "models": {
+                    model: {
+                        "running": self.running[model],
+                        "queued": len(self.queues[model]),
+                        "limit": self.limit(model),
+                        "avg_service_s": round(self.avg_service.get(model, DEFAULT_SERVICE_TIME), 2),
+                        "completed": self.completed[model],
+                        "rejected": self.rejected[model],
+                    }
+                    for model in sorted(models)
+                },
+            }
@@ -0,0 +1,336 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from answer_codec import encode_answer, decode_answer
+
+# --- 1. CONFIGURATION ---
+
+# L1 = in-process LRU in front of Redis (L2). Hot prompts skip the network
+# round trip to AWS/Azure entirely.
+L1_CACHE_ENABLED = os.getenv("L1_CACHE", "1") == "1"
+L1_MAX_BYTES = int(os.getenv("L1_MAX_BYTES", str(64 * 1024 * 1024)))   # 64 MB
+
+# Brain replicas tell each other which keys changed over this pub/sub channel.
+INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "sentinel:cache-invalidate")
+FLUSH_ALL = "*" # Published by clear_cache.py after it unlinks every cached answer (--all)
+
+# Also listen to Redis keyspace notifications (needs notify-keyspace-events
+# on the server, often disabled on free tiers), so deletes/expiries made
+# outside the Brain drop out of L1 too.
+L1_KEYSPACE_EVENTS = os.getenv("L1_KEYSPACE_EVENTS", "0") == "1"
+
+# With a disk tier (see disk_cache), a Redis outage is not fatal: reads and
+# writes go to disk, and Redis is only retried every REDIS_RETRY_SECONDS so
+# requests don't each wait for a connect timeout.
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", "5"))
+# On boot, L1 is filled with this many of the newest disk entries that Redis still has
+L1_WARM_ENTRIES = int(os.getenv("L1_WARM_ENTRIES", "1000"))
+
+# --- 2. L1: IN-PROCESS LRU ---
+class LRUCache:
+    """Byte-bounded LRU with per-entry expiry (mirrors the Redis TTL)."""
+
+    def __init__(self, max_bytes=L1_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.entries = OrderedDict()   # key -> (value, expires_at, size)
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        return self.get_with_ttl(key)[0]
+
+    def get_with_ttl(self, key):
+        """(value, seconds until it expires or None), or (None, None)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None, None
+            value, expires_at, _size = entry
+            now = time.monotonic()
+            if expires_at is not None and expires_at <= now:
+                self._pop(key)
+                return None, None
+            self.entries.move_to_end(key)
+            return value, expires_at - now if expires_at is not None else None
+
+    def set(self, key, value, ttl_seconds=None, size=None):
+        size = size or sys.getsizeof(key) + sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds else None
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = (value, expires_at, size)
+            self.used_bytes += size
+            while self.used_bytes > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used_bytes = 0
+
+    def _pop(self, key):
+        _value, _expires_at, size = self.entries.pop(key)
+        self.used_bytes -= size
+
+    def __len__(self):
+        return len(self.entries)
+
+def redis_down_errors():
+    """
+    The errors that mean Redis is unreachable. redis is imported here, not
+    at the top: it takes ~130 ms, and by the time a Redis call can fail the
+    client has long imported it.
+    """
+    import redis
+    return (redis.ConnectionError, redis.TimeoutError)
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+# --- 3. L1 + L2 (+ DISK) ---
+class TieredCache:
+    """
+    Drop-in wrapper around the Redis client used by run_system.
+
+    get() checks L1, then Redis (value and remaining TTL in one round trip)
+    and fills L1 with the same expiry. set()/delete() write through to Redis
+    and publish the key so other Brain replicas drop their L1 copy.
+    With a disk tier, writes also go to disk, and while Redis is
+    unreachable reads are served from disk instead.
+    Answers go to Redis in the compact answer_codec format (the Redis client
+    must use decode_responses=False); L1 keeps them decoded.
+    Anything else (scan_iter, ping, ...) goes straight to Redis.
+    redis_client may be None at first (the Brain connects in the background,
+    see attach_l2); until then only L1 and the disk tier are used.
+    """
+
+    def __init__(self, redis_client, l1=None, disk=None):
+        self.l2 = redis_client
+        self.l1 = l1 if l1 is not None else LRUCache()
+        self.disk = disk
+        self.l2_down_until = 0.0
+        self.replica_id = uuid.uuid4().hex[:12]
+        self.lock = threading.Lock()
+        self.counters = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0, "invalidations": 0,
+                         "l2_errors": 0, "disk_hits": 0, "disk_misses": 0}
+        self.listener = None
+
+    def __getattr__(self, name):
+        return getattr(self.l2, name)
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def get(self, key):
+        """Returns just the answer text, like redis.get did."""
+        entry = self.get_entry(key)
+        return entry.answer if entry is not None else None
+
+    def get_entry(self, key):
+        """Returns the CachedAnswer (answer + metadata) or None."""
+        return self.get_entry_with_ttl(key)[0]
+
+    def get_entry_with_ttl(self, key):
+        """
+        (CachedAnswer, seconds until it expires), or (None, None). The
+        seconds are None for an entry without an expiry.
+        """
+        entry, ttl_seconds = self.l1.get_with_ttl(key)
+        if entry is not None:
+            self._count("l1_hits")
+            return entry, ttl_seconds
+        self._count("l1_misses")
+        if self.l2_is_down():
+            return self._get_from_disk(key)
+
+        try:
+            pipe = self.l2.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, pttl = pipe.execute()
+        except redis_down_errors() as e:
+            if self.disk is None:
+                raise
+            self.mark_l2_down(e)
+            return self._get_from_disk(key)
+        if raw is None:
+            self._count("l2_misses")
+            return None, None
+        self._count("l2_hits")
+        entry = decode_answer(raw)
+        # pttl is -1 for keys without an expiry
+        ttl_seconds = pttl / 1000.0 if pttl and pttl > 0 else None
+        self._fill_l1(key, entry, ttl_seconds)
+        if self.disk is not None and key not in self.disk:
+            self.disk.set(key, raw, ttl_seconds) # Written by another replica: keep a copy for outages
+        return entry, ttl_seconds
+
+    def _get_from_disk(self, key):
+        found = self.disk.get(key) if self.disk is not None else None
+        if found is None:
+            self._count("disk_misses")
+            return None, None
+        self._count("disk_hits")
+        raw, ttl_seconds = found
+        entry = decode_answer(raw) # Decoded straight from the mapped file
+        self._fill_l1(key, entry, ttl_seconds)
+        return entry, ttl_seconds
+
+    def set(self, key, answer, ex=None, model="", votes=1, voters=1, latency=0.0):
+        """Stores an answer plus which model gave it, its votes and latency."""
+        raw = encode_answer(answer, model, votes, voters, latency)
+        if self.disk is not None:
+            self.disk.set(key, raw, ex)
+        if self.l2_is_down():
+            result = True # On disk; Redis gets it again next time the prompt misses
+        else:
+            try:
+                result = self.l2.set(key, raw, ex=ex)
+            except redis_down_errors() as e:
+                if self.disk is None:
+                    raise
+                self.mark_l2_down(e)
+                result = True
+            else:
+                if result:
+                    self._publish(key)
+        if result:
+            self._fill_l1(key, decode_answer(raw), ex)
+        return result
+
+    def set_many(self, entries, ex=None):
+        """
+        Bulk set() in one pipelined round trip, for warm_cache.py.
+        entries: [(key, answer, model, latency), ...]. Skips L1: a bulk
+        load would only evict the answers this process is actually serving.
+        """
+        pipe = self.l2.pipeline(transaction=False)
+        for key, answer, model, latency in entries:
+            raw = encode_answer(answer, model, latency=latency)
+            if self.disk is not None:
+                self.disk.set(key, raw, ex)
+            pipe.set(key, raw, ex=ex)
+            pipe.publish(INVALIDATION_CHANNEL, f"{self.replica_id}|{key}")
+        return pipe.execute()[::2]
+
+    # --- Redis outages ---
+    def attach_l2(self, redis_client):
+        """Starts using Redis, once connected."""
+        self.l2 = redis_client
+        self.l2_down_until = 0.0
+
+    def l2_is_down(self):
+        return self.l2 is None or (self.disk is not None and time.monotonic() < self.l2_down_until)
+
+    def mark_l2_down(self, error):
+        """Sends reads and writes to disk for the next REDIS_RETRY_SECONDS."""
+        self._count("l2_errors")
+        if not self.l2_is_down():
+            print(f"[Cache] WARNING: Redis unreachable, using the disk cache for "
+                  f"{REDIS_RETRY_SECONDS:.0f}s. {error}")
+        self.l2_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def _fill_l1(self, key, entry, ttl_seconds):
+        size = sys.getsizeof(key) + sys.getsizeof(entry.answer) + sys.getsizeof(entry.model) + 120
+        self.l1.set(key, entry, ttl_seconds, size=size)
+
+    def delete(self, *keys):
+        result = self.l2.delete(*keys) if self.l2 is not None else 0
+        for key in keys:
+            self.l1.delete(key)
+            if self.disk is not None:
+                self.disk.delete(key)
+            self._publish(key)
+        return result
+
+    def warm_from_disk(self, limit=L1_WARM_ENTRIES):
+        """
+        Fills L1 with the newest disk entries that Redis still has (one
+        pipelined PTTL round trip), so a restarted Brain starts warm.
+        Entries deleted from Redis while this Brain was down are skipped.
+        Returns how many entries were loaded.
+        """
+        if self.disk is None or self.l1.max_bytes <= 0 or self.l2_is_down():
+            return 0
+        keys = self.disk.keys()[-limit:]
+        pipe = self.l2.pipeline(transaction=False)
+        for key in keys:
+            pipe.pttl(key)
+        loaded = 0
+        for key, pttl in zip(keys, pipe.execute()):
+            found = self.disk.get(key) if pttl != -2 else None # -2: not in Redis
+            if found is not None:
+                self._fill_l1(key, decode_answer(found[0]), pttl / 1000.0 if pttl > 0 else None)
+                loaded += 1
+        return loaded
+
+    def _publish(self, key):
+        if self.l2 is None:
+            return
+        try:
+            self.l2.publish(INVALIDATION_CHANNEL, f"{self.replica_id}|{key}")
+        except Exception as e:
+            print(f"[Cache] WARNING: Could not publish invalidation. {e}")
+
+    # --- Cross-replica invalidation ---
+    def _on_invalidation(self, message):
+        sender, _, key = _text(message["data"]).partition("|")
+        if sender == self.replica_id:
+            return
+        self._count("invalidations")
+        if key == FLUSH_ALL:
+            self.l1.clear()
+            if self.disk is not None:
+                self.disk.clear()
+        else:
+            self.l1.delete(key)
+            if self.disk is not None:
+                self.disk.delete(key)
+
+    def _on_keyspace_event(self, message):
+        # channel: __keyspace@0__:<key>, data: del / expired / evicted / set ...
+        if _text(message["data"]) in ("del", "unlink", "expired", "evicted", "set"):
+            self._count("invalidations")
+            self.l1.delete(_text(message["channel"]).split(":", 1)[1])
+
+    def start_invalidation_listener(self, keyspace_events=L1_KEYSPACE_EVENTS):
+        """Subscribes in a background thread. Safe to call once per process."""
+        pubsub = self.l2.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+        if keyspace_events:
+            pubsub.psubscribe(**{"__keyspace@*__:prompt:*": self._on_keyspace_event})
+        self.listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+        return self.listener
+
+    def stats(self):
+        """Hit/miss counters per tier, for sizing L1."""
+        with self.lock:
+            stats = dict(self.counters)
+        l1_lookups = stats["l1_hits"] + stats["l1_misses"]
+        l2_lookups = stats["l2_hits"] + stats["l2_misses"]
+        stats.update({
+            "l1_hit_rate": round(stats["l1_hits"] / l1_lookups, 3) if l1_lookups else 0.0,
+            "l2_hit_rate": round(stats["l2_hits"] / l2_lookups, 3) if l2_lookups else 0.0,
+            "l1_entries": len(self.l1),
+            "l1_bytes": self.l1.used_bytes,
+            "l1_max_bytes": self.l1.max_bytes,
+            "l1_evictions": self.l1.evictions,
+            "l2_down": self.l2_is_down(),
+        })
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
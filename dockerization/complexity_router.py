@@ -0,0 +1,243 @@
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from data_dir import data_path, make_parent_dir
+from semantic_cache import wordpunct_tokenize
+
+# --- 1. CONFIGURATION ---
+
+# Predicts, before any model call, whether a prompt will need the Expert.
+# Prompts that clearly will skip the Scout generation the cascade would
+# throw away. A hashed word/bigram logistic model: ~20 dict lookups per
+# prompt, so it adds microseconds, not a model call.
+COMPLEXITY_ROUTER_ENABLED = os.getenv("COMPLEXITY_ROUTER", "1") == "1"
+# Only skip the Scout when the router is at least this sure
+ROUTER_SKIP_SCOUT_THRESHOLD = float(os.getenv("ROUTER_SKIP_SCOUT_THRESHOLD", "0.85"))
+# Share of "sure" prompts that still run the Scout, so the router keeps
+# getting labels for the prompts it would otherwise skip.
+ROUTER_EXPLORE = float(os.getenv("ROUTER_EXPLORE", "0.05"))
+
+# Every cascade outcome (did the Scout's answer need the Expert?) is
+# appended here; `python complexity_router.py train` retrains from it. The
+# lines hold raw prompts. Past ROUTER_LOG_MAX_BYTES the log is moved to
+# <path>.1 (replacing the previous one) and a new one is started. An empty
+# ROUTER_LOG_PATH turns the log off.
+ROUTER_LOG_PATH = os.getenv("ROUTER_LOG_PATH", data_path("router_outcomes.jsonl"))
+ROUTER_LOG_MAX_BYTES = int(os.getenv("ROUTER_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+ROUTER_MODEL_PATH = os.getenv("ROUTER_MODEL_PATH", data_path("router_model.json"))
+ROUTER_SAVE_EVERY = int(os.getenv("ROUTER_SAVE_EVERY", "200"))   # Online updates between saves
+
+HASH_BITS = 18
+LEARNING_RATE = 0.1
+L2 = 1e-6
+
+# Cold start: the keyword list from brain_v0.5's is_complex_query, as
+# weights. One keyword alone is not enough to skip the Scout; two are.
+COMPLEX_KEYWORDS = [
+    'analyze', 'compare', 'summarize', 'explain', 'contrast',
+    'report', 'review', 'optim', 'debug', 'code', 'write me a'
+]
+PRIOR_KEYWORD_WEIGHT = 2.5
+PRIOR_BIAS = -2.0
+
+# --- 2. FEATURES ---
+def _bucket(feature):
+    return zlib.crc32(feature.encode("utf-8")) & ((1 << HASH_BITS) - 1)
+
+def router_features(prompt):
+    """
+    Hashed binary features: words, word bigrams, 5-letter word prefixes
+    ("optim" for optimize/optimization) and a length bucket.
+    brain_v0.5_cache_fix.py uses these too.
+    """
+    tokens = [t for t in wordpunct_tokenize(prompt.casefold()) if t.isalnum()]
+    features = list(tokens)
+    features += [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    features += ["p:" + t[:5] for t in tokens if len(t) >= 5]
+    features.append(f"len:{min(len(tokens) // 5, 10)}")
+    return {_bucket(f) for f in features}
+
+def _keyword_features(keyword):
+    words = keyword.split()
+    if len(words) > 1:
+        return [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return ["p:" + keyword[:5]] if len(keyword) >= 5 else [keyword]
+
+# --- 3. THE MODEL ---
+class ComplexityRouter:
+    """Online logistic regression over hashed prompt features."""
+
+    def __init__(self, weights=None, bias=PRIOR_BIAS):
+        self.weights = weights if weights is not None else self.keyword_prior()
+        self.bias = bias
+        self.lock = threading.Lock()
+        self.updates = 0
+        self.skipped_scout = 0
+        self.explored = 0
+
+    @staticmethod
+    def keyword_prior():
+        weights = {}
+        for keyword in COMPLEX_KEYWORDS:
+            for feature in _keyword_features(keyword):
+                weights[_bucket(feature)] = PRIOR_KEYWORD_WEIGHT
+        return weights
+
+    def predict(self, prompt, features=None):
+        """Probability that the prompt needs the Expert."""
+        features = features if features is not None else router_features(prompt)
+        z = self.bias + sum(self.weights.get(f, 0.0) for f in features)
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def should_skip_scout(self, prompt, threshold=ROUTER_SKIP_SCOUT_THRESHOLD, explore=ROUTER_EXPLORE):
+        """Returns (skip, probability)."""
+        probability = self.predict(prompt)
+        if probability < threshold:
+            return False, probability
+        if random.random() < explore:
+            self.explored += 1
+            return False, probability
+        self.skipped_scout += 1
+        return True, probability
+
+    def learn(self, prompt, needed_expert, features=None):
+        """One SGD step on a logged outcome."""
+        features = features if features is not None else router_features(prompt)
+        error = (1.0 if needed_expert else 0.0) - self.predict(prompt, features)
+        with self.lock:
+            for f in features:
+                w = self.weights.get(f, 0.0)
+                self.weights[f] = w + LEARNING_RATE * (error - L2 * w)
+            self.bias += LEARNING_RATE * error
+            self.updates += 1
+        return error
+
+    # --- Persistence ---
+    def to_dict(self):
+        with self.lock:
+            return {
+                "hash_bits": HASH_BITS,
+                "bias": self.bias,
+                "weights": {str(k): round(w, 5) for k, w in self.weights.items() if abs(w) > 1e-4},
+            }
+
+    def save(self, path=ROUTER_MODEL_PATH):
+        """Atomic write, so a reader never sees half a model."""
+        tmp_path = f"{path}.tmp"
+        make_parent_dir(path)
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=ROUTER_MODEL_PATH):
+        """The saved model, or the keyword prior if there is none."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        if data.get("hash_bits") != HASH_BITS:
+            print(f"[Router] WARNING: {path} uses different hashing. Using the keyword prior.")
+            return cls()
+        return cls({int(k): w for k, w in data["weights"].items()}, data["bias"])
+
+    def stats(self):
+        return {
+            "updates": self.updates,
+            "skipped_scout": self.skipped_scout,
+            "explored": self.explored,
+            "features": len(self.weights),
+        }
+
+# --- 4. OUTCOME LOG ---
+class OutcomeLog:
+    """Appends cascade outcomes as JSON lines and feeds them to the router."""
+
+    def __init__(self, router, path=ROUTER_LOG_PATH, model_path=ROUTER_MODEL_PATH, save_every=ROUTER_SAVE_EVERY,
+                 max_bytes=ROUTER_LOG_MAX_BYTES):
+        self.router = router
+        self.path = path
+        self.max_bytes = max_bytes
+        self.model_path = model_path
+        self.save_every = save_every
+        self.lock = threading.Lock()
+
+    def record(self, prompt, needed_expert):
+        self.router.learn(prompt, needed_expert)
+        line = json.dumps({"prompt": prompt, "needed_expert": needed_expert, "ts": round(time.time(), 3)})
+        try:
+            with self.lock:
+                if self.path:
+                    make_parent_dir(self.path)
+                    with open(self.path, "a") as f:
+                        f.write(line + "\n")
+                        full = f.tell() >= self.max_bytes
+                    if full:
+                        os.replace(self.path, self.path + ".1")
+                if self.model_path and self.router.updates % self.save_every == 0:
+                    self.router.save(self.model_path)
+        except OSError as e:
+            print(f"[Router] WARNING: Could not log outcome. {e}")
+
+def read_outcomes(path):
+    """(prompt, needed_expert) pairs from the log, the rotated <path>.1 first."""
+    for log_path in (path + ".1", path):
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    yield record["prompt"], bool(record["needed_expert"])
+
+def train(outcomes, epochs=5, seed=0):
+    """Trains a fresh model (starting from the keyword prior) on (prompt, needed_expert) pairs."""
+    router = ComplexityRouter()
+    data = [(router_features(prompt), label) for prompt, label in outcomes]
+    rng = random.Random(seed)
+    for _ in range(epochs):
+        rng.shuffle(data)
+        for features, label in data:
+            router.learn(None, label, features)
+    return router
+
+def accuracy(router, outcomes, threshold=0.5):
+    outcomes = list(outcomes)
+    correct = sum((router.predict(prompt) >= threshold) == label for prompt, label in outcomes)
+    return correct / len(outcomes) if outcomes else 0.0
+
+# --- 5. CLI ---
+if __name__ == "__main__":
+    # python complexity_router.py train [outcomes.jsonl] [epochs]
+    # python complexity_router.py predict "Compare TCP and UDP"
+    command = sys.argv[1] if len(sys.argv) > 1 else "train"
+    if command == "train":
+        log_path = sys.argv[2] if len(sys.argv) > 2 else ROUTER_LOG_PATH
+        epochs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+        outcomes = list(read_outcomes(log_path))
+        if not outcomes:
+            print(f"[Router] No outcomes in {log_path}.")
+            sys.exit(1)
+        held_out = outcomes[::10] # Every 10th outcome is kept for testing
+        training = [o for i, o in enumerate(outcomes) if i % 10]
+        router = train(training, epochs)
+        print(f"[Router] Trained on {len(training)} outcomes. "
+              f"Held-out accuracy {accuracy(router, held_out):.1%} "
+              f"(keyword prior {accuracy(ComplexityRouter(), held_out):.1%}).")
+        router = train(outcomes, epochs)
+        router.save()
+        print(f"[Router] Saved {ROUTER_MODEL_PATH}.")
+    elif command == "predict":
+        router = ComplexityRouter.load()
+        for prompt in sys.argv[2:]:
+            print(f"{router.predict(prompt):.3f}  {prompt}")
+    else:
+        print(f"Unknown command '{command}'. Use 'train' or 'predict'.")
+        sys.exit(1)
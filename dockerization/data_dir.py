@@ -0,0 +1,16 @@
+import os
+
+# --- Where the Brain keeps its files ---
+# The router's outcome log and model, the disk cache and warm-up checkpoints
+# live here, never next to the code: under docker-compose the code directory
+# is the bind-mounted source tree. docker-compose.yml points this at a volume.
+BRAIN_DATA_DIR = os.getenv("BRAIN_DATA_DIR", "data")
+
+def data_path(name):
+    return os.path.join(BRAIN_DATA_DIR, name)
+
+def make_parent_dir(path):
+    """Creates the directory a data file goes in, if it isn't there yet."""
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
@@ -0,0 +1,244 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from data_dir import data_path, make_parent_dir
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process lock, one Brain per cache file
+    fcntl = None
+
+# --- 1. CONFIGURATION ---
+
+# A local, persistent cache tier under Redis (see cache_tiers.TieredCache).
+# If Redis is down, answers are read from and written to this file, so the
+# Brain keeps working offline; it survives restarts, so the Brain boots warm.
+DISK_CACHE_ENABLED = os.getenv("DISK_CACHE", "1") == "1"
+DISK_CACHE_PATH = os.getenv("DISK_CACHE_PATH", data_path("sentinel_cache.log"))
+DISK_CACHE_MAX_BYTES = int(os.getenv("DISK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))   # 256 MB of live answers
+# Rewrite the log once it is this many times bigger than the live data
+COMPACT_RATIO = 2.0
+COMPACT_MIN_BYTES = 1024 * 1024
+
+# --- Log format ---
+# An append-only log of records (Bitcask-style):
+#   crc32 | key length | value length | expires_at (unix time, 0 = never) | key | value
+# The value is the answer_codec record, exactly as stored in Redis. A value
+# length of 0 is a tombstone (delete). The crc lets a torn write at the end
+# of the file (crash mid-append) be detected and cut off on the next open.
+RECORD = struct.Struct(">IIId")
+TOMBSTONE = 0
+
+class DiskCacheLocked(Exception):
+    """Another process already has this cache file open."""
+
+# --- 2. THE LOG ---
+class DiskCache:
+    """
+    Append-only log on disk, memory-mapped for reads, with an in-memory
+    index (key -> offset) rebuilt by scanning the log on open.
+
+    get() returns a memoryview straight into the mapped file: no read()
+    call and no copy until the answer is decoded. Once the live data
+    passes max_bytes the oldest entries are dropped, and the file is
+    compacted in the background when it is mostly garbage.
+    """
+
+    def __init__(self, path=DISK_CACHE_PATH, max_bytes=DISK_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        self.index = {}           # key -> (value offset, value length, expires_at, record size), oldest first
+        self.live_bytes = 0
+        self.map = None
+        self.compacting = False
+        self.counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "compactions": 0}
+
+        make_parent_dir(path)
+        self.lock_file = open(path + ".lock", "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.lock_file.close()
+                raise DiskCacheLocked(f"{path} is in use by another process")
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._load()
+
+    # --- Open / index ---
+    def _remap(self):
+        size = os.fstat(self.fd).st_size
+        # Old maps are left for the garbage collector: readers may still hold views into them
+        self.map = mmap.mmap(self.fd, size, access=mmap.ACCESS_READ) if size else None
+
+    def _load(self):
+        """Rebuilds the index from the log and cuts off a torn last record."""
+        self._remap()
+        self.index.clear()
+        self.live_bytes = 0
+        view = memoryview(self.map) if self.map is not None else memoryview(b"")
+        now = time.time()
+        offset = 0
+        try:
+            while offset + RECORD.size <= len(view):
+                crc, key_len, value_len, expires_at = RECORD.unpack_from(view, offset)
+                body_start = offset + RECORD.size
+                body_end = body_start + key_len + value_len
+                if body_end > len(view) or zlib.crc32(view[body_start:body_end]) != crc:
+                    break
+                key = bytes(view[body_start:body_start + key_len]).decode("utf-8")
+                self._drop(key)
+                if value_len != TOMBSTONE and not (expires_at and expires_at <= now):
+                    self._index(key, body_start + key_len, value_len, expires_at, body_end - offset)
+                offset = body_end
+        finally:
+            view.release()
+        self.end = offset
+        if offset < os.fstat(self.fd).st_size:
+            print(f"[DiskCache] Dropped a torn record at the end of {self.path}.")
+            os.ftruncate(self.fd, offset)
+            self._remap()
+
+    def _index(self, key, value_offset, value_len, expires_at, record_size):
+        self.index[key] = (value_offset, value_len, expires_at, record_size)
+        self.live_bytes += record_size
+
+    def _drop(self, key):
+        entry = self.index.pop(key, None)
+        if entry is not None:
+            self.live_bytes -= entry[3]
+
+    # --- Reads ---
+    def get(self, key):
+        """Returns (memoryview of the stored value, seconds left or None), or None."""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            value_offset, value_len, expires_at, _size = entry
+            ttl = None
+            if expires_at:
+                ttl = expires_at - time.time()
+                if ttl <= 0:
+                    self._drop(key)
+                    self.counters["misses"] += 1
+                    return None
+            if self.map is None or value_offset + value_len > len(self.map):
+                self._remap() # The log grew since we last mapped it
+            self.counters["hits"] += 1
+            return memoryview(self.map)[value_offset:value_offset + value_len], ttl
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        with self.lock:
+            return list(self.index)
+
+    # --- Writes ---
+    def _append(self, key, value, expires_at):
+        key_bytes = key.encode("utf-8")
+        body = key_bytes + bytes(value)
+        record = RECORD.pack(zlib.crc32(body), len(key_bytes), len(value), expires_at) + body
+        os.write(self.fd, record) # One write() per record: appends never interleave
+        offset = self.end
+        self.end += len(record)
+        return offset + RECORD.size + len(key_bytes), len(record)
+
+    def set(self, key, value, ttl_seconds=None):
+        """Stores the raw (answer_codec-encoded) value."""
+        if not value:
+            return
+        expires_at = time.time() + ttl_seconds if ttl_seconds else 0.0
+        with self.lock:
+            value_offset, record_size = self._append(key, value, expires_at)
+            self._drop(key)
+            self._index(key, value_offset, len(value), expires_at, record_size)
+            self.counters["writes"] += 1
+            while self.live_bytes > self.max_bytes and len(self.index) > 1:
+                oldest = next(iter(self.index))
+                self._drop(oldest)
+                self._append(oldest, b"", 0.0) # Tombstone, so it stays gone after a restart
+                self.counters["evictions"] += 1
+            self._maybe_compact()
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.index:
+                self._drop(key)
+                self._append(key, b"", 0.0)
+                self._maybe_compact()
+
+    def clear(self):
+        with self.lock:
+            # Swap in an empty file rather than truncating: readers may still
+            # hold views into the old map, and truncating under them crashes.
+            tmp_path = self.path + ".compact"
+            fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+            os.replace(tmp_path, self.path)
+            os.close(self.fd)
+            self.fd = fd
+            self.index.clear()
+            self.live_bytes = 0
+            self.end = 0
+            self._remap()
+
+    # --- Compaction ---
+    def _maybe_compact(self):
+        if (not self.compacting and self.end > COMPACT_MIN_BYTES
+                and self.end > COMPACT_RATIO * max(self.live_bytes, 1)):
+            self.compacting = True
+            threading.Thread(target=self.compact, name="disk-cache-compact", daemon=True).start()
+
+    def compact(self):
+        """
+        Rewrites only the live records to a new file and swaps it in. Blocks
+        other readers and writers while it runs (a few hundred ms for a full
+        256 MB cache).
+        """
+        with self.lock:
+            try:
+                tmp_path = self.path + ".compact"
+                fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+                try:
+                    if self.map is None or len(self.map) < self.end:
+                        self._remap()
+                    view = memoryview(self.map) if self.map is not None else memoryview(b"")
+                    new_index = {}
+                    offset = 0
+                    for key, (value_offset, value_len, expires_at, record_size) in self.index.items():
+                        record_start = value_offset + value_len - record_size
+                        os.write(fd, view[record_start:record_start + record_size]) # Straight from the map
+                        new_index[key] = (offset + record_size - value_len, value_len, expires_at, record_size)
+                        offset += record_size
+                    view.release()
+                    os.fsync(fd)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                os.replace(tmp_path, self.path)
+                os.close(self.fd)
+                self.fd = fd
+                self.index = new_index
+                self.end = offset
+                self._remap()
+                self.counters["compactions"] += 1
+            finally:
+                self.compacting = False
+
+    def close(self):
+        with self.lock:
+            os.fsync(self.fd)
+            os.close(self.fd)
+            self.lock_file.close()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats.update({"entries": len(self.index), "live_bytes": self.live_bytes,
+                          "file_bytes": self.end, "max_bytes": self.max_bytes})
+            return stats
@@ -0,0 +1,202 @@
+import math
+import os
+import threading
+from collections import Counter, namedtuple
+from semantic_cache import cosine_similarity, normalize_prompt, prompt_tokens
+
+# --- 1. CONFIGURATION ---
+
+# Decides whether the Scout's answer is good enough to serve or the prompt
+# goes on to the 40-60s Expert. A scorer turns what we know about the answer
+# (its length, Ollama's token log-probabilities, how complex the prompt
+# looks, whether a second Scout sample agrees) into a confidence in [0, 1];
+# answers below the threshold are escalated.
+#   confidence -> the scorer below (default)
+#   length     -> the old fixed rule: shorter than 150 characters
+EARLY_EXIT_SCORER = os.getenv("EARLY_EXIT_SCORER", "confidence")
+
+# The threshold tunes itself so that about this share of Scout answers is
+# escalated, keeping the Expert's load in check as the traffic mix changes.
+# Between the two bounds only: a very confident answer always exits early,
+# a very unsure one is always escalated. 0 keeps the threshold fixed.
+EARLY_EXIT_TARGET_ESCALATION = float(os.getenv("EARLY_EXIT_TARGET_ESCALATION", "0.25"))
+EARLY_EXIT_THRESHOLD = float(os.getenv("EARLY_EXIT_THRESHOLD", "0.5"))         # Starting point
+EARLY_EXIT_MIN_THRESHOLD = float(os.getenv("EARLY_EXIT_MIN_THRESHOLD", "0.25"))
+EARLY_EXIT_MAX_THRESHOLD = float(os.getenv("EARLY_EXIT_MAX_THRESHOLD", "0.75"))
+EARLY_EXIT_ADAPT_RATE = float(os.getenv("EARLY_EXIT_ADAPT_RATE", "0.005"))     # Threshold step per decision
+
+# Answers scored within this distance of the threshold get a second Scout
+# sample (a few seconds, not the Expert's minute); agreement between the two
+# is evidence the answer is right. 0 turns the check off.
+EARLY_EXIT_CONSISTENCY_BAND = float(os.getenv("EARLY_EXIT_CONSISTENCY_BAND", "0.1"))
+# Ask Ollama for per-token log-probabilities on Scout calls (Ollama 0.12.11+;
+# older versions ignore the field, and the score does without it)
+EARLY_EXIT_LOGPROBS = os.getenv("EARLY_EXIT_LOGPROBS", "1") == "1"
+
+# --- Confidence weights (a logistic score; 0 = a coin flip) ---
+LENGTH_PIVOT = 150          # Characters; the old rule's cut-off, now a slope
+LENGTH_PIVOT_TOKENS = 38    # The same in tokens, when Ollama reports eval_count
+LENGTH_WEIGHT = 1.0         # Per doubling of the length past the pivot
+LOGPROB_PIVOT = -0.7        # Mean token log-probability that says nothing either way
+LOGPROB_WEIGHT = 3.0
+COMPLEX_PIVOT = 0.3         # Router probability that the prompt needs the Expert
+COMPLEX_WEIGHT = 6.0
+CONSISTENCY_PIVOT = 0.5     # Cosine similarity of two Scout samples
+CONSISTENCY_WEIGHT = 4.0
+HEDGE_WEIGHT = 1.5
+CONFIDENCE_BIAS = 0.0
+HEDGES = ("i'm not sure", "i am not sure", "i don't know", "i do not know", "as an ai",
+          "i cannot", "i can't", "not able to", "unclear")
+
+# The fields of an Ollama /api/generate result that answer_signals reads
+DETAIL_FIELDS = ("eval_count", "done_reason", "logprobs")
+
+# needs_expert: the same call made without the router's p_complex. It is the
+# label the router learns from; learning from `escalate` would teach the
+# router its own predictions.
+ExitDecision = namedtuple("ExitDecision", ["escalate", "score", "threshold", "reason", "needs_expert"])
+
+# --- 2. SIGNALS ---
+def answer_signals(answer, details=None, p_complex=None):
+    """
+    What the scorers get: the answer, plus Ollama's fields from the call
+    (eval_count, done_reason, logprobs; see call_ai_model) and the router's
+    probability that the prompt needs the Expert, when known.
+    """
+    details = details or {}
+    logprobs = [entry["logprob"] for entry in details.get("logprobs") or () if "logprob" in entry]
+    return {
+        "answer": answer,
+        "chars": len(answer),
+        "tokens": details.get("eval_count"),
+        "truncated": details.get("done_reason") == "length",
+        "mean_logprob": sum(logprobs) / len(logprobs) if logprobs else None,
+        "p_complex": p_complex,
+        "consistency": None,
+    }
+
+def hard_rule(signals):
+    """Answers that are escalated whatever they score: the reason, or None."""
+    if "Error" in signals["answer"]:
+        return "error"
+    if not signals["answer"].strip():
+        return "empty"
+    if signals["truncated"]:
+        return "truncated" # Hit num_predict mid-answer
+    return None
+
+def answer_similarity(a, b):
+    return cosine_similarity(prompt_tokens(normalize_prompt(a)), prompt_tokens(normalize_prompt(b)))
+
+# --- 3. SCORERS ---
+class ConfidenceScorer:
+    """
+    Hand-set logistic score over the answer's signals. Missing signals (no
+    logprobs from an older Ollama or a batched call, no second sample)
+    just drop out of the sum.
+    """
+    adaptive = True
+
+    def score(self, signals):
+        z = CONFIDENCE_BIAS
+        if signals["tokens"]:
+            length = signals["tokens"] / LENGTH_PIVOT_TOKENS
+        else:
+            length = max(signals["chars"], 1) / LENGTH_PIVOT
+        z -= LENGTH_WEIGHT * max(-1.0, min(3.0, math.log2(length)))
+        if signals["mean_logprob"] is not None:
+            z += LOGPROB_WEIGHT * max(-2.0, min(1.0, signals["mean_logprob"] - LOGPROB_PIVOT))
+        if signals["p_complex"] is not None:
+            z -= COMPLEX_WEIGHT * (signals["p_complex"] - COMPLEX_PIVOT)
+        if signals["consistency"] is not None:
+            z += CONSISTENCY_WEIGHT * (signals["consistency"] - CONSISTENCY_PIVOT)
+        if any(hedge in signals["answer"].casefold() for hedge in HEDGES):
+            z -= HEDGE_WEIGHT
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+class LengthRule:
+    """The original heuristic: a short answer is a simple, valid one."""
+    adaptive = False
+
+    def score(self, signals):
+        return 1.0 if signals["chars"] < LENGTH_PIVOT else 0.0
+
+SCORERS = {"confidence": ConfidenceScorer, "length": LengthRule}
+
+# --- 4. THE POLICY ---
+class EarlyExitPolicy:
+    """
+    Scores Scout answers and moves the threshold after every scored
+    decision: down a little when one is escalated, up a little when one
+    exits, in proportion to the target. It settles where the target share of
+    scored answers falls below it (a running quantile), within the bounds.
+    Hard-rule escalations (errors, empty or truncated answers) don't move
+    it, or a burst of Brawn errors would let weak answers exit afterwards.
+    """
+
+    def __init__(self, scorer=None, threshold=EARLY_EXIT_THRESHOLD, target=EARLY_EXIT_TARGET_ESCALATION,
+                 adapt_rate=EARLY_EXIT_ADAPT_RATE, bounds=(EARLY_EXIT_MIN_THRESHOLD, EARLY_EXIT_MAX_THRESHOLD),
+                 consistency_band=EARLY_EXIT_CONSISTENCY_BAND):
+        self.scorer = scorer if scorer is not None else SCORERS[EARLY_EXIT_SCORER]()
+        self.threshold = threshold
+        self.target = target
+        self.adapt_rate = adapt_rate if self.scorer.adaptive and target > 0 else 0.0
+        self.bounds = bounds
+        self.consistency_band = consistency_band
+        self.lock = threading.Lock()
+        self.reasons = Counter()
+        self.decisions = 0
+        self.escalations = 0
+        self.recent_escalation = target # EWMA over roughly the last 100 decisions
+
+    def decide(self, answer, details=None, p_complex=None, second_opinion=None):
+        """
+        Returns an ExitDecision. second_opinion, if given, is called (no
+        arguments) for another Scout answer to the same prompt when the
+        score is too close to the threshold to call.
+        """
+        signals = answer_signals(answer, details, p_complex)
+        threshold = self.threshold
+        reason = hard_rule(signals)
+        scored = reason is None
+        if not scored:
+            score, escalate, needs_expert = 0.0, True, True
+        else:
+            score = self.scorer.score(signals)
+            checked = False
+            if second_opinion is not None and abs(score - threshold) < self.consistency_band:
+                other = second_opinion()
+                if "Error" not in other:
+                    signals["consistency"] = answer_similarity(answer, other)
+                    score = self.scorer.score(signals)
+                    checked = True
+            escalate = score < threshold
+            reason = ("unsure" if escalate else "confident") + ("_checked" if checked else "")
+            needs_expert = escalate
+            if p_complex is not None:
+                needs_expert = self.scorer.score(dict(signals, p_complex=None)) < threshold
+        self.record(escalate, reason, scored)
+        return ExitDecision(escalate, score, threshold, reason, needs_expert)
+
+    def record(self, escalate, reason, scored=True):
+        with self.lock:
+            self.decisions += 1
+            self.escalations += escalate
+            self.reasons[reason] += 1
+            self.recent_escalation += 0.01 * (escalate - self.recent_escalation)
+            if self.adapt_rate and scored:
+                low, high = self.bounds
+                step = self.adapt_rate * (self.target - (1.0 if escalate else 0.0))
+                self.threshold = max(low, min(high, self.threshold + step))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "scorer": type(self.scorer).__name__,
+                "threshold": round(self.threshold, 3),
+                "target_escalation": self.target,
+                "recent_escalation": round(self.recent_escalation, 3),
+                "decisions": self.decisions,
+                "escalations": self.escalations,
+                "reasons": dict(self.reasons),
+            }
@@ -0,0 +1,277 @@
+import json
+import os
+import socket
+import time
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- 1. CONFIGURATION ---
+
+# A local stand-in for the Ollama "Brawn" node so the Brain can be run
+# and load-tested without a laptop on the Tailscale tunnel.
+FAKE_HOST = os.getenv("FAKE_OLLAMA_HOST", "127.0.0.1")
+FAKE_PORT = int(os.getenv("FAKE_OLLAMA_PORT", "11434"))
+
+# --- Per-model behaviour: (seconds per request, words per answer) ---
+MODEL_PROFILES = {
+    "tinyllama": (0.05, 12),     # Scout: fast, short answers
+    "llama3:8b": (0.50, 60),     # Expert: slow, long answers
+    "mistral:7b": (0.30, 40),    # Judge
+}
+DEFAULT_PROFILE = (0.10, 20)
+
+# Reading the prompt (prefill) costs this much per token not already in the
+# node's KV cache. A request whose `context` the node returned recently only
+# pays for its new tokens. 0 = free, as in the other benchmarks.
+PREFILL_SECONDS_PER_TOKEN = 0.0
+KV_CACHE_ENTRIES = 16 # Contexts the node still holds (slots x models, roughly)
+
+# A batch of N prompts on /v1/completions takes latency * (1 + BATCH_STEP_COST * (N - 1)):
+# GPUs decode a batch almost as fast as one prompt.
+BATCH_STEP_COST = 0.15
+
+# --- 2. ANSWER GENERATION ---
+def fake_answer(model_name, prompt, words):
+    """Builds a deterministic answer so identical prompts get identical text."""
+    seed = f"{model_name} answer to {prompt}".split()
+    body = [seed[i % len(seed)] for i in range(words)]
+    return " ".join(body) + "."
+
+def fake_tokens(text):
+    """One deterministic token id per word."""
+    return [zlib.crc32(word.encode()) & 0x7FFFFFFF for word in text.split()]
+
+def fake_logprobs(tokens):
+    """Ollama's per-token logprobs (when a request asks for them): deterministic, between -0.05 and -1.05."""
+    return [{"token": token, "logprob": -0.05 - (zlib.crc32(token.encode()) % 100) / 100} for token in tokens]
+
+def _tagged(model_name):
+    """Ollama lists 'tinyllama' as 'tinyllama:latest'."""
+    return model_name if ":" in model_name else model_name + ":latest"
+
+# --- 3. HTTP HANDLER ---
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # Like Ollama (Go sets TCP_NODELAY)
+    profiles = MODEL_PROFILES
+    prefill_per_token = PREFILL_SECONDS_PER_TOKEN
+
+    def setup(self):
+        super().setup()
+        # Count TCP connections so benchmarks can see keep-alive reuse
+        self.server.connections_opened = getattr(self.server, "connections_opened", 0) + 1
+        self.server.open_connections = getattr(self.server, "open_connections", set()) | {self.connection}
+
+    def finish(self):
+        self.server.open_connections.discard(self.connection)
+        super().finish()
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output clean
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # Health probes from brawn_pool: installed models, and which are in memory
+        if self.path == "/api/tags":
+            names = sorted(self.profiles)
+        elif self.path == "/api/ps":
+            names = sorted(getattr(self.server, "loaded_models", ()))
+        else:
+            self._send_json(404, {"error": "not found"})
+            return
+        self._send_json(200, {"models": [{"name": _tagged(name), "model": _tagged(name)} for name in names]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        if self.path == "/v1/completions":
+            self._send_batch(request)
+            return
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        model_name = request.get("model", "")
+        latency, words = self.profiles.get(model_name, DEFAULT_PROFILE)
+        self.server.loaded_models = getattr(self.server, "loaded_models", set()) | {model_name}
+        answer = fake_answer(model_name, request.get("prompt", ""), words)
+        context = request.get("context") or []
+        prompt_tokens = fake_tokens(request.get("prompt", ""))
+        done = {"context": context + prompt_tokens + fake_tokens(answer),
+                "prompt_eval_count": self._prefill_tokens(model_name, context, prompt_tokens),
+                "done_reason": "stop"}
+        if request.get("stream", True):
+            with self._model_slot(model_name):
+                time.sleep(done["prompt_eval_count"] * self.prefill_per_token)
+                self._send_stream(model_name, answer, latency, done, logprobs=request.get("logprobs"))
+            self._keep_context(model_name, done["context"])
+            return
+
+        with self._model_slot(model_name):
+            time.sleep(done["prompt_eval_count"] * self.prefill_per_token + latency)
+        self._keep_context(model_name, done["context"])
+        if request.get("logprobs"):
+            done["logprobs"] = fake_logprobs(answer.split(" "))
+        self._send_json(200, {
+            "model": model_name,
+            "response": answer,
+            "done": True,
+            "eval_count": words,
+            **done,
+        })
+
+    # --- KV cache: which contexts the node could continue without re-reading ---
+    def _prefill_tokens(self, model_name, context, prompt_tokens):
+        """Tokens to evaluate: the new prompt, plus the context unless the node still holds it."""
+        if not context:
+            return len(prompt_tokens)
+        with self.server.usage_lock:
+            cache = self.server.kv_cache
+            key = (model_name, zlib.crc32(json.dumps(context).encode()))
+            if key in cache:
+                cache.move_to_end(key)
+                return len(prompt_tokens)
+        return len(context) + len(prompt_tokens)
+
+    def _keep_context(self, model_name, context):
+        with self.server.usage_lock:
+            cache = self.server.kv_cache
+            cache[(model_name, zlib.crc32(json.dumps(context).encode()))] = True
+            while len(cache) > KV_CACHE_ENTRIES:
+                cache.popitem(last=False)
+
+    @contextmanager
+    def _model_slot(self, model_name):
+        """
+        Like OLLAMA_NUM_PARALLEL: at most server.parallel generations at once.
+        Time spent generating is added to the node's usage (see brawn_usage).
+        """
+        slots = getattr(self.server, "slots", None)
+        with slots if slots is not None else nullcontext():
+            start_time = time.monotonic()
+            try:
+                yield
+            finally:
+                record_usage(self.server, model_name, time.monotonic() - start_time)
+
+    def _send_batch(self, request):
+        """
+        OpenAI-style completions with a list of prompts, as served by
+        batching backends (vLLM, llama.cpp server). Ollama itself has no
+        batch endpoint.
+        """
+        model_name = request.get("model", "")
+        prompts = request.get("prompt", "")
+        prompts = prompts if isinstance(prompts, list) else [prompts]
+        latency, words = self.profiles.get(model_name, DEFAULT_PROFILE)
+        with self._model_slot(model_name):
+            time.sleep(latency * (1 + BATCH_STEP_COST * (len(prompts) - 1)))
+        self._send_json(200, {
+            "object": "text_completion",
+            "model": model_name,
+            "choices": [
+                {"index": i, "text": fake_answer(model_name, prompt, words), "finish_reason": "stop"}
+                for i, prompt in enumerate(prompts)
+            ],
+        })
+
+    def _write_chunk(self, payload):
+        line = (json.dumps(payload) + "\n").encode()
+        self.wfile.write(f"{len(line):X}\r\n".encode() + line + b"\r\n")
+
+    def _send_stream(self, model_name, answer, latency, done=None, logprobs=False):
+        """Mimics Ollama's NDJSON stream: one chunk per token, then a 'done' chunk (plus the done fields)."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        tokens = [word + " " for word in answer.split(" ")]
+        tokens[-1] = tokens[-1].rstrip()
+        delay = latency / len(tokens)
+        try:
+            for token in tokens:
+                time.sleep(delay)
+                chunk = {"model": model_name, "response": token, "done": False}
+                if logprobs:
+                    chunk["logprobs"] = fake_logprobs([token])
+                self._write_chunk(chunk)
+            self._write_chunk({"model": model_name, "response": "", "done": True, "eval_count": len(tokens), **(done or {})})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client hung up (e.g. a cancelled speculative Expert): stop
+            # generating, like Ollama does.
+            self.close_connection = True
+
+# --- 4. USAGE ---
+def reset_usage(server):
+    server.usage_lock = threading.Lock()
+    server.kv_cache = OrderedDict()   # (model, context hash) -> True, oldest first
+    server.busy_seconds = Counter()   # model -> seconds spent generating
+    server.generations = Counter()    # model -> requests served
+
+def record_usage(server, model_name, seconds):
+    if not hasattr(server, "usage_lock"):
+        reset_usage(server)
+    with server.usage_lock:
+        server.busy_seconds[model_name] += seconds
+        server.generations[model_name] += 1
+
+def brawn_usage(server):
+    """{model: (requests, seconds generating)} since start or the last reset_usage()."""
+    with server.usage_lock:
+        return {model: (server.generations[model], server.busy_seconds[model]) for model in server.generations}
+
+# --- 5. SERVER CONTROL ---
+def start_fake_ollama(host=FAKE_HOST, port=FAKE_PORT, profiles=None, parallel=None,
+                      prefill_per_token=PREFILL_SECONDS_PER_TOKEN):
+    """
+    Starts the fake Brawn node on a background thread and returns the server.
+    Pass port=0 to let the OS pick a free port (see server.server_address).
+    parallel caps concurrent generations (default: unlimited).
+    """
+    handler = type("Handler", (FakeOllamaHandler,), {"profiles": profiles or MODEL_PROFILES,
+                                                     "prefill_per_token": prefill_per_token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.slots = threading.BoundedSemaphore(parallel) if parallel else None
+    reset_usage(server)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def stop_fake_ollama(server):
+    """Simulates the node going down: stops listening and drops open connections."""
+    server.shutdown()
+    server.server_close()
+    for connection in list(getattr(server, "open_connections", ())):
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+if __name__ == "__main__":
+    print(f"[Fake Brawn] Serving fake Ollama on http://{FAKE_HOST}:{FAKE_PORT}")
+    for model, (latency, words) in MODEL_PROFILES.items():
+        print(f"  > {model}: {latency:.2f}s, {words} words")
+    server = ThreadingHTTPServer((FAKE_HOST, FAKE_PORT), FakeOllamaHandler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[Fake Brawn] Shutting down...")
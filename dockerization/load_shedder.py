@@ -0,0 +1,150 @@
+import math
+import os
+import time
+from collections import Counter, namedtuple
+
+# --- 1. CONFIGURATION ---
+
+# The hardware watchdog samples the Brain VM's RAM and CPU and moves between
+# three load levels. Each level enters as soon as its threshold is crossed,
+# but only steps back down after usage has stayed under the (lower) exit
+# threshold for SHED_COOLDOWN seconds, so the Brain doesn't flap around a limit.
+#   NORMAL   -> everything on
+#   ELEVATED -> half the server's in-flight slots, Scout answers are not
+#               escalated to the Expert (and are cached only briefly)
+#   CRITICAL -> a quarter of the slots; cache misses get 503 + Retry-After
+NORMAL, ELEVATED, CRITICAL = 0, 1, 2
+LEVEL_NAMES = {NORMAL: "normal", ELEVATED: "elevated", CRITICAL: "critical"}
+
+MAX_RAM_PERCENT = float(os.getenv("MAX_RAM_PERCENT", "85"))        # Enter ELEVATED
+SHED_RAM_EXIT = float(os.getenv("SHED_RAM_EXIT", "75"))            # ...and leave it below this
+SHED_RAM_CRITICAL = float(os.getenv("SHED_RAM_CRITICAL", "95"))
+SHED_RAM_CRITICAL_EXIT = float(os.getenv("SHED_RAM_CRITICAL_EXIT", "90"))
+MAX_CPU_PERCENT = float(os.getenv("MAX_CPU_PERCENT", "90"))
+SHED_CPU_EXIT = float(os.getenv("SHED_CPU_EXIT", "70"))
+SHED_COOLDOWN = float(os.getenv("SHED_COOLDOWN", "15"))
+WATCHDOG_POLL_RATE = float(os.getenv("WATCHDOG_POLL_RATE", "2"))
+CPU_SMOOTHING = 0.5 # EWMA weight of the newest CPU sample; one busy second is not pressure
+
+# Share of the server's max in-flight requests admitted at each level
+INFLIGHT_FACTOR = {NORMAL: 1.0, ELEVATED: 0.5, CRITICAL: 0.25}
+# Scout-only answers given under pressure are cached this long instead of an hour
+SHED_ANSWER_TTL = int(os.getenv("SHED_ANSWER_TTL", "300"))
+
+# One immutable snapshot, replaced whole by the watchdog thread. Readers
+# just load the attribute: no lock on the request path.
+ResourceState = namedtuple("ResourceState", ["level", "ram_percent", "cpu_percent", "since"])
+
+class BrainOverloaded(Exception):
+    """The Brain VM itself is short of RAM/CPU; new generations are refused for now."""
+
+    def __init__(self, state, retry_after):
+        super().__init__(f"brain under {LEVEL_NAMES[state.level]} load "
+                         f"(RAM {state.ram_percent:.0f}%, CPU {state.cpu_percent:.0f}%)")
+        self.retry_after = retry_after
+
+def sample_resources():
+    """(RAM %, CPU % since the previous call) of this machine."""
+    import psutil # Only the watchdog thread needs it; kept off the startup path
+    return psutil.virtual_memory().percent, psutil.cpu_percent(interval=None)
+
+# --- 2. THE SHEDDER ---
+class LoadShedder:
+    """Turns RAM/CPU samples into a load level, with hysteresis."""
+
+    def __init__(self, sample=sample_resources, cooldown=SHED_COOLDOWN):
+        self.sample = sample
+        self.cooldown = cooldown
+        self.state = ResourceState(NORMAL, 0.0, 0.0, time.monotonic())
+        self.cpu = None
+        self.calm_since = None
+        self.transitions = 0
+        self.shed = Counter()
+
+    def _target(self, ram, cpu):
+        """The level these readings call for, on the way up."""
+        if ram >= SHED_RAM_CRITICAL:
+            return CRITICAL
+        if ram >= MAX_RAM_PERCENT or cpu >= MAX_CPU_PERCENT:
+            return ELEVATED
+        return NORMAL
+
+    def _calm(self, level, ram, cpu):
+        """Whether these readings are far enough under the current level to leave it."""
+        if level == CRITICAL:
+            return ram < SHED_RAM_CRITICAL_EXIT
+        return ram < SHED_RAM_EXIT and cpu < SHED_CPU_EXIT
+
+    def update(self, ram, cpu, now=None):
+        """Feeds one sample. Returns the new state."""
+        now = time.monotonic() if now is None else now
+        self.cpu = cpu if self.cpu is None else self.cpu + CPU_SMOOTHING * (cpu - self.cpu)
+        level = self.state.level
+        target = self._target(ram, self.cpu)
+
+        if target > level:
+            new_level = target
+            self.calm_since = None
+        elif level > NORMAL and self._calm(level, ram, self.cpu):
+            self.calm_since = now if self.calm_since is None else self.calm_since
+            # One level at a time, each after a full cooldown
+            new_level = level - 1 if now - self.calm_since >= self.cooldown else level
+            if new_level != level:
+                self.calm_since = None
+        else:
+            new_level = level
+            self.calm_since = None
+
+        since = self.state.since
+        if new_level != level:
+            since = now
+            self.transitions += 1
+            print(f"[Watchdog] Load {LEVEL_NAMES[level]} -> {LEVEL_NAMES[new_level]} "
+                  f"(RAM {ram:.0f}%, CPU {self.cpu:.0f}%).")
+        self.state = ResourceState(new_level, ram, self.cpu, since)
+        return self.state
+
+    def watch(self, poll_rate=WATCHDOG_POLL_RATE, stop=None):
+        """The watchdog loop: samples every poll_rate seconds until stop (an Event) is set."""
+        print(f"[Watchdog] MONITORING VM RAM: < {MAX_RAM_PERCENT}%, CPU: < {MAX_CPU_PERCENT}%")
+        # First sample one poll_rate in: the process is still starting up (and
+        # importing psutil then would slow that down), and a first CPU reading is 0.0 anyway
+        while True:
+            if stop is not None:
+                if stop.wait(poll_rate):
+                    return
+            else:
+                time.sleep(poll_rate)
+            try:
+                self.update(*self.sample())
+            except Exception as e:
+                print(f"[Watchdog] WARNING: Could not sample resources. {e}")
+
+    # --- What the Brain asks ---
+    def inflight_limit(self, max_inflight):
+        return max(1, math.floor(max_inflight * INFLIGHT_FACTOR[self.state.level]))
+
+    def prefer_scout(self):
+        """Under pressure, keep the Scout's answer rather than escalating."""
+        if self.state.level >= ELEVATED:
+            self.shed["scout_only"] += 1
+            return True
+        return False
+
+    def check_admission(self):
+        """Raises BrainOverloaded when new generations must be refused."""
+        state = self.state
+        if state.level >= CRITICAL:
+            self.shed["rejected"] += 1
+            raise BrainOverloaded(state, retry_after=max(1, math.ceil(self.cooldown)))
+
+    def stats(self):
+        state = self.state
+        return {
+            "level": LEVEL_NAMES[state.level],
+            "ram_percent": round(state.ram_percent, 1),
+            "cpu_percent": round(state.cpu_percent, 1),
+            "level_for_s": round(time.monotonic() - state.since, 1),
+            "transitions": self.transitions,
+            "shed": dict(self.shed),
+        }
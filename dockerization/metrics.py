@@ -0,0 +1,217 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# --- 1. CONFIGURATION ---
+
+# Counters and latency histograms for every stage of a request, served as
+# Prometheus text on the server's GET /metrics. Recording is a dict lookup
+# and a bisect under a per-metric lock; nothing is computed until a scrape.
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+# Per-request trace spans, logged as one "[Trace] {...}" JSON line per request
+BRAIN_TRACE = os.getenv("BRAIN_TRACE", "0") == "1"
+
+# Seconds. From a Redis round trip up to a slow llama3 answer.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0, 300.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+# --- 2. METRIC TYPES ---
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1.0):
+        if METRICS_ENABLED:
+            with self.lock:
+                self.values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}   # label values -> [per-bucket counts (+Inf last), sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in sorted(self.series.items())]
+        for label_values, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+class Callback:
+    """A gauge (or counter kept elsewhere) read at scrape time: fn() -> number or {label values: number}."""
+
+    def __init__(self, name, help_text, fn, labels=(), kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return [] # A broken source must not break the whole scrape
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+# --- 3. REGISTRY ---
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        """Returns the metric already registered under that name, if any (modules may be loaded twice)."""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def replace(self, metric):
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def counter(name, help_text, labels=()):
+    return REGISTRY.register(Counter(name, help_text, labels))
+
+def histogram(name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labels, buckets))
+
+def callback(name, help_text, fn, labels=(), kind="gauge"):
+    # Replaced, not kept: the callback closes over the latest objects
+    return REGISTRY.replace(Callback(name, help_text, fn, labels, kind))
+
+# --- 4. TRACE SPANS ---
+_current_trace = contextvars.ContextVar("sentinel_trace", default=None)
+
+class Trace:
+    """The spans of one request: (name, start offset, duration, attributes)."""
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, name, start, duration, attrs):
+        with self.lock:
+            self.spans.append((name, start - self.start, duration, attrs))
+
+    def to_dict(self):
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span[1])
+        return {
+            "trace": self.name,
+            **self.attrs,
+            "total_ms": round(1000 * (time.perf_counter() - self.start), 2),
+            "spans": [dict(name=name, start_ms=round(1000 * offset, 2), ms=round(1000 * duration, 2), **attrs)
+                      for name, offset, duration, attrs in spans],
+        }
+
+@contextmanager
+def trace_request(name, **attrs):
+    """Collects the spans recorded while the block runs (if BRAIN_TRACE is on) and logs them."""
+    if not BRAIN_TRACE:
+        yield None
+        return
+    trace = Trace(name, **attrs)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        print(f"[Trace] {json.dumps(trace.to_dict())}")
+
+def record(histogram_metric, duration, *label_values, span=None, start=None, **attrs):
+    """
+    Records a stage that just took duration seconds (starting at the
+    perf_counter() value start, if known): into histogram_metric, and into
+    the current request's trace as a span named span (default: the first
+    label value).
+    """
+    histogram_metric.observe(duration, *label_values)
+    trace = _current_trace.get()
+    if trace is not None:
+        name = span or (label_values[0] if label_values else histogram_metric.name)
+        trace.add(name, time.perf_counter() - duration if start is None else start, duration, attrs)
+
+@contextmanager
+def stage(histogram_metric, *label_values, span=None, **attrs):
+    """record() for the time a block takes (also when it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(histogram_metric, time.perf_counter() - start, *label_values, span=span, start=start, **attrs)
+
+def in_context(fn):
+    """Wraps fn to run in the caller's context, so work handed to a thread pool lands in the same trace."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
@@ -0,0 +1,92 @@
+import os
+import queue
+import threading
+import time
+import concurrent.futures
+
+# --- 1. CONFIGURATION ---
+
+# Under load, Scout (tinyllama) calls are so short that per-request overhead
+# dominates. The batcher holds Scout prompts for a few milliseconds and sends
+# them to the Brawn node together. Only non-streaming calls are batched.
+# The Brain only batches with SCOUT_BATCH_API=openai (see below).
+SCOUT_BATCHING = os.getenv("SCOUT_BATCHING", "0") == "1"
+SCOUT_BATCH_WINDOW_MS = float(os.getenv("SCOUT_BATCH_WINDOW_MS", "5"))
+SCOUT_BATCH_MAX_SIZE = int(os.getenv("SCOUT_BATCH_MAX_SIZE", "8"))
+# "openai": one /v1/completions call with a list of prompts, for backends
+# that batch on the GPU (vLLM, llama.cpp server). "ollama" (the default) has
+# no batch endpoint: a batch would only be concurrent /api/generate calls
+# under one scheduler slot, with no throughput gain (bench_scout_batching),
+# so the Brain doesn't batch at all then.
+SCOUT_BATCH_API = os.getenv("SCOUT_BATCH_API", "ollama")
+
+# --- 2. THE BATCHER ---
+class MicroBatcher:
+    """
+    Collects submitted items for up to window_ms (or until max_size are
+    waiting), hands them to send_batch(items) in one go and fans the
+    results back out to the callers. send_batch returns one result per
+    item, in order; an Exception in the list is raised to that caller only.
+    """
+
+    def __init__(self, send_batch, window_ms=SCOUT_BATCH_WINDOW_MS, max_size=SCOUT_BATCH_MAX_SIZE,
+                 max_inflight_batches=8):
+        self.send_batch = send_batch
+        self.window = window_ms / 1000.0
+        self.max_size = max_size
+        self.pending = queue.Queue()
+        self.senders = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_inflight_batches, thread_name_prefix="scout-batch")
+        self.collector = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """Blocks until the item's batch comes back; returns its result."""
+        if self.collector is None:
+            with self.lock:
+                if self.collector is None:
+                    self.collector = threading.Thread(target=self._collect, name="scout-batcher", daemon=True)
+                    self.collector.start()
+        future = concurrent.futures.Future()
+        self.pending.put((item, future))
+        return future.result()
+
+    def _collect(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            with self.lock:
+                self.batches += 1
+                self.items += len(batch)
+            self.senders.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            results = self.send_batch([item for item, _future in batch])
+        except Exception as e:
+            for _item, future in batch:
+                future.set_exception(e)
+            return
+        for (_item, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "window_ms": self.window * 1000.0,
+                "max_size": self.max_size,
+            }
@@ -0,0 +1,188 @@
+import os
+import random
+import re
+import threading
+import zlib
+from collections import Counter
+
+# --- 1. CONFIGURATION ---
+
+# Near-duplicate prompts ("What is 2+2?" vs "what is 2 + 2") reuse the same
+# cached answer instead of paying for a fresh Scout/Expert run.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") == "1"
+SEMANTIC_THRESHOLD = float(os.getenv("SEMANTIC_THRESHOLD", "0.9"))   # Cosine similarity
+SEMANTIC_MAX_ENTRIES = int(os.getenv("SEMANTIC_MAX_ENTRIES", "200000"))
+
+CACHE_KEY_PREFIX = "prompt:"
+
+# --- MinHash LSH: 4 bands of 4 rows. Pairs above ~0.8 Jaccard almost always
+# share a band; unrelated prompts almost never do, so a lookup only checks a
+# handful of candidates even with a million entries in the index.
+NUM_BANDS = 4
+ROWS_PER_BAND = 4
+# Short prompts made of very common words pile up in the same buckets. A full
+# bucket takes no new entries (they stay reachable through their other bands),
+# which bounds the work per lookup.
+MAX_BUCKET_SIZE = 32
+_PRIME = (1 << 31) - 1 # Keeps the hash arithmetic in small, fast ints
+_rng = random.Random(1337) # Fixed seed: same signatures in every process
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+    for _ in range(NUM_BANDS * ROWS_PER_BAND)
+]
+
+# Symbols that change the meaning of a prompt ("2+2" vs "2-2") are kept.
+KEEP_SYMBOLS = set("+-*/=<>%^")
+# The only words two prompts may differ in and still share an answer: filler
+# that never changes the question. Negations, numbers, tense ("was"/"will")
+# and prepositions ("to"/"from") are left out on purpose.
+FILLER_WORDS = frozenset(
+    "a an the please kindly can could would you your me i my tell give show "
+    "is are am be do does some just".split()
+)
+_WHITESPACE = re.compile(r"\s+")
+# nltk's WordPunctTokenizer pattern. Importing nltk itself costs ~200 ms of startup.
+_WORD_PUNCT = re.compile(r"\w+|[^\w\s]+")
+
+# --- 2. NORMALIZATION ---
+def wordpunct_tokenize(text):
+    """Runs of word characters and runs of punctuation, like nltk.wordpunct_tokenize."""
+    return _WORD_PUNCT.findall(text)
+
+def normalize_prompt(prompt):
+    """Lower-cases, collapses whitespace and drops trailing punctuation."""
+    return _WHITESPACE.sub(" ", prompt.casefold()).strip().rstrip("?.! ")
+
+def make_cache_key(prompt):
+    return CACHE_KEY_PREFIX + normalize_prompt(prompt)
+
+def prompt_tokens(normalized):
+    # "what's" and "whats" should be the same token
+    text = normalized.replace("'", "").replace("\u2019", "")
+    return [t for t in wordpunct_tokenize(text) if t.isalnum() or t in KEEP_SYMBOLS]
+
+def cosine_similarity(tokens_a, tokens_b):
+    a, b = Counter(tokens_a), Counter(tokens_b)
+    dot = sum(count * b[token] for token, count in a.items())
+    norm_a = sum(c * c for c in a.values()) ** 0.5
+    norm_b = sum(c * c for c in b.values()) ** 0.5
+    return dot / (norm_a * norm_b) if norm_a and norm_b else 0.0
+
+def band_keys(tokens):
+    """MinHash signature of the token set, folded into one int per band."""
+    hashes = [zlib.crc32(t.encode()) & _PRIME for t in set(tokens)]
+    signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+    return [
+        hash((band,) + tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+        for band in range(NUM_BANDS)
+    ]
+
+# --- 3. THE INDEX ---
+class SemanticCache:
+    """
+    In-process nearest-neighbour index over cached prompts.
+
+    It only stores normalized prompt text; the answers stay in Redis under
+    make_cache_key(prompt), so Redis TTLs still decide what is alive.
+    Entries are evicted oldest-first past max_entries.
+    """
+
+    def __init__(self, threshold=SEMANTIC_THRESHOLD, max_entries=SEMANTIC_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}                              # normalized prompt -> None (insertion order)
+        # band key -> normalized prompt, or a tuple of them. Tuples (not lists)
+        # keep a million-entry index out of the garbage collector's way.
+        self.bands = [{} for _ in range(NUM_BANDS)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, prompt):
+        normalized = normalize_prompt(prompt)
+        tokens = prompt_tokens(normalized)
+        if not tokens:
+            return
+        keys = band_keys(tokens)
+        with self.lock:
+            if normalized in self.entries:
+                # Refresh its position in the eviction order
+                del self.entries[normalized]
+                self.entries[normalized] = None
+                return
+            self.entries[normalized] = None
+            for table, key in zip(self.bands, keys):
+                bucket = table.get(key)
+                if bucket is None:
+                    table[key] = normalized
+                elif isinstance(bucket, tuple):
+                    if len(bucket) < MAX_BUCKET_SIZE:
+                        table[key] = bucket + (normalized,)
+                else:
+                    table[key] = (bucket, normalized)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def discard(self, cache_key):
+        """Drops an entry, e.g. because its Redis key expired."""
+        normalized = cache_key[len(CACHE_KEY_PREFIX):] if cache_key.startswith(CACHE_KEY_PREFIX) else cache_key
+        with self.lock:
+            if normalized in self.entries:
+                self._remove(normalized)
+
+    def _remove(self, normalized):
+        del self.entries[normalized]
+        for table, key in zip(self.bands, band_keys(prompt_tokens(normalized))):
+            bucket = table.get(key)
+            if isinstance(bucket, tuple):
+                if normalized in bucket:
+                    rest = tuple(p for p in bucket if p != normalized)
+                    table[key] = rest if len(rest) > 1 else rest[0]
+            elif bucket == normalized:
+                del table[key]
+
+    def lookup(self, prompt):
+        """
+        Returns (cache_key, similarity) of the closest cached prompt at or
+        above the threshold that differs from this one only in filler words
+        (FILLER_WORDS), or None. The other words must match in order and
+        count.
+        """
+        normalized = normalize_prompt(prompt)
+        tokens = prompt_tokens(normalized)
+        if not tokens:
+            return None
+        keys = band_keys(tokens)
+        candidates = set()
+        with self.lock:
+            for table, key in zip(self.bands, keys):
+                bucket = table.get(key)
+                if isinstance(bucket, tuple):
+                    candidates.update(bucket)
+                elif bucket is not None:
+                    candidates.add(bucket)
+
+        # Only filler may differ: "strings" vs "integers", "2+2" vs "2+2+2",
+        # "safe" vs "not safe" or "celsius to fahrenheit" vs "fahrenheit to
+        # celsius" are different questions, however similar.
+        content = [t for t in tokens if t not in FILLER_WORDS]
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            candidate_tokens = prompt_tokens(candidate)
+            if [t for t in candidate_tokens if t not in FILLER_WORDS] != content:
+                continue
+            score = cosine_similarity(tokens, candidate_tokens)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return (CACHE_KEY_PREFIX + best, best_score) if best is not None else None
+
+    def rebuild_from_redis(self, cache_client, batch_size=1000):
+        """Re-indexes every prompt already in Redis (keys hold the normalized prompt)."""
+        count = 0
+        for key in cache_client.scan_iter(match=CACHE_KEY_PREFIX + "*", count=batch_size):
+            if isinstance(key, bytes):
+                key = key.decode("utf-8", errors="replace")
+            self.add(key[len(CACHE_KEY_PREFIX):])
+            count += 1
+        return count
@@ -0,0 +1,141 @@
+import contextvars
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# --- 1. CONFIGURATION ---
+
+# Multi-turn conversations. Resending the whole transcript every turn makes
+# Ollama re-read (prefill) it all, so turn N costs O(N). Instead each session
+# keeps, per model, the `context` token array Ollama returned last time and
+# sends it back with only the new prompt; the node reuses the KV cache it
+# still holds for that prefix. A model whose context is behind (e.g. the
+# Expert was not needed last turn) gets just the turns it missed as text.
+SESSIONS_ENABLED = os.getenv("SESSIONS", "1") == "1"
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))                       # LRU bound
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))   # Dropped after 30 min idle
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "8"))              # Transcript kept for catch-up
+# Past this many tokens a context is dropped and rebuilt from the transcript;
+# Ollama would silently truncate it at the model's num_ctx anyway.
+SESSION_MAX_CONTEXT = int(os.getenv("SESSION_MAX_CONTEXT", "4096"))
+# Asks Ollama to keep the model (and its KV cache) loaded between turns
+SESSION_KEEP_ALIVE = os.getenv("SESSION_KEEP_ALIVE", "30m")
+
+_current_session = contextvars.ContextVar("sentinel_session", default=None)
+
+# --- 2. ONE CONVERSATION ---
+class Session:
+    """
+    The turns of one conversation, plus per model: the context token array
+    from its last call, how many turns that context covers, and the node
+    that holds its KV cache.
+    """
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.turns = deque(maxlen=SESSION_MAX_TURNS)   # (turn number, prompt, answer)
+        self.turn_count = 0
+        self.contexts = {}   # model -> (array of token ids, turns covered, node url)
+        self.pending = {}    # model -> (context, node url) from this turn, kept if its answer wins
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock() # One turn at a time
+
+    def prepare(self, model_name, prompt):
+        """(prompt text, context or None, preferred node) for this model's call."""
+        context, covered, node_url = self.contexts.get(model_name, (None, 0, None))
+        missed = [(prompt_text, answer) for turn, prompt_text, answer in self.turns if turn >= covered]
+        if missed:
+            history = "".join(f"User: {prompt_text}\nAssistant: {answer}\n\n" for prompt_text, answer in missed)
+            prompt = f"Earlier in this conversation:\n{history}User: {prompt}"
+        return prompt, (context.tolist() if context is not None else None), node_url
+
+    def observe(self, model_name, context, node_url):
+        """Called with the context a model returned this turn."""
+        if context:
+            self.pending[model_name] = (array("i", context), node_url)
+
+    def add_turn(self, prompt, answer, answered_by=None):
+        """
+        Records a finished turn. Only the model whose answer the user got
+        keeps its new context; the others would remember their own
+        discarded answer, so they catch up from the transcript instead.
+        """
+        self.turn_count += 1
+        self.turns.append((self.turn_count - 1, prompt, answer))
+        pending = self.pending.pop(answered_by, None)
+        if pending is not None:
+            context, node_url = pending
+            if len(context) <= SESSION_MAX_CONTEXT:
+                self.contexts[answered_by] = (context, self.turn_count, node_url)
+            else:
+                self.contexts.pop(answered_by, None) # Rebuilt from the kept turns next time
+        self.pending.clear()
+        self.last_used = time.monotonic()
+
+    def context_tokens(self):
+        return sum(len(context) for context, _covered, _node in self.contexts.values())
+
+# --- 3. THE STORE ---
+class SessionStore:
+    """Sessions by id: at most max_sessions (least recently used go first), none idle longer than idle_seconds."""
+
+    def __init__(self, max_sessions=SESSION_MAX, idle_seconds=SESSION_IDLE_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = {"lru": 0, "idle": 0}
+
+    def get(self, session_id):
+        """The session, created if it is new (or was evicted)."""
+        now = time.monotonic()
+        with self.lock:
+            self._drop_idle(now)
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = Session(session_id)
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+                    self.evicted["lru"] += 1
+            else:
+                self.sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def _drop_idle(self, now):
+        # Oldest first, so stop at the first session still in use
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if now - session.last_used < self.idle_seconds:
+                return
+            self.sessions.popitem(last=False)
+            self.evicted["idle"] += 1
+
+    def end(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return {
+            "sessions": len(sessions),
+            "context_tokens": sum(session.context_tokens() for session in sessions),
+            "evicted": dict(self.evicted),
+        }
+
+# --- 4. THE CURRENT TURN ---
+@contextmanager
+def active(session):
+    """Makes session the one model calls in this context (and threads started with metrics.in_context) belong to."""
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
+
+def current():
+    return _current_session.get()
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+import uuid
+
+# --- 1. CONFIGURATION ---
+
+# Identical prompts that arrive while the first copy is still generating wait
+# for that one generation instead of each starting their own tinyllama/llama3
+# run. Within a process this is a plain lock; across Brain replicas it is a
+# Redis lease. Matters most right after clear_cache.py empties the cache.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "1") == "1"
+DISTRIBUTED_SINGLE_FLIGHT = os.getenv("DISTRIBUTED_SINGLE_FLIGHT", "1") == "1"
+
+LEASE_PREFIX = "lock:"
+LEASE_SECONDS = float(os.getenv("SINGLE_FLIGHT_LEASE", "15"))      # Renewed while generating
+WAIT_POLL_SECONDS = float(os.getenv("SINGLE_FLIGHT_POLL", "0.25"))
+MAX_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_MAX_WAIT", "330"))  # Expert timeout + margin
+
+# Only the owner may extend or release a lease.
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# --- 2. IN-PROCESS ---
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs fn once per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        """Returns (result, was_leader)."""
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, True
+
+    def inflight(self):
+        return len(self.calls)
+
+# --- 3. ACROSS REPLICAS ---
+class RedisLease:
+    """
+    A SET NX PX lease on lock:<cache key>. While held, a background thread
+    keeps extending it, so a crashed replica's lease runs out in
+    LEASE_SECONDS instead of blocking everyone for a full generation.
+    """
+
+    def __init__(self, cache_client, cache_key, lease_seconds=LEASE_SECONDS):
+        # Leases are plain Redis keys: bypass TieredCache's answer encoding and L1
+        self.cache_client = getattr(cache_client, "l2", cache_client)
+        self.key = LEASE_PREFIX + cache_key
+        self.token = uuid.uuid4().hex
+        self.lease_ms = int(lease_seconds * 1000)
+        self.stop = threading.Event()
+        self.held = False
+
+    def acquire(self):
+        self.held = bool(self.cache_client.set(self.key, self.token, nx=True, px=self.lease_ms))
+        if self.held:
+            threading.Thread(target=self._keep_alive, daemon=True).start()
+        return self.held
+
+    def _keep_alive(self):
+        while not self.stop.wait(self.lease_ms / 3000.0):
+            try:
+                if not self.cache_client.eval(_RENEW_SCRIPT, 1, self.key, self.token, self.lease_ms):
+                    return # Lost the lease (e.g. it expired during a network blip)
+            except Exception as e:
+                print(f"[SingleFlight] WARNING: Could not renew lease. {e}")
+
+    def is_held_elsewhere(self):
+        return bool(self.cache_client.exists(self.key))
+
+    def release(self):
+        self.stop.set()
+        if not self.held:
+            return
+        self.held = False
+        try:
+            self.cache_client.eval(_RELEASE_SCRIPT, 1, self.key, self.token)
+        except Exception as e:
+            print(f"[SingleFlight] WARNING: Could not release lease (it will expire). {e}")
+
+def wait_for_answer(cache_client, cache_key, lease, max_wait=MAX_WAIT_SECONDS):
+    """
+    Polls the cache while another replica holds the lease. Returns the
+    answer, or None if the other replica gave up (lease gone, no answer)
+    or we waited too long.
+    """
+    deadline = time.time() + max_wait
+    while time.time() < deadline:
+        answer = cache_client.get(cache_key)
+        if answer:
+            return answer
+        if not lease.is_held_elsewhere():
+            # One last look: the owner writes the answer before releasing.
+            return cache_client.get(cache_key)
+        time.sleep(WAIT_POLL_SECONDS)
+    return None
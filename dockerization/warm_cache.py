@@ -0,0 +1,249 @@
+import argparse
+import collections
+import concurrent.futures
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from brawn_scheduler import BrawnOverloaded
+from data_dir import data_path, make_parent_dir
+from semantic_cache import make_cache_key
+
+# --- 1. CONFIGURATION ---
+
+# Fills the cache ahead of time from a JSONL file of prompts, most popular
+# first, e.g. nightly before business hours:
+#   python warm_cache.py top_prompts.jsonl --limit 5000
+# Each line is {"prompt": "..."} (other fields are ignored) or a JSON string.
+# Prompts already in Redis are skipped; the rest go through the cascade in
+# parallel, as many at a time as the Brawn scheduler runs Expert calls, so
+# escalated prompts don't queue past the Expert's SLO and get rejected.
+WARM_CHUNK_SIZE = int(os.getenv("WARM_CHUNK_SIZE", "64"))   # Prompts per EXISTS / SET round trip
+# Warmed answers outlive the Brain's usual 1 hour so they last the working day
+WARM_CACHE_TTL = int(os.getenv("WARM_CACHE_TTL", str(12 * 3600)))
+WARM_ATTEMPTS = 3 # Tries per prompt when the scheduler says the Brawn node is overloaded
+WARM_DEGRADED_RETRY_SECONDS = 10 # Wait before retrying a prompt whose Expert call was rejected
+
+BRAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "brain_v2.0_cascade.py")
+
+def load_brain(path=BRAIN_PATH):
+    """Imports the Brain by path (the file name contains dots)."""
+    spec = importlib.util.spec_from_file_location("brain", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# --- 2. INPUT / CHECKPOINT ---
+def read_prompts(path, start_line=0, limit=None, retry_lines=()):
+    """
+    Yields (line number, prompt) from line start_line up to (not including)
+    line limit, plus the earlier lines in retry_lines.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if limit is not None and line_no >= limit:
+                return
+            if (line_no < start_line and line_no not in retry_lines) or not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                prompt = record if isinstance(record, str) else record["prompt"]
+            except (ValueError, KeyError, TypeError):
+                print(f"[Warm] WARNING: Skipping line {line_no + 1}, no prompt in it.")
+                continue
+            if prompt.strip():
+                yield line_no, prompt
+
+class Checkpoint:
+    """
+    <data dir>/<input name>.progress: how many lines of the input are
+    done, and which of those failed (a resumed run retries them first).
+    Written after every chunk (atomically), removed when the whole file is
+    done. Ignored if the input file changed since it was written.
+    """
+
+    def __init__(self, input_path):
+        self.path = data_path(os.path.basename(input_path) + ".progress")
+        stat = os.stat(input_path)
+        self.input_id = [stat.st_size, int(stat.st_mtime)]
+        self.line = 0
+        self.failed = set()
+        self.totals = collections.Counter()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        if data.get("input") != self.input_id:
+            print(f"[Warm] {self.path} is from a different input file. Starting over.")
+            return False
+        self.line = data["line"]
+        self.failed = set(data.get("failed", ()))
+        self.totals.update(data["totals"])
+        return True
+
+    def save(self, line):
+        self.line = line
+        tmp_path = f"{self.path}.tmp"
+        make_parent_dir(self.path)
+        with open(tmp_path, "w") as f:
+            json.dump({"input": self.input_id, "line": line, "failed": sorted(self.failed), "totals": self.totals}, f)
+        os.replace(tmp_path, self.path)
+
+    def finish(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# --- 3. WARM-UP ---
+class RateLimiter:
+    """Spaces out cascade starts, e.g. to re-warm during business hours without hogging the Brawn node."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self.next_start = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        time.sleep(start - now)
+
+def generate(brain, prompt, limiter=None):
+    """
+    Runs the cascade for one prompt. Returns (answer, model, seconds), or
+    None if it failed. A Scout answer given only because the Expert was
+    rejected or failed is retried, never stored with the long warm-up TTL.
+    """
+    if limiter is not None:
+        limiter.wait()
+    start_time = time.time()
+    for _attempt in range(WARM_ATTEMPTS):
+        try:
+            answer, model, degraded = brain.answer_prompt(prompt)
+            if not degraded:
+                break
+            print(f"[Warm] Expert unavailable for '{prompt[:60]}'. Retrying in {WARM_DEGRADED_RETRY_SECONDS}s.")
+            time.sleep(WARM_DEGRADED_RETRY_SECONDS)
+        except BrawnOverloaded as e:
+            print(f"[Warm] Brawn node overloaded. Retrying in {e.retry_after}s.")
+            time.sleep(e.retry_after)
+        except Exception as e:
+            print(f"[Warm] ERROR on '{prompt[:60]}': {e}")
+            return None
+    else:
+        return None
+    if "Error" in answer:
+        return None
+    return answer, model, time.time() - start_time
+
+def missing_keys(cache_client, keys):
+    """Pipelined EXISTS: the keys that are not in Redis yet."""
+    pipe = cache_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.exists(key)
+    return [key for key, exists in zip(keys, pipe.execute()) if not exists]
+
+def submit_chunk(brain, executor, cache_client, chunk, seen, limiter):
+    """Skips cached and repeated prompts; starts the cascade for the rest. Returns the chunk's bookkeeping."""
+    prompts = {}
+    for line_no, prompt in chunk:
+        key = make_cache_key(prompt)
+        if key not in seen: # Earlier in the file, maybe still generating
+            prompts.setdefault(key, (line_no, prompt))
+    todo = missing_keys(cache_client, list(prompts)) if prompts else []
+    seen.update(prompts)
+    futures = [(key, prompts[key][0], executor.submit(generate, brain, prompts[key][1], limiter)) for key in todo]
+    return {"lines": [line_no for line_no, _prompt in chunk], "cached": len(chunk) - len(todo), "futures": futures}
+
+def finish_chunk(cache_client, checkpoint, pending, ttl):
+    """
+    Waits for a chunk's answers, writes them with one pipelined SET and
+    moves the checkpoint past the chunk, keeping its failed lines in it.
+    """
+    entries, failed = [], set()
+    for key, line_no, future in pending["futures"]:
+        result = future.result()
+        if result is None:
+            failed.add(line_no)
+        else:
+            answer, model, seconds = result
+            entries.append((key, answer, model, seconds))
+    if entries:
+        cache_client.set_many(entries, ex=ttl)
+    # Lines retried from an earlier run are counted again below, whatever they came to now
+    retried = checkpoint.failed.intersection(pending["lines"])
+    checkpoint.failed = (checkpoint.failed - retried) | failed
+    checkpoint.totals["failed"] -= len(retried)
+    checkpoint.totals.update({"cached": pending["cached"], "warmed": len(entries), "failed": len(failed)})
+    checkpoint.save(max(checkpoint.line, pending["lines"][-1] + 1))
+    print(f"[Warm] Through line {checkpoint.line}: {pending['cached']} already cached, "
+          f"{len(entries)} warmed, {len(failed)} failed.")
+
+def warm(brain, cache_client, path, workers, ttl=WARM_CACHE_TTL, limit=None, restart=False,
+         chunk_size=WARM_CHUNK_SIZE, rate=None):
+    checkpoint = Checkpoint(path)
+    limiter = RateLimiter(rate) if rate else None
+    if not restart and checkpoint.load():
+        print(f"[Warm] Resuming {path} at line {checkpoint.line + 1}"
+              f"{f', retrying {len(checkpoint.failed)} failed prompts first' if checkpoint.failed else ''}.")
+
+    start_time = time.time()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warm")
+    # Chunks are finished in order (so the checkpoint only covers finished
+    # lines), while the next chunk is already queued so no worker sits idle.
+    in_flight = collections.deque()
+    seen = set()
+    chunk = []
+    try:
+        for item in read_prompts(path, checkpoint.line, limit, frozenset(checkpoint.failed)):
+            chunk.append(item)
+            if len(chunk) < chunk_size:
+                continue
+            in_flight.append(submit_chunk(brain, executor, cache_client, chunk, seen, limiter))
+            chunk = []
+            if len(in_flight) > 1:
+                finish_chunk(cache_client, checkpoint, in_flight.popleft(), ttl)
+        if chunk:
+            in_flight.append(submit_chunk(brain, executor, cache_client, chunk, seen, limiter))
+        while in_flight:
+            finish_chunk(cache_client, checkpoint, in_flight.popleft(), ttl)
+    except KeyboardInterrupt:
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"\n[Warm] Interrupted. Run the same command again to resume at line {checkpoint.line + 1}.")
+        raise
+    executor.shutdown()
+    checkpoint.finish()
+
+    totals = checkpoint.totals
+    print(f"[Warm] Done in {time.time() - start_time:.0f}s: {totals['warmed']} warmed, "
+          f"{totals['cached']} already cached, {totals['failed']} failed (retried on the next run).")
+    return totals
+
+# --- 4. CLI ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-populate the answer cache from a JSONL file of prompts.")
+    parser.add_argument("prompts", help="JSONL file, one {\"prompt\": ...} per line, most popular first")
+    parser.add_argument("--limit", type=int, help="Only the first N lines (top-N prompts)")
+    parser.add_argument("--workers", type=int, help="Prompts in flight (default: the Brawn scheduler's Expert slots)")
+    parser.add_argument("--ttl", type=int, default=WARM_CACHE_TTL, help="Seconds the warmed answers stay cached")
+    parser.add_argument("--rate", type=float, help="At most this many prompts per minute (default: no limit)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved progress and start from the top")
+    args = parser.parse_args()
+
+    brain = load_brain()
+    brain.brawn_pool.start_health_checks()
+    cache_client = brain.get_redis_connection()
+    if not cache_client or cache_client.l2_is_down():
+        print("[Warm] Redis is unavailable. Nothing to warm.")
+        sys.exit(1)
+    try:
+        warm(brain, cache_client, args.prompts, args.workers or brain.brawn_scheduler.limit(brain.MODEL_EXPERT),
+             args.ttl, args.limit, args.restart, rate=args.rate)
+    except KeyboardInterrupt:
+        sys.exit(130)